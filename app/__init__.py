@@ -1,6 +1,7 @@
 from flask import Flask
 from .models import db
 from .routes import bp as routes_bp
+from . import instrumentacao, perfil, cache_validadores, estatisticas_validadores, serializacao, migracoes
 import logging
 
 # Cria a aplicação Flask
@@ -13,9 +14,27 @@ def criar_app(config_object='app.config.Config'):
     # Configura o nível de logging para DEBUG
     logging.basicConfig(level=logging.DEBUG)
 
+    # Usa o provedor de JSON rápido quando disponível
+    serializacao.init_app(app)
+
     # Inicializa o banco de dados com flask
     db.init_app(app)
 
+    # Adiciona a bancos existentes as colunas e índices criados depois deles
+    migracoes.init_app(app)
+
+    # Instrumenta as consultas ao banco de dados por requisição
+    instrumentacao.init_app(app)
+
+    # Cria o cache de busca de validadores por endereço
+    cache_validadores.init_app(app)
+
+    # Cria as estatísticas de desempenho dos validadores usadas na seleção de comitês
+    estatisticas_validadores.init_app(app)
+
+    # Habilita o perfil sob demanda das requisições quando configurado
+    perfil.init_app(app)
+
     # Registra o blueprint de rotas na aplicação
     app.register_blueprint(routes_bp)
 
@@ -0,0 +1,83 @@
+from sqlalchemy import case, func, select, update
+from .models import db, Usuario, Transacao, Validador, Seletor
+from .motor import Armazenamento
+from .cache_validadores import cache_atual, IDS_ALTERADOS
+
+TAMANHO_BLOCO_IN = 500 # Ids por consulta IN, abaixo do limite de parâmetros do SQLite
+
+def blocos(valores):
+    for inicio in range(0, len(valores), TAMANHO_BLOCO_IN):
+        yield valores[inicio:inicio + TAMANHO_BLOCO_IN]
+
+class ArmazenamentoSQLAlchemy(Armazenamento):
+    # Armazenamento do motor do ledger sobre os modelos do Flask-SQLAlchemy
+    tipo_transacao = Transacao
+
+    def __init__(self, sessao=None):
+        self.sessao = sessao or db.session
+
+    def obter_usuario(self, id_usuario):
+        return self.sessao.get(Usuario, id_usuario)
+
+    def obter_seletor(self, id_seletor):
+        return self.sessao.get(Seletor, id_seletor)
+
+    def obter_validador(self, endereco):
+        return cache_atual().obter(endereco, self.sessao)
+
+    def validadores_ativos(self, seletor_id):
+        return Validador.query.filter_by(status='ativo', seletor_id=seletor_id).all()
+
+    def validadores_do_seletor(self, seletor_id):
+        return Validador.query.filter(Validador.seletor_id == seletor_id, Validador.status.in_(('ativo', 'on_hold'))).order_by(Validador.id).all()
+
+    def atualizar_validadores(self, alteracoes):
+        # Uma sentença UPDATE por grupo de alterações; os objetos já carregados na sessão são atualizados em memória
+        # e apenas os ids alterados saem do cache de validadores
+        for mudancas, ids in alteracoes.items():
+            self.sessao.execute(
+                update(Validador).where(Validador.id.in_(ids)).values(dict(mudancas)),
+                execution_options={'synchronize_session': 'evaluate', IDS_ALTERADOS: list(ids)}
+            )
+
+    def ultima_transacao(self, id_remetente, ate_id=None):
+        consulta = Transacao.query.filter_by(id_remetente=id_remetente)
+        if ate_id is not None:
+            consulta = consulta.filter(Transacao.id <= ate_id)
+        return consulta.order_by(Transacao.horario.desc()).first()
+
+    def contar_transacoes_desde(self, id_remetente, desde, ate_id=None):
+        consulta = Transacao.query.filter(Transacao.id_remetente == id_remetente, Transacao.horario > desde)
+        if ate_id is not None:
+            consulta = consulta.filter(Transacao.id <= ate_id)
+        return consulta.count()
+
+    def obter_usuarios(self, ids_usuarios):
+        usuarios = {}
+        for bloco in blocos(sorted(ids_usuarios)):
+            usuarios.update((usuario.id, usuario) for usuario in self.sessao.scalars(select(Usuario).where(Usuario.id.in_(bloco))))
+        return usuarios
+
+    def historico_remetentes(self, ids_remetentes, id_min, id_max, desde):
+        # Duas consultas por bloco de remetentes: o resumo agrupado antes do lote e as linhas do intervalo do lote
+        resumo, linhas = {}, []
+        for bloco in blocos(sorted(ids_remetentes)):
+            anteriores = self.sessao.execute(
+                select(Transacao.id_remetente, func.max(Transacao.horario), func.count(case((Transacao.horario > desde, 1))))
+                .where(Transacao.id_remetente.in_(bloco), Transacao.id < id_min)
+                .group_by(Transacao.id_remetente)
+            )
+            resumo.update((id_remetente, (maior, recentes)) for id_remetente, maior, recentes in anteriores)
+            linhas.extend(tuple(linha) for linha in self.sessao.execute(
+                select(Transacao.id_remetente, Transacao.id, Transacao.horario)
+                .where(Transacao.id_remetente.in_(bloco), Transacao.id.between(id_min, id_max))
+                .order_by(Transacao.id_remetente, Transacao.id)
+            ))
+        return resumo, linhas
+
+    def adicionar_transacao(self, transacao):
+        self.sessao.add(transacao)
+        return transacao
+
+    def confirmar(self):
+        self.sessao.commit()
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from .models import db, Validador
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+COLUNAS = tuple(coluna.key for coluna in Validador.__mapper__.column_attrs)
+IDS_ALTERADOS = 'ids_validadores' # Opção de execução com os ids afetados por um UPDATE/DELETE em massa de validadores
+PENDENTES = 'validadores_pendentes' # Em session.info: alterações de validadores gravadas e ainda não confirmadas
+
+class CacheValidadores:
+    # Cache LRU de endereço -> valores das colunas do validador. Um acerto monta a instância a partir dos
+    # valores e a anexa à sessão atual com merge(load=False), sem nenhum SELECT; nenhuma instância do ORM
+    # é guardada entre requisições. Os eventos da sessão mantêm o cache coerente: as alterações gravadas
+    # invalidam as entradas afetadas e, no commit, os valores confirmados voltam ao cache; um rollback só
+    # invalida. UPDATE/DELETE em massa invalidam os ids da opção IDS_ALTERADOS ou, sem ela, o cache inteiro.
+    # Um acerto não consulta o banco: alterações feitas por outro processo ou por SQL fora do ORM (text())
+    # não chegam aos eventos, por isso cada entrada expira após validade_s segundos, o atraso máximo com
+    # que essas alterações são vistas. validade_s=None só é seguro com um único processo escrevendo pelo
+    # ORM; tamanho_maximo=0 desativa o cache e toda busca vai ao banco.
+    def __init__(self, tamanho_maximo=10000, validade_s=5):
+        self.tamanho_maximo = tamanho_maximo
+        self.validade_s = validade_s
+        self.valores = OrderedDict() # Endereço -> (valores, instante de expiração ou None)
+        self.enderecos = {} # Id -> endereço em cache, para invalidar por id e quando o endereço muda
+        self.geracao = 0 # Incrementada a cada invalidação; uma leitura anterior a ela não preenche o cache
+        self.trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self.expiracoes = 0
+
+    def obter(self, endereco, sessao=None):
+        sessao = sessao or db.session
+        with self.trava:
+            valores, expira_em = self.valores.get(endereco, (None, None))
+            if expira_em is not None and expira_em <= time.monotonic():
+                # Expirada: a busca vai ao banco e recoloca os valores atuais
+                self.valores.pop(endereco)
+                self.enderecos.pop(valores['id'], None)
+                self.expiracoes += 1
+                valores = None
+            if valores is not None:
+                self.valores.move_to_end(endereco)
+                self.acertos += 1
+            geracao = self.geracao
+
+        if valores is not None:
+            # A instância já carregada na sessão tem precedência, com as alterações ainda não gravadas
+            validador = sessao.identity_map.get(Validador.__mapper__.identity_key_from_primary_key((valores['id'],)))
+            if validador is None:
+                validador = Validador(**valores)
+                make_transient_to_detached(validador)
+                validador = sessao.merge(validador, load=False)
+            return validador
+
+        validador = sessao.query(Validador).filter_by(endereco=endereco).first()
+        with self.trava:
+            self.falhas += 1
+        # Endereços inexistentes não são guardados, para que um registro posterior seja encontrado; valores
+        # ainda não confirmados pela sessão também não
+        if validador is not None and not sessao.info.get(PENDENTES) and not inspect(validador).modified:
+            self.guardar(valores_validador(validador), geracao)
+        return validador
+
+    def guardar(self, valores, geracao=None):
+        if self.tamanho_maximo <= 0:
+            return
+        expira_em = time.monotonic() + self.validade_s if self.validade_s is not None else None
+        with self.trava:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self.remover(self.enderecos.get(valores['id']))
+            self.valores[valores['endereco']] = (valores, expira_em)
+            self.enderecos[valores['id']] = valores['endereco']
+            while len(self.valores) > self.tamanho_maximo:
+                _, (antigos, _) = self.valores.popitem(last=False)
+                self.enderecos.pop(antigos['id'], None)
+
+    def remover(self, endereco):
+        # Chamado com a trava adquirida
+        valores, _ = self.valores.pop(endereco, (None, None))
+        if valores is not None:
+            self.enderecos.pop(valores['id'], None)
+            self.invalidacoes += 1
+
+    def invalidar(self, *enderecos):
+        with self.trava:
+            self.geracao += 1
+            for endereco in enderecos:
+                self.remover(endereco)
+
+    def invalidar_ids(self, *ids_validadores):
+        with self.trava:
+            self.geracao += 1
+            for id_validador in ids_validadores:
+                self.remover(self.enderecos.get(id_validador))
+
+    def limpar(self):
+        with self.trava:
+            self.geracao += 1
+            self.invalidacoes += len(self.valores)
+            self.valores.clear()
+            self.enderecos.clear()
+
+    def estatisticas(self):
+        with self.trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'tamanho': len(self.valores),
+                'tamanho_maximo': self.tamanho_maximo,
+                'validade_s': self.validade_s,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'invalidacoes': self.invalidacoes,
+                'expiracoes': self.expiracoes,
+                'taxa_acertos': round(self.acertos / consultas, 4) if consultas else None
+            }
+
+def valores_validador(validador):
+    return {coluna: getattr(validador, coluna) for coluna in COLUNAS}
+
+def cache_da_aplicacao():
+    return current_app.extensions.get('cache_validadores') if has_app_context() else None
+
+def pendentes(sessao):
+    # Alterações da transação atual: id -> valores gravados (None para removidos); 'limpar' após um UPDATE/DELETE sem ids
+    return sessao.info.setdefault(PENDENTES, {})
+
+@event.listens_for(Session, 'after_flush')
+def registrar_alteracoes(sessao, contexto):
+    cache = cache_da_aplicacao()
+    if cache is None:
+        return
+    alteracoes = pendentes(sessao)
+    ids = []
+    for validador in chain(sessao.new, sessao.dirty, sessao.deleted):
+        if isinstance(validador, Validador) and validador.id is not None:
+            # Removidos e instâncias com colunas não carregadas apenas saem do cache
+            sem_valores = validador in sessao.deleted or not inspect(validador).unloaded.isdisjoint(COLUNAS)
+            alteracoes[validador.id] = None if sem_valores else valores_validador(validador)
+            ids.append(validador.id)
+    if ids:
+        cache.invalidar_ids(*ids)
+
+@event.listens_for(Session, 'do_orm_execute')
+def registrar_execucao_em_massa(execucao):
+    if not (execucao.is_update or execucao.is_delete) or execucao.bind_mapper is not Validador.__mapper__:
+        return
+    cache = cache_da_aplicacao()
+    if cache is None:
+        return
+    ids = execucao.execution_options.get(IDS_ALTERADOS)
+    alteracoes = pendentes(execucao.session)
+    if ids is None:
+        alteracoes['limpar'] = True
+        cache.limpar()
+    else:
+        alteracoes.update((id_validador, None) for id_validador in ids)
+        cache.invalidar_ids(*ids)
+
+@event.listens_for(Session, 'after_commit')
+def confirmar_alteracoes(sessao):
+    alteracoes = sessao.info.pop(PENDENTES, None)
+    cache = cache_da_aplicacao()
+    if not alteracoes or cache is None:
+        return
+    # Invalida de novo: uma leitura concorrente pode ter visto os valores antigos antes do commit
+    if alteracoes.pop('limpar', False):
+        cache.limpar()
+    else:
+        cache.invalidar_ids(*alteracoes)
+    for valores in alteracoes.values():
+        if valores is not None:
+            cache.guardar(valores)
+
+@event.listens_for(Session, 'after_rollback')
+def descartar_alteracoes(sessao):
+    alteracoes = sessao.info.pop(PENDENTES, None)
+    cache = cache_da_aplicacao()
+    if alteracoes and cache is not None:
+        if alteracoes.pop('limpar', False):
+            cache.limpar()
+        else:
+            cache.invalidar_ids(*alteracoes)
+
+def cache_atual():
+    return current_app.extensions['cache_validadores']
+
+def obter_validador(endereco):
+    # Busca um validador pelo endereço através do cache da aplicação
+    return cache_atual().obter(endereco)
+
+def invalidar(*enderecos):
+    cache_atual().invalidar(*enderecos)
+
+def init_app(app):
+    # Cada aplicação tem o seu cache, com o tamanho e a validade configurados
+    app.extensions['cache_validadores'] = CacheValidadores(app.config.get('CACHE_VALIDADORES_MAX', 10000), app.config.get('CACHE_VALIDADORES_VALIDADE_S', 5))
@@ -0,0 +1,285 @@
+from flask import current_app
+from sqlalchemy import insert
+from .models import db, Usuario, Seletor, Validador
+from .validacao import gerar_chave
+from . import estatisticas_validadores
+from .cache_validadores import IDS_ALTERADOS
+import logging
+import math
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+STAKE_MINIMO = 50.0 # Saldo mínimo para registrar um validador; validadores expulsos precisam do dobro
+MAX_RETORNOS = 2 # Validadores expulsos mais vezes que isso são removidos da rede ao tentar retornar
+
+# Cadastro em lote de usuários, validadores e seletores: uma consulta IN por bloco para as verificações de
+# unicidade, gravação em blocos e um único commit por lote. As regras são as mesmas das rotas de um único
+# item e cada item recebe o seu próprio resultado.
+
+def em_blocos(itens, tamanho=None):
+    # Divide uma lista em blocos do tamanho configurado
+    tamanho = tamanho or current_app.config.get('LOTE_TAMANHO_BLOCO', 500)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+def buscar_por(modelo, coluna, valores):
+    # Busca os registros cujo valor da coluna está entre os valores, com uma consulta IN por bloco.
+    # Valores repetidos no banco ficam com o registro de menor id, como o .first() das rotas individuais
+    encontrados = {}
+    valores = list({valor for valor in valores if valor is not None})
+    for bloco in em_blocos(valores):
+        for registro in modelo.query.filter(coluna.in_(bloco)).order_by(modelo.id.desc()).all():
+            encontrados[getattr(registro, coluna.key)] = registro
+    return encontrados
+
+def gravar_novos(modelo, linhas):
+    # Insere os novos registros com um INSERT em lote (executemany) por bloco
+    for bloco in em_blocos(linhas):
+        db.session.execute(insert(modelo), bloco)
+
+def resumo_lote(resultados):
+    # Resultado do lote: 200 se todos os itens foram aplicados, 207 se houve falhas em parte deles
+    sucesso = sum(1 for resultado in resultados if resultado['status_code'] == 200)
+    logger.debug(f"Lote processado: {sucesso} de {len(resultados)} itens aplicados")
+    return {
+        'resultados': resultados,
+        'sucesso': sucesso,
+        'falhas': len(resultados) - sucesso,
+        'status_code': 200 if sucesso == len(resultados) else 207
+    }
+
+def item_invalido(item, *campos):
+    # Verifica se o item é um objeto com os campos obrigatórios
+    return not isinstance(item, dict) or any(item.get(campo) is None for campo in campos)
+
+# Tipos dos campos dos itens: texto, inteiro (ids) e número finito (saldos e stakes); booleanos não são números
+TIPOS_CAMPOS = {'nome': 'texto', 'endereco': 'texto', 'key': 'texto', 'id': 'inteiro', 'seletor_id': 'inteiro', 'saldo': 'numero', 'stake': 'numero'}
+
+def tipo_valido(valor, tipo):
+    if tipo == 'texto':
+        return isinstance(valor, str)
+    if isinstance(valor, bool):
+        return False
+    if tipo == 'inteiro':
+        return isinstance(valor, int)
+    return isinstance(valor, (int, float)) and math.isfinite(valor)
+
+def validar_itens(itens, obrigatorios, mensagem_incompleto, status_incompleto=400):
+    # Separa os itens válidos dos que não são objetos, não têm os campos obrigatórios ou têm campos com o tipo
+    # errado. Só os válidos chegam às consultas e gravações; os demais recebem o erro no próprio resultado
+    validos, resultados = {}, []
+    for indice, item in enumerate(itens):
+        if item_invalido(item, *obrigatorios):
+            resultados.append(resultado_item(indice, mensagem_incompleto, status_incompleto))
+            continue
+        invalidos = [campo for campo, tipo in TIPOS_CAMPOS.items() if item.get(campo) is not None and not tipo_valido(item[campo], tipo)]
+        if invalidos:
+            resultados.append(resultado_item(indice, f"Campos com tipo ou valor inválido: {', '.join(invalidos)}", 400))
+            continue
+        validos[indice] = item
+    return validos, resultados
+
+def ordenados(resultados):
+    return sorted(resultados, key=lambda resultado: resultado['indice'])
+
+def resultado_item(indice, mensagem, status_code, **extras):
+    return {'indice': indice, 'mensagem': mensagem, 'status_code': status_code, **extras}
+
+def registrar_usuarios_lote(itens):
+    # Registra usuários pelo nome, rejeitando nomes já existentes ou repetidos no lote
+    validos, resultados = validar_itens(itens, ('nome',), 'Nome do usuário não informado')
+    existentes = buscar_por(Usuario, Usuario.nome, [item['nome'] for item in validos.values()])
+    novos, vistos = [], set()
+    for indice, item in validos.items():
+        nome = item['nome']
+        if nome in existentes or nome in vistos:
+            resultados.append(resultado_item(indice, f'Usuário {nome} já existe', 400))
+            continue
+        vistos.add(nome)
+        novos.append((indice, {'nome': nome, 'saldo': item.get('saldo', 0.0)}))
+
+    gravar_novos(Usuario, [linha for _, linha in novos])
+    db.session.commit()
+    # Os ids atribuídos são lidos com uma consulta IN por bloco
+    ids = {nome: usuario.id for nome, usuario in buscar_por(Usuario, Usuario.nome, vistos).items()}
+    resultados.extend(resultado_item(indice, f'Usuário {linha["nome"]} foi registrado', 200, id=ids[linha['nome']]) for indice, linha in novos)
+    return resumo_lote(ordenados(resultados))
+
+def editar_usuarios_lote(itens):
+    # Edita nome e saldo de usuários pelo id; um nome não pode ficar com dois usuários
+    validos, resultados = validar_itens(itens, ('id',), 'Id do usuário não informado')
+    usuarios = buscar_por(Usuario, Usuario.id, [item['id'] for item in validos.values()])
+    nomes = buscar_por(Usuario, Usuario.nome, [item.get('nome') for item in validos.values()])
+    for indice, item in validos.items():
+        usuario = usuarios.get(item['id'])
+        if not usuario:
+            resultados.append(resultado_item(indice, 'Usuário não encontrado', 404))
+            continue
+        nome, saldo = item.get('nome'), item.get('saldo')
+        if nome:
+            dono = nomes.get(nome)
+            if dono is not None and dono.id != usuario.id:
+                resultados.append(resultado_item(indice, 'Nome já está em uso', 400))
+                continue
+            nomes[nome] = usuario
+            usuario.nome = nome
+        if saldo is not None:
+            usuario.saldo = saldo
+        resultados.append(resultado_item(indice, f'Usuário {usuario.nome} foi atualizado', 200))
+
+    db.session.commit()
+    return resumo_lote(ordenados(resultados))
+
+def remover_registros_lote(modelo, coluna, itens, descricao):
+    # Remove registros pelo campo informado em cada item, com um DELETE por bloco
+    campo = coluna.key
+    validos, resultados = validar_itens(itens, (campo,), f'{descricao} não encontrado', 404)
+    existentes = buscar_por(modelo, coluna, [item[campo] for item in validos.values()])
+    removidos = []
+    for indice, item in validos.items():
+        registro = existentes.pop(item[campo], None)
+        if registro is None:
+            resultados.append(resultado_item(indice, f'{descricao} não encontrado', 404))
+            continue
+        removidos.append((registro.id, item[campo]))
+        resultados.append(resultado_item(indice, f'{descricao} {item[campo]} foi removido', 200))
+
+    for bloco in em_blocos(removidos):
+        ids = [id_registro for id_registro, _ in bloco]
+        # Para validadores, os ids removidos saem do cache pelos eventos da sessão
+        modelo.query.filter(modelo.id.in_(ids)).execution_options(**{IDS_ALTERADOS: ids}).delete(synchronize_session='fetch')
+    db.session.commit()
+    if modelo is Validador:
+        # Os validadores removidos saem das estatísticas de desempenho
+        estatisticas_validadores.esquecer(*(id_registro for id_registro, _ in removidos))
+    return resumo_lote(ordenados(resultados))
+
+def remover_usuarios_lote(itens):
+    return remover_registros_lote(Usuario, Usuario.nome, itens, 'Usuário')
+
+def registrar_validadores_lote(itens):
+    # Registra validadores com as regras de registrar_validador_: stake mínimo, seletor existente,
+    # reativação de expulsos com o dobro do stake e remoção dos que já retornaram vezes demais
+    validos, resultados = validar_itens(itens, ('endereco', 'stake', 'key', 'seletor_id'), 'Dados do validador incompletos')
+    existentes = buscar_por(Validador, Validador.endereco, [item['endereco'] for item in validos.values()])
+    seletores = buscar_por(Seletor, Seletor.id, [item['seletor_id'] for item in validos.values()])
+    novos, removidos, vistos = [], [], set()
+    for indice, item in validos.items():
+        endereco, stake, seletor_id = item['endereco'], item['stake'], item['seletor_id']
+        if stake < STAKE_MINIMO:
+            resultados.append(resultado_item(indice, 'O saldo mínimo de 50 NoNameCoins é necessário para registrar um validador', 400))
+            continue
+        if seletor_id not in seletores:
+            resultados.append(resultado_item(indice, 'Seletor não encontrado', 404))
+            continue
+        if endereco in vistos:
+            resultados.append(resultado_item(indice, f'Validador de endereço {endereco} já existe', 400))
+            continue
+        vistos.add(endereco)
+        chave_seletor = gerar_chave(seletor_id, endereco)
+
+        validador_existente = existentes.get(endereco)
+        if validador_existente is None:
+            novos.append((indice, {
+                'endereco': endereco,
+                'stake': stake,
+                'key': item['key'],
+                'chave_seletor': chave_seletor,
+                'status': 'ativo',
+                'retorno_contagem': 0,
+                'seletor_id': seletor_id
+            }))
+        elif validador_existente.status != 'expulso':
+            resultados.append(resultado_item(indice, f'Validador de endereço {endereco} já existe', 400))
+        elif validador_existente.retorno_contagem >= MAX_RETORNOS:
+            removidos.append((validador_existente.id, endereco))
+            resultados.append(resultado_item(indice, f'Validador de endereço {endereco} não pode retornar mais vezes e será deletado da rede', 400))
+        elif stake < 2 * STAKE_MINIMO:
+            resultados.append(resultado_item(indice, f'Validador de endereço {endereco} precisa travar pelo menos o dobro do saldo mínimo', 400))
+        else:
+            # Atualiza os dados do validador para reativá-lo
+            validador_existente.status = 'ativo'
+            validador_existente.retorno_contagem += 1
+            validador_existente.stake = stake
+            validador_existente.key = item['key']
+            validador_existente.chave_seletor = chave_seletor
+            validador_existente.seletor_id = seletor_id
+            resultados.append(resultado_item(indice, f'Validador de endereço {endereco} foi reativado', 200))
+
+    for bloco in em_blocos(removidos):
+        ids = [id_validador for id_validador, _ in bloco]
+        Validador.query.filter(Validador.id.in_(ids)).execution_options(**{IDS_ALTERADOS: ids}).delete(synchronize_session='fetch')
+    gravar_novos(Validador, [linha for _, linha in novos])
+    db.session.commit()
+    estatisticas_validadores.esquecer(*(id_validador for id_validador, _ in removidos))
+    resultados.extend(
+        resultado_item(indice, f'Validador de endereço {linha["endereco"]} foi registrado', 200, chave_seletor=linha['chave_seletor'])
+        for indice, linha in novos
+    )
+    return resumo_lote(ordenados(resultados))
+
+def editar_validadores_lote(itens):
+    # Atualiza o stake de validadores pelo id
+    validos, resultados = validar_itens(itens, ('id', 'stake'), 'Dados do validador incompletos')
+    validadores = buscar_por(Validador, Validador.id, [item['id'] for item in validos.values()])
+    for indice, item in validos.items():
+        validador = validadores.get(item['id'])
+        if not validador:
+            resultados.append(resultado_item(indice, f'Validador com ID {item["id"]} não encontrado', 404))
+            continue
+        validador.stake = item['stake']
+        resultados.append(resultado_item(indice, f'Validador com ID {item["id"]} foi atualizado', 200))
+
+    db.session.commit()
+    return resumo_lote(ordenados(resultados))
+
+def remover_validadores_lote(itens):
+    return remover_registros_lote(Validador, Validador.endereco, itens, 'Validador')
+
+def registrar_seletores_lote(itens):
+    # Registra seletores pelo endereço, rejeitando endereços já existentes ou repetidos no lote
+    validos, resultados = validar_itens(itens, ('endereco',), 'Endereço do seletor não informado')
+    existentes = buscar_por(Seletor, Seletor.endereco, [item['endereco'] for item in validos.values()])
+    novos, vistos = [], set()
+    for indice, item in validos.items():
+        endereco = item['endereco']
+        if endereco in existentes or endereco in vistos:
+            resultados.append(resultado_item(indice, f'Seletor de endereço {endereco} já existe', 400))
+            continue
+        vistos.add(endereco)
+        novos.append((indice, {'endereco': endereco, 'saldo': item.get('saldo', 0.0)}))
+
+    gravar_novos(Seletor, [linha for _, linha in novos])
+    db.session.commit()
+    ids = {endereco: seletor.id for endereco, seletor in buscar_por(Seletor, Seletor.endereco, vistos).items()}
+    resultados.extend(resultado_item(indice, f'Seletor de endereço {linha["endereco"]} foi registrado', 200, id=ids[linha['endereco']]) for indice, linha in novos)
+    return resumo_lote(ordenados(resultados))
+
+def editar_seletores_lote(itens):
+    # Atualiza endereço e saldo de seletores pelo id; um endereço não pode ficar com dois seletores
+    validos, resultados = validar_itens(itens, ('id', 'endereco'), 'Dados do seletor incompletos')
+    seletores = buscar_por(Seletor, Seletor.id, [item['id'] for item in validos.values()])
+    enderecos = buscar_por(Seletor, Seletor.endereco, [item['endereco'] for item in validos.values()])
+    for indice, item in validos.items():
+        seletor = seletores.get(item['id'])
+        if not seletor:
+            resultados.append(resultado_item(indice, 'Seletor não encontrado', 404))
+            continue
+        novo_endereco = item['endereco']
+        dono = enderecos.get(novo_endereco)
+        if dono is not None and dono.id != seletor.id:
+            resultados.append(resultado_item(indice, f'Endereço {novo_endereco} já está em uso por outro seletor', 400))
+            continue
+        # O endereço antigo só fica livre no próximo lote, evitando trocas que violariam a unicidade no commit
+        enderecos[novo_endereco] = seletor
+        seletor.endereco = novo_endereco
+        seletor.saldo = item.get('saldo')
+        resultados.append(resultado_item(indice, f'Seletor {seletor.id} atualizado com sucesso', 200))
+
+    db.session.commit()
+    return resumo_lote(ordenados(resultados))
+
+def remover_seletores_lote(itens):
+    return remover_registros_lote(Seletor, Seletor.endereco, itens, 'Seletor')
@@ -0,0 +1,30 @@
+import hashlib
+from functools import lru_cache
+
+# Representação compacta das chaves de validação de uma transação: cada chave vira um digest de tamanho fixo
+# e a coluna guarda os digests concatenados, sem separador e sem limite de tamanho do comitê
+
+TAMANHO_DIGEST = 16 # Caracteres hexadecimais por chave (64 bits de BLAKE2b)
+DIGITOS_HEX = frozenset('0123456789abcdef')
+
+@lru_cache(maxsize=65536)
+def digest_chave(chave):
+    # Digest de tamanho fixo de uma chave de validação; cada chave do seletor é calculada uma única vez
+    return hashlib.blake2b(chave.encode('utf-8'), digest_size=TAMANHO_DIGEST // 2).hexdigest()
+
+def compactar_chaves(chaves):
+    # Converte uma lista de chaves de validação no formato gravado em Transacao.keys_validacao
+    return "".join(digest_chave(chave) for chave in chaves)
+
+@lru_cache(maxsize=4096)
+def conjunto_chaves(keys_validacao):
+    # Conjunto de digests de uma transação, lido uma vez e reutilizado por todos os validadores do comitê.
+    # Transações antigas guardam as chaves em texto separadas por vírgula (as chaves geradas têm '-',
+    # que não é hexadecimal) e são convertidas para digests na leitura
+    if len(keys_validacao) % TAMANHO_DIGEST or not DIGITOS_HEX.issuperset(keys_validacao):
+        return frozenset(digest_chave(chave) for chave in keys_validacao.split(","))
+    return frozenset(keys_validacao[inicio:inicio + TAMANHO_DIGEST] for inicio in range(0, len(keys_validacao), TAMANHO_DIGEST))
+
+def chave_valida(chave_seletor, keys_validacao):
+    # Verifica em tempo constante se a chave do seletor de um validador está entre as chaves da transação
+    return digest_chave(chave_seletor) in conjunto_chaves(keys_validacao)
@@ -0,0 +1,183 @@
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta
+from .motor import (
+    ArmazenamentoMemoria, RegistroUsuario, RegistroSeletor, RegistroValidador, RegistroTransacao
+)
+
+# Checkpoint do estado derivado do motor em memória: saldos e bloqueios dos usuários, seletores,
+# validadores (stake, flags, hold, seleções consecutivas), janelas de taxa dos remetentes e o estado
+# do gerador aleatório, junto com a marca d'água do fluxo de transações. Ao retomar, o estado é lido do
+# arquivo e apenas as transações posteriores à marca são processadas.
+#
+# Formato (little-endian): cabeçalho MAGICO, versão, marca d'água, id da fonte e horário do checkpoint,
+# seguido do corpo comprimido com zlib. Strings são gravadas com o tamanho (uint32) e os bytes UTF-8;
+# horários em microssegundos desde a época, com NULO para valores ausentes.
+
+MAGICO = b'NNCK'
+VERSAO = 1
+CABECALHO = struct.Struct('<4sHqqq')
+NULO = -(2 ** 63)
+EPOCA = datetime(1970, 1, 1)
+UM_MICROSSEGUNDO = timedelta(microseconds=1)
+JANELA_TAXA = timedelta(minutes=1) # Mesma janela do limite de transações por minuto
+
+class CheckpointInvalido(ValueError):
+    # Arquivo de checkpoint corrompido ou de uma versão incompatível
+    pass
+
+class Escritor:
+    def __init__(self):
+        self.partes = []
+
+    def pack(self, formato, *valores):
+        self.partes.append(struct.pack('<' + formato, *valores))
+
+    def texto(self, valor):
+        dados = valor.encode('utf-8')
+        self.pack('I', len(dados))
+        self.partes.append(dados)
+
+    def horario(self, valor):
+        self.pack('q', NULO if valor is None else (valor - EPOCA) // UM_MICROSSEGUNDO)
+
+    def bytes(self):
+        return b''.join(self.partes)
+
+class Leitor:
+    def __init__(self, dados):
+        self.dados = memoryview(dados)
+        self.posicao = 0
+
+    def unpack(self, formato):
+        estrutura = struct.Struct('<' + formato)
+        valores = estrutura.unpack_from(self.dados, self.posicao)
+        self.posicao += estrutura.size
+        return valores
+
+    def texto(self):
+        tamanho, = self.unpack('I')
+        valor = bytes(self.dados[self.posicao:self.posicao + tamanho]).decode('utf-8')
+        self.posicao += tamanho
+        return valor
+
+    def horario(self):
+        valor, = self.unpack('q')
+        return None if valor == NULO else EPOCA + valor * UM_MICROSSEGUNDO
+
+def janela_remetente(armazenamento, id_remetente, desde):
+    # Transações do remetente que ainda afetam o consenso: as da janela de taxa e a mais recente
+    transacoes = armazenamento._transacoes_remetente.get(id_remetente, [])
+    janela = [transacao for transacao in transacoes if transacao.horario > desde]
+    if transacoes and (not janela or janela[-1] is not transacoes[-1]):
+        janela.append(transacoes[-1])
+    return janela
+
+def gravar_checkpoint(caminho, armazenamento, marca_dagua, agora, estado_rng=None, id_fonte=None):
+    # Grava o checkpoint de forma atômica: um checkpoint parcial nunca substitui o anterior
+    escritor = Escritor()
+
+    escritor.pack('I', len(armazenamento.usuarios))
+    for usuario in armazenamento.usuarios.values():
+        escritor.pack('qd', usuario.id, usuario.saldo)
+        escritor.texto(usuario.nome)
+        escritor.horario(usuario.tempo_bloqueio)
+
+    escritor.pack('I', len(armazenamento.seletores))
+    for seletor in armazenamento.seletores.values():
+        escritor.pack('qd', seletor.id, seletor.saldo)
+        escritor.texto(seletor.endereco)
+
+    escritor.pack('I', len(armazenamento.validadores))
+    for v in armazenamento.validadores.values():
+        escritor.pack('qdqqqqqq', v.id, v.stake, v.seletor_id, v.flag or 0, v.selecoes_consecutivas or 0,
+                      v.transacoes_coerentes or 0, v.transacoes_hold_restantes or 0, v.retorno_contagem or 0)
+        for valor in (v.endereco, v.key, v.chave_seletor, v.status):
+            escritor.texto(valor)
+
+    desde = agora - JANELA_TAXA
+    janelas = {id_remetente: janela_remetente(armazenamento, id_remetente, desde) for id_remetente in armazenamento._transacoes_remetente}
+    escritor.pack('qI', armazenamento.ultimo_id, len(janelas))
+    for id_remetente, janela in janelas.items():
+        escritor.pack('qI', id_remetente, len(janela))
+        for transacao in janela:
+            escritor.pack('qqdb', transacao.id, transacao.id_receptor, transacao.quantia, transacao.status)
+            escritor.horario(transacao.horario)
+
+    # Estado do gerador aleatório (random.Random.getstate), para que a seleção de comitês continue igual
+    if estado_rng is None:
+        escritor.pack('?', False)
+    else:
+        versao_rng, estado, gauss = estado_rng
+        escritor.pack('?iI', True, versao_rng, len(estado))
+        escritor.pack(f'{len(estado)}I', *estado)
+        escritor.pack('?d', gauss is not None, gauss or 0.0)
+
+    cabecalho = CABECALHO.pack(MAGICO, VERSAO, marca_dagua, NULO if id_fonte is None else id_fonte, (agora - EPOCA) // UM_MICROSSEGUNDO)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(cabecalho)
+        arquivo.write(zlib.compress(escritor.bytes()))
+    os.replace(temporario, caminho)
+
+def carregar_checkpoint(caminho):
+    # Reconstrói o armazenamento em memória a partir do checkpoint
+    with open(caminho, 'rb') as arquivo:
+        dados = arquivo.read()
+    if len(dados) < CABECALHO.size:
+        raise CheckpointInvalido('Checkpoint truncado')
+    magico, versao, marca_dagua, id_fonte, agora = CABECALHO.unpack_from(dados)
+    if magico != MAGICO:
+        raise CheckpointInvalido('Arquivo não é um checkpoint do ledger')
+    if versao != VERSAO:
+        raise CheckpointInvalido(f'Versão de checkpoint incompatível: {versao}')
+    try:
+        leitor = Leitor(zlib.decompress(dados[CABECALHO.size:]))
+    except zlib.error as e:
+        raise CheckpointInvalido(f'Checkpoint corrompido: {e}')
+
+    armazenamento = ArmazenamentoMemoria()
+    total, = leitor.unpack('I')
+    for _ in range(total):
+        id_usuario, saldo = leitor.unpack('qd')
+        armazenamento.adicionar_usuario(RegistroUsuario(id_usuario, leitor.texto(), saldo, leitor.horario()))
+
+    total, = leitor.unpack('I')
+    for _ in range(total):
+        id_seletor, saldo = leitor.unpack('qd')
+        armazenamento.adicionar_seletor(RegistroSeletor(id_seletor, leitor.texto(), saldo))
+
+    total, = leitor.unpack('I')
+    for _ in range(total):
+        id_validador, stake, seletor_id, flag, consecutivas, coerentes, hold, retornos = leitor.unpack('qdqqqqqq')
+        endereco, key, chave_seletor, status = (leitor.texto() for _ in range(4))
+        armazenamento.adicionar_validador(RegistroValidador(
+            id_validador, endereco, stake, key, chave_seletor, seletor_id, flag=flag, status=status, selecoes_consecutivas=consecutivas,
+            transacoes_coerentes=coerentes, transacoes_hold_restantes=hold, retorno_contagem=retornos
+        ))
+
+    ultimo_id, total = leitor.unpack('qI')
+    for _ in range(total):
+        id_remetente, quantidade = leitor.unpack('qI')
+        for _ in range(quantidade):
+            id_transacao, id_receptor, quantia, status = leitor.unpack('qqdb')
+            # As transações da janela só entram no índice por remetente; o histórico completo fica na fonte
+            armazenamento.indexar_transacao(RegistroTransacao(id_remetente, id_receptor, quantia, '', leitor.horario(), status, id_transacao))
+    armazenamento.ultimo_id = ultimo_id
+
+    estado_rng = None
+    tem_rng, = leitor.unpack('?')
+    if tem_rng:
+        versao_rng, tamanho = leitor.unpack('iI')
+        estado = leitor.unpack(f'{tamanho}I')
+        tem_gauss, gauss = leitor.unpack('?d')
+        estado_rng = (versao_rng, estado, gauss if tem_gauss else None)
+
+    return {
+        'armazenamento': armazenamento,
+        'marca_dagua': marca_dagua,
+        'id_fonte': None if id_fonte == NULO else id_fonte,
+        'agora': EPOCA + agora * UM_MICROSSEGUNDO,
+        'estado_rng': estado_rng,
+    }
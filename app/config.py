@@ -3,8 +3,65 @@ class Config:
     # URI de conexão com o banco de dados SQLAlchemy usando SQLite
     SQLALCHEMY_DATABASE_URI = 'sqlite:///banco.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Aplica na inicialização as migrações idempotentes do esquema (app/migracoes.py) a um banco já existente
+    MIGRAR_ESQUEMA = True
+    # Expõe a contagem de consultas, commits e tempo de banco de dados nos cabeçalhos da resposta
+    INSTRUMENTAR_CONSULTAS = False
+    # Número de repetições da mesma sentença SQL em uma requisição a partir do qual um possível N+1 é registrado no log
+    LIMITE_CONSULTAS_REPETIDAS = 20
+    # Perfil sob demanda: requisições com o cabeçalho X-Perfil: 1 ou ?perfil=1 são perfiladas com cProfile
+    PERFIL_HABILITADO = False
+    PERFIL_DIRETORIO = 'perfis' # Relativo à pasta instance
+    PERFIL_MAX_ARQUIVOS = 20 # Tamanho do anel de arquivos de perfil
+    # Número máximo de slots de uma agenda de comitês sorteada de uma vez
+    AGENDA_MAX_SLOTS = 10000
+    # Consenso paralelo: lotes com pelo menos CONSENSO_PARALELO_MIN_LOTE transações são particionados por remetente
+    CONSENSO_PARALELO = False
+    CONSENSO_PARALELO_MIN_LOTE = 64
+    CONSENSO_PARALELO_TRABALHADORES = None # Padrão: número de núcleos
+    CONSENSO_PARALELO_EXECUTOR = 'processo' # 'processo' ou 'thread'
+    # Fila de pendentes: transações sem comitê são adiadas com espera exponencial e descartadas após FILA_MAX_TENTATIVAS
+    FILA_LIMITE_DRENAGEM = 1000 # Máximo de pendentes antigas drenadas por requisição
+    FILA_MAX_TENTATIVAS = 8
+    FILA_ESPERA_BASE_S = 1
+    FILA_ESPERA_MAX_S = 300
+    FILA_ARRENDAMENTO_S = 60 # Tempo em que uma transação reivindicada por uma requisição não é drenada por outra
+    # Pré-validação do /trans: rejeita antes do consenso as transações certamente inválidas (vetorizada com numpy, se instalado)
+    PREVALIDACAO_LOTE = True
+    # Cadastro em lote: tamanho dos blocos das consultas IN e das gravações, e número máximo de itens por requisição
+    LOTE_TAMANHO_BLOCO = 500
+    LOTE_MAX_ITENS = 50000
+    # Cache de endereço -> valores dos validadores usado nas buscas por endereço do consenso e das rotas de administração
+    CACHE_VALIDADORES_MAX = 10000 # 0 desativa o cache
+    # Um acerto não consulta o banco; alterações de outros processos ou por SQL fora do ORM só são vistas quando a entrada expira.
+    # None (sem expiração) só é seguro com um único processo que altera os validadores apenas pelo ORM
+    CACHE_VALIDADORES_VALIDADE_S = 5
+    # Desempenho dos validadores: anéis com os últimos votos de cada um (latência, timeouts e concordância com o consenso final);
+    # com ESTATISTICAS_VALIDADORES_PONDERAR a seleção reduz o peso de quem passa da latência alvo ou estoura o timeout
+    ESTATISTICAS_VALIDADORES_ANEL = 256
+    ESTATISTICAS_VALIDADORES_TIMEOUT_MS = 250 # Votos mais lentos que isso contam como timeout
+    ESTATISTICAS_VALIDADORES_PONDERAR = False
+    ESTATISTICAS_VALIDADORES_LATENCIA_ALVO_MS = 50
+    ESTATISTICAS_VALIDADORES_VOTOS_MINIMOS = 20 # Votos na janela antes de o peso ser ajustado
+    ESTATISTICAS_VALIDADORES_FATOR_MINIMO = 0.1 # Piso do fator, para que o validador continue sendo sorteado
+    # Fonte dos votos dos validadores: votar(validador, transacao, validar_local) -> (valido, motivo), podendo levantar
+    # TimeoutError. Só os votos dela têm latência; sem ela o voto é a validação local e a ponderação acima fica inerte
+    VOTAR_VALIDADOR = None
+    # Serialização: JSON com orjson quando instalado e MessagePack negociado por Content-Type/Accept quando o msgpack estiver instalado
+    SERIALIZACAO_JSON_RAPIDO = True
+    SERIALIZACAO_MSGPACK = True
+    # Modo assíncrono (asgi.py): threads que executam a aplicação, requisições executando ao mesmo tempo (None: uma por thread),
+    # conexões admitidas, aguardando a vez no laço de eventos, antes de responder 503 e tamanho máximo do corpo
+    ASYNC_TRABALHADORES = 8
+    ASYNC_MAX_CONCORRENTES = None
+    ASYNC_MAX_PENDENTES = 10000
+    ASYNC_MAX_CORPO = 64 * 1024 * 1024
 
 # Definindo uma classe de configuração para testes
 class TestesConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///testes.db'
-    TESTING = True
\ No newline at end of file
+    TESTING = True
+    INSTRUMENTAR_CONSULTAS = True
+    PERFIL_HABILITADO = True
+    PERFIL_DIRETORIO = 'perfis_testes'
+    PERFIL_MAX_ARQUIVOS = 3
\ No newline at end of file
@@ -0,0 +1,133 @@
+import logging
+import math
+import threading
+from collections import deque
+from flask import current_app
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+class Anel:
+    # Buffer circular de tamanho fixo com a soma corrente dos valores
+    __slots__ = ('valores', 'soma')
+
+    def __init__(self, tamanho):
+        self.valores = deque(maxlen=tamanho)
+        self.soma = 0
+
+    def adicionar(self, valor):
+        if len(self.valores) == self.valores.maxlen:
+            self.soma -= self.valores[0]
+        self.valores.append(valor)
+        self.soma += valor
+
+    def media(self):
+        return self.soma / len(self.valores) if self.valores else None
+
+class DesempenhoValidador:
+    # Últimos votos de um validador: latência, se passou do timeout e se concordou com o consenso final
+    __slots__ = ('latencias', 'timeouts', 'concordancias', 'votos')
+
+    def __init__(self, tamanho):
+        self.latencias = Anel(tamanho)
+        self.timeouts = Anel(tamanho)
+        self.concordancias = Anel(tamanho)
+        self.votos = 0 # Total de votos desde o início, além da janela dos anéis
+
+class EstatisticasValidadores:
+    # Desempenho recente de cada validador, por id, em anéis de tamanho fixo: a memória não cresce com o
+    # número de votos. Com ponderar habilitado, a seleção de comitês reduz a probabilidade dos validadores
+    # cuja latência média passa da latência alvo ou que estouram o timeout. As latências só existem para os
+    # votos de uma fonte externa (VOTAR_VALIDADOR); com a validação local apenas a concordância é registrada
+    # e a ponderação fica inerte, com fator 1.0 para todos.
+    def __init__(self, tamanho_anel=256, timeout_ms=250, ponderar=False, latencia_alvo_ms=50, votos_minimos=20, fator_minimo=0.1):
+        self.tamanho_anel = tamanho_anel
+        self.timeout = timeout_ms / 1000
+        self.ponderar = ponderar
+        self.latencia_alvo = latencia_alvo_ms / 1000
+        self.votos_minimos = votos_minimos
+        self.fator_minimo = fator_minimo
+        self.validadores = {}
+        self.trava = threading.Lock()
+
+    def registrar_voto(self, id_validador, concordou, latencia=None, esgotado=False):
+        # Registra um voto; sem latência (voto local) apenas a concordância é registrada. Um voto esgotado
+        # pela fonte externa conta como timeout mesmo antes do timeout configurado
+        with self.trava:
+            desempenho = self.validadores.get(id_validador)
+            if desempenho is None:
+                desempenho = self.validadores[id_validador] = DesempenhoValidador(self.tamanho_anel)
+            desempenho.votos += 1
+            desempenho.concordancias.adicionar(1 if concordou else 0)
+            if latencia is not None:
+                desempenho.latencias.adicionar(latencia)
+                desempenho.timeouts.adicionar(1 if esgotado or latencia > self.timeout else 0)
+
+    def fator(self, id_validador):
+        # Multiplicador da probabilidade de seleção: 1.0 até haver votos suficientes ou sem ponderação
+        if not self.ponderar:
+            return 1.0
+        with self.trava:
+            desempenho = self.validadores.get(id_validador)
+            if desempenho is None or len(desempenho.latencias.valores) < self.votos_minimos:
+                return 1.0
+            media = desempenho.latencias.media()
+            taxa_timeouts = desempenho.timeouts.media()
+
+        fator = min(1.0, self.latencia_alvo / media) if media > 0 else 1.0
+        fator *= 1 - taxa_timeouts
+        # O piso mantém o validador nos sorteios, para que ele possa recuperar o peso com votos novos
+        return max(self.fator_minimo, fator)
+
+    def resumo(self, id_validador):
+        with self.trava:
+            desempenho = self.validadores.get(id_validador)
+            if desempenho is None:
+                return None
+            latencias = sorted(desempenho.latencias.valores)
+            resumo = {
+                'votos': desempenho.votos,
+                'janela': len(desempenho.concordancias.valores),
+                'concordancia': round(desempenho.concordancias.media(), 4),
+                'timeouts': desempenho.timeouts.soma,
+                'taxa_timeouts': round(desempenho.timeouts.media(), 4) if latencias else None,
+                'latencia_media_ms': round(desempenho.latencias.media() * 1000, 3) if latencias else None,
+                'latencia_p95_ms': round(latencias[math.ceil(0.95 * len(latencias)) - 1] * 1000, 3) if latencias else None,
+                'latencia_max_ms': round(latencias[-1] * 1000, 3) if latencias else None,
+            }
+        resumo['fator_selecao'] = round(self.fator(id_validador), 4)
+        return resumo
+
+    def esquecer(self, *ids_validadores):
+        # Descarta o histórico de validadores removidos
+        with self.trava:
+            for id_validador in ids_validadores:
+                self.validadores.pop(id_validador, None)
+
+    def estatisticas(self):
+        with self.trava:
+            ids = list(self.validadores)
+        return {
+            'tamanho_anel': self.tamanho_anel,
+            'timeout_ms': self.timeout * 1000,
+            'ponderar': self.ponderar,
+            'validadores': {id_validador: self.resumo(id_validador) for id_validador in ids},
+        }
+
+def estatisticas_atual():
+    return current_app.extensions['estatisticas_validadores']
+
+def esquecer(*ids_validadores):
+    estatisticas_atual().esquecer(*ids_validadores)
+
+def init_app(app):
+    # Cada aplicação tem as suas estatísticas, com os limites configurados
+    app.extensions['estatisticas_validadores'] = EstatisticasValidadores(
+        app.config.get('ESTATISTICAS_VALIDADORES_ANEL', 256),
+        app.config.get('ESTATISTICAS_VALIDADORES_TIMEOUT_MS', 250),
+        app.config.get('ESTATISTICAS_VALIDADORES_PONDERAR', False),
+        app.config.get('ESTATISTICAS_VALIDADORES_LATENCIA_ALVO_MS', 50),
+        app.config.get('ESTATISTICAS_VALIDADORES_VOTOS_MINIMOS', 20),
+        app.config.get('ESTATISTICAS_VALIDADORES_FATOR_MINIMO', 0.1),
+    )
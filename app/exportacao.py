@@ -0,0 +1,234 @@
+import array
+import json
+import logging
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.types import DateTime, Float, Integer
+from .models import Transacao, Usuario, Validador
+
+# Dependência opcional: sem o pyarrow a exportação só grava o formato bruto
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Exportação colunar do ledger para análise fora do banco de produção. No formato bruto cada coluna de
+# cada parte é um arquivo binário little-endian que pode ser mapeado em memória (numpy.memmap ou
+# numpy.fromfile com o dtype do manifesto); textos são gravados como offsets int64 mais os bytes UTF-8,
+# no mesmo layout das colunas de texto do Arrow. No formato parquet cada parte é um arquivo Parquet.
+
+VERSAO_MANIFESTO = 1
+NOME_MANIFESTO = 'manifesto.json'
+FORMATOS = ('bruto', 'parquet')
+
+# Tabelas exportadas: transações são exportadas de forma incremental a partir da marca d'água;
+# usuários e validadores mudam de estado e são exportados como um instantâneo completo a cada vez
+TABELAS = {
+    'transacao': (Transacao.__table__, True),
+    'usuario': (Usuario.__table__, False),
+    'validador': (Validador.__table__, False),
+}
+
+# dtype do numpy correspondente a cada tipo de coluna; textos usam offsets int64
+DTYPES = {'int64': '<i8', 'float64': '<f8', 'timestamp_us': '<M8[us]', 'utf8': '<i8'}
+EPOCA = datetime(1970, 1, 1)
+UM_MICROSSEGUNDO = timedelta(microseconds=1)
+
+def tipo_coluna(coluna):
+    # Tipo colunar de uma coluna do SQLAlchemy
+    if isinstance(coluna.type, Integer):
+        return 'int64'
+    if isinstance(coluna.type, Float):
+        return 'float64'
+    if isinstance(coluna.type, DateTime):
+        return 'timestamp_us'
+    return 'utf8'
+
+def gravar_array(caminho, valores):
+    # Grava um array.array em little-endian, independente da arquitetura
+    if sys.byteorder == 'big':
+        valores.byteswap()
+    with open(caminho, 'wb') as arquivo:
+        valores.tofile(arquivo)
+
+def gravar_parte_bruta(diretorio, tipos, linhas):
+    # Grava uma parte no formato bruto: um arquivo por coluna, mais a máscara de válidos se houver nulos
+    os.makedirs(diretorio, exist_ok=True)
+    colunas = {}
+    for indice, (nome, tipo) in enumerate(tipos.items()):
+        valores = [linha[indice] for linha in linhas]
+        entrada = {'tipo': tipo, 'dtype': DTYPES[tipo]}
+
+        if tipo == 'utf8':
+            offsets = array.array('q', [0])
+            dados = bytearray()
+            for valor in valores:
+                if valor is not None:
+                    dados += str(valor).encode('utf-8')
+                offsets.append(len(dados))
+            gravar_array(os.path.join(diretorio, f'{nome}.offsets'), offsets)
+            with open(os.path.join(diretorio, f'{nome}.dados'), 'wb') as arquivo:
+                arquivo.write(dados)
+            entrada.update(offsets=f'{nome}.offsets', dados=f'{nome}.dados')
+        elif tipo == 'float64':
+            gravar_array(os.path.join(diretorio, f'{nome}.bin'), array.array('d', (float('nan') if v is None else v for v in valores)))
+            entrada['arquivo'] = f'{nome}.bin'
+        else:
+            if tipo == 'timestamp_us':
+                valores = [None if v is None else (v - EPOCA) // UM_MICROSSEGUNDO for v in valores]
+            gravar_array(os.path.join(diretorio, f'{nome}.bin'), array.array('q', (0 if v is None else v for v in valores)))
+            entrada['arquivo'] = f'{nome}.bin'
+
+        if any(valor is None for valor in valores):
+            gravar_array(os.path.join(diretorio, f'{nome}.validos'), array.array('B', (valor is not None for valor in valores)))
+            entrada['validos'] = f'{nome}.validos'
+        colunas[nome] = entrada
+    return colunas
+
+def gravar_parte_parquet(caminho, tipos, linhas):
+    # Grava uma parte como um arquivo Parquet
+    tipos_arrow = {'int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'timestamp_us': pyarrow.timestamp('us'), 'utf8': pyarrow.string()}
+    tabela = pyarrow.table({
+        nome: pyarrow.array([linha[indice] for linha in linhas], type=tipos_arrow[tipo])
+        for indice, (nome, tipo) in enumerate(tipos.items())
+    })
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    pyarrow.parquet.write_table(tabela, caminho)
+    return {nome: {'tipo': tipo} for nome, tipo in tipos.items()}
+
+def ler_manifesto(destino):
+    caminho = os.path.join(destino, NOME_MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def gravar_manifesto(destino, manifesto):
+    # Grava o manifesto de forma atômica: leitores nunca veem um manifesto parcial
+    temporario = os.path.join(destino, NOME_MANIFESTO + '.tmp')
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2)
+    os.replace(temporario, os.path.join(destino, NOME_MANIFESTO))
+
+def limite_incremental(conexao, tabela, marca_dagua):
+    # As transações pendentes ainda podem mudar de status: a exportação incremental para antes da mais
+    # antiga delas, que será exportada quando for validada, rejeitada ou descartada
+    consulta = select(func.min(tabela.c.id)).where(tabela.c.status == 0)
+    if marca_dagua is not None:
+        consulta = consulta.where(tabela.c.id > marca_dagua)
+    return conexao.execute(consulta).scalar()
+
+def exportar_tabela(conexao, destino, nome, formato, linhas_por_parte, anterior):
+    tabela, incremental = TABELAS[nome]
+    # Só as colunas do modelo que existem no banco: um banco anterior a uma migração (aberto somente para
+    # leitura, sem como migrar) é exportado com as colunas que tem
+    existentes = {coluna['name'] for coluna in inspect(conexao).get_columns(nome)}
+    colunas_exportadas = [coluna for coluna in tabela.columns if coluna.name in existentes]
+    tipos = {coluna.name: tipo_coluna(coluna) for coluna in colunas_exportadas}
+    marca_dagua = anterior.get('marca_dagua') if incremental and anterior else None
+
+    consulta = select(*colunas_exportadas).order_by(tabela.c.id)
+    if incremental:
+        partes = list(anterior['partes']) if anterior else []
+        prefixo = nome
+        if marca_dagua is not None:
+            consulta = consulta.where(tabela.c.id > marca_dagua)
+        limite = limite_incremental(conexao, tabela, marca_dagua)
+        if limite is not None:
+            consulta = consulta.where(tabela.c.id < limite)
+    else:
+        # Cada instantâneo vai para um diretório novo; o anterior é apagado depois do manifesto gravado
+        partes = []
+        prefixo = os.path.join(nome, f"instantaneo-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}")
+
+    # Cursor no servidor: as linhas são lidas em blocos, sem carregar a tabela inteira em memória
+    resultado = conexao.execution_options(stream_results=True, yield_per=linhas_por_parte).execute(consulta)
+    novas = 0
+    for bloco in resultado.partitions():
+        numero = len(partes) + 1
+        if formato == 'parquet':
+            caminho = os.path.join(prefixo, f'parte-{numero:06d}.parquet')
+            colunas = gravar_parte_parquet(os.path.join(destino, caminho), tipos, bloco)
+        else:
+            caminho = os.path.join(prefixo, f'parte-{numero:06d}')
+            colunas = gravar_parte_bruta(os.path.join(destino, caminho), tipos, bloco)
+        partes.append({'caminho': caminho, 'linhas': len(bloco), 'id_min': bloco[0].id, 'id_max': bloco[-1].id, 'colunas': colunas})
+        marca_dagua = bloco[-1].id if incremental else marca_dagua
+        novas += len(bloco)
+
+    logger.debug(f"Exportação de {nome}: {novas} linhas em {len(partes)} partes")
+    return {
+        'incremental': incremental,
+        'tipos': tipos,
+        'linhas': sum(parte['linhas'] for parte in partes),
+        'marca_dagua': marca_dagua,
+        'diretorio': prefixo,
+        'partes': partes,
+    }, novas
+
+def exportar(url, destino, formato='bruto', linhas_por_parte=100000, tabelas=None):
+    # Exporta as tabelas para o diretório de destino, continuando a partir do manifesto existente
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconhecido: {formato}')
+    if formato == 'parquet' and pyarrow is None:
+        raise RuntimeError('O formato parquet requer o pyarrow instalado')
+
+    os.makedirs(destino, exist_ok=True)
+    manifesto = ler_manifesto(destino) or {'versao': VERSAO_MANIFESTO, 'formato': formato, 'tabelas': {}}
+    if manifesto['formato'] != formato:
+        raise ValueError(f"O destino já contém uma exportação no formato {manifesto['formato']}")
+
+    engine = create_engine(url)
+    resumo = {}
+    instantaneos_antigos = []
+    try:
+        with engine.connect() as conexao:
+            for nome in tabelas or TABELAS:
+                anterior = manifesto['tabelas'].get(nome)
+                manifesto['tabelas'][nome], resumo[nome] = exportar_tabela(conexao, destino, nome, formato, linhas_por_parte, anterior)
+                if anterior and not anterior['incremental']:
+                    instantaneos_antigos.append(anterior['diretorio'])
+    finally:
+        engine.dispose()
+
+    manifesto['exportado_em'] = datetime.utcnow().isoformat()
+    gravar_manifesto(destino, manifesto)
+    for diretorio in instantaneos_antigos:
+        shutil.rmtree(os.path.join(destino, diretorio), ignore_errors=True)
+    return resumo
+
+def ler_coluna_bruta(destino, parte, nome):
+    # Lê uma coluna de uma parte no formato bruto como lista Python, sem depender do numpy
+    entrada = parte['colunas'][nome]
+    diretorio = os.path.join(destino, parte['caminho'])
+
+    def ler(arquivo, codigo):
+        valores = array.array(codigo)
+        with open(os.path.join(diretorio, arquivo), 'rb') as origem:
+            valores.frombytes(origem.read())
+        if sys.byteorder == 'big':
+            valores.byteswap()
+        return valores
+
+    if entrada['tipo'] == 'utf8':
+        offsets = ler(entrada['offsets'], 'q')
+        with open(os.path.join(diretorio, entrada['dados']), 'rb') as origem:
+            dados = origem.read()
+        valores = [dados[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+    else:
+        valores = list(ler(entrada['arquivo'], 'd' if entrada['tipo'] == 'float64' else 'q'))
+        if entrada['tipo'] == 'timestamp_us':
+            valores = [EPOCA + v * UM_MICROSSEGUNDO for v in valores]
+
+    if 'validos' in entrada:
+        validos = ler(entrada['validos'], 'B')
+        valores = [valor if valido else None for valor, valido in zip(valores, validos)]
+    return valores
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, update
+from .models import db, Transacao
+from .chaves import conjunto_chaves, digest_chave
+from .validacao import gerar_chave
+import logging
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Estados da transação na fila
+STATUS_PENDENTE = 0
+STATUS_VALIDADA = 1
+STATUS_REJEITADA = 2
+STATUS_DESCARTADA = 3
+
+def arrendamento(agora=None):
+    # Horário até o qual uma transação reivindicada por uma requisição não é drenada por outra
+    agora = agora or datetime.utcnow()
+    return agora + timedelta(seconds=current_app.config.get('FILA_ARRENDAMENTO_S', 60))
+
+def drenar(excluir_ids=(), agora=None):
+    # Reivindica no máximo FILA_LIMITE_DRENAGEM transações pendentes cujo horário de nova tentativa já chegou.
+    # Um único UPDATE move a próxima tentativa para o fim do arrendamento, só nas linhas que ainda estão
+    # prontas, e devolve os ids reivindicados: duas requisições concorrentes nunca processam a mesma
+    # transação. Se a requisição cair no meio, a transação volta a ficar pronta quando o arrendamento acaba
+    agora = agora or datetime.utcnow()
+    limite = current_app.config.get('FILA_LIMITE_DRENAGEM', 1000)
+    prontas = select(Transacao.id).where(Transacao.status == STATUS_PENDENTE, Transacao.proxima_tentativa <= agora)
+    if excluir_ids:
+        prontas = prontas.where(Transacao.id.notin_(list(excluir_ids)))
+    prontas = prontas.order_by(Transacao.proxima_tentativa, Transacao.id).limit(limite)
+    ids = db.session.scalars(
+        update(Transacao)
+        .where(Transacao.id.in_(prontas), Transacao.status == STATUS_PENDENTE, Transacao.proxima_tentativa <= agora)
+        .values(proxima_tentativa=arrendamento(agora))
+        .returning(Transacao.id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    if not ids:
+        return []
+    db.session.commit()
+    return Transacao.query.filter(Transacao.id.in_(ids)).order_by(Transacao.id).all()
+
+def rechavear(transacoes, comite):
+    # As transações drenadas são julgadas pelo comitê atual, que não existia ou era outro quando as chaves foram
+    # geradas. Sem as chaves desse comitê os validadores honestos rejeitariam a transação e seriam marcados como
+    # maliciosos; as chaves passam a ser as que o seletor gera para o comitê atual
+    if not transacoes or not comite:
+        return
+    esperadas = [digest_chave(gerar_chave(validador.seletor_id, validador.endereco)) for validador in comite]
+    for transacao in transacoes:
+        if not conjunto_chaves(transacao.keys_validacao).issuperset(esperadas):
+            transacao.keys_validacao = "".join(esperadas)
+
+def espera(tentativas):
+    # Espera exponencial entre as tentativas, limitada a FILA_ESPERA_MAX_S
+    base = current_app.config.get('FILA_ESPERA_BASE_S', 1)
+    maximo = current_app.config.get('FILA_ESPERA_MAX_S', 300)
+    return timedelta(seconds=min(base * 2 ** max(tentativas - 1, 0), maximo))
+
+# Mensagens de cada causa de adiamento: (em espera, descartada)
+CAUSAS = {
+    'sem_comite': ('Transação em espera: validadores não selecionados', 'Transação descartada: sem validadores após todas as tentativas'),
+    'falha_lote': ('Transação em espera: falha ao processar o lote', 'Transação descartada: falha ao processar o lote em todas as tentativas'),
+}
+
+def adiar(transacoes, agora=None, causa='sem_comite'):
+    # Adia as transações sem comitê disponível ou de um lote que falhou; esgotadas as tentativas, elas são descartadas
+    agora = agora or datetime.utcnow()
+    max_tentativas = current_app.config.get('FILA_MAX_TENTATIVAS', 8)
+    em_espera, descartada = CAUSAS[causa]
+    resultados = []
+    for transacao in transacoes:
+        transacao.tentativas = (transacao.tentativas or 0) + 1
+        if transacao.tentativas >= max_tentativas:
+            transacao.status = STATUS_DESCARTADA
+            logger.debug(f"Transação {transacao.id} descartada após {transacao.tentativas} tentativas ({causa})")
+            resultados.append({'id_transacao': transacao.id, 'mensagem': descartada, 'status': 'descartada', 'status_code': 503})
+        else:
+            transacao.proxima_tentativa = agora + espera(transacao.tentativas)
+            resultados.append({
+                'id_transacao': transacao.id, 'mensagem': em_espera, 'status': 'em_espera',
+                'status_code': 202, 'proxima_tentativa': transacao.proxima_tentativa.isoformat()
+            })
+    db.session.commit()
+    return resultados
+
+def estatisticas(agora=None):
+    # Contagem das transações por estado e das pendentes prontas ou aguardando nova tentativa
+    agora = agora or datetime.utcnow()
+    por_status = dict(db.session.query(Transacao.status, func.count(Transacao.id)).group_by(Transacao.status).all())
+    prontas = Transacao.query.filter(Transacao.status == STATUS_PENDENTE, Transacao.proxima_tentativa <= agora).count()
+    pendentes = por_status.get(STATUS_PENDENTE, 0)
+    return {
+        'pendentes': pendentes,
+        'prontas': prontas,
+        'aguardando': pendentes - prontas,
+        'validadas': por_status.get(STATUS_VALIDADA, 0),
+        'rejeitadas': por_status.get(STATUS_REJEITADA, 0),
+        'descartadas': por_status.get(STATUS_DESCARTADA, 0),
+    }
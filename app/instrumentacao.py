@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import event
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Estado por thread: contadores ativos e etapa atual do pipeline
+_local = threading.local()
+
+class ContadorConsultas:
+    # Acumula consultas, commits e tempo de banco de dados de uma requisição ou de um bloco de código
+    def __init__(self):
+        self.consultas = 0
+        self.commits = 0
+        self.tempo_db = 0.0
+        self.etapas = {}  # Nome da etapa -> [consultas, commits, tempo]
+        self.sentencas = Counter()  # Número de execuções de cada sentença SQL
+
+    def _etapa(self, nome):
+        return self.etapas.setdefault(nome or 'geral', [0, 0, 0.0])
+
+    def registrar_consulta(self, sentenca, duracao, etapa):
+        self.consultas += 1
+        self.tempo_db += duracao
+        self.sentencas[sentenca] += 1
+        dados_etapa = self._etapa(etapa)
+        dados_etapa[0] += 1
+        dados_etapa[2] += duracao
+
+    def registrar_commit(self, etapa):
+        self.commits += 1
+        self._etapa(etapa)[1] += 1
+
+    def repetidas(self, limite):
+        # Sentenças executadas mais vezes que o limite (indício de N+1)
+        return {sentenca: total for sentenca, total in self.sentencas.items() if total > limite}
+
+def _contadores_ativos():
+    contadores = getattr(_local, 'contadores', None)
+    if contadores is None:
+        contadores = _local.contadores = []
+    return contadores
+
+def _etapa_atual():
+    return getattr(_local, 'etapa', None)
+
+def _antes_execucao(conn, cursor, statement, parameters, context, executemany):
+    # Empilha o instante de início para suportar execuções aninhadas
+    conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+def _depois_execucao(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info['inicio_consulta'].pop()
+    contadores = _contadores_ativos()
+    if not contadores:
+        return
+    duracao = time.perf_counter() - inicio
+    etapa_atual = _etapa_atual()
+    for contador in contadores:
+        contador.registrar_consulta(statement, duracao, etapa_atual)
+
+def _commit(conn):
+    etapa_atual = _etapa_atual()
+    for contador in _contadores_ativos():
+        contador.registrar_commit(etapa_atual)
+
+def instrumentar_engine(engine):
+    # Registra os eventos do SQLAlchemy que alimentam os contadores
+    event.listen(engine, 'before_cursor_execute', _antes_execucao)
+    event.listen(engine, 'after_cursor_execute', _depois_execucao)
+    event.listen(engine, 'commit', _commit)
+
+@contextmanager
+def etapa(nome):
+    # Atribui as consultas executadas dentro do bloco a uma etapa do pipeline
+    etapa_anterior = _etapa_atual()
+    _local.etapa = nome
+    try:
+        yield
+    finally:
+        _local.etapa = etapa_anterior
+
+@contextmanager
+def contar_consultas():
+    # Conta as consultas executadas dentro do bloco
+    contador = ContadorConsultas()
+    _contadores_ativos().append(contador)
+    try:
+        yield contador
+    finally:
+        _contadores_ativos().remove(contador)
+
+@contextmanager
+def orcamento_consultas(maximo_consultas=None, maximo_commits=None):
+    # Auxiliar de testes: falha se o bloco exceder o orçamento de consultas ou commits
+    with contar_consultas() as contador:
+        yield contador
+    if maximo_consultas is not None and contador.consultas > maximo_consultas:
+        raise AssertionError(f"Orçamento de consultas excedido: {contador.consultas} > {maximo_consultas} (etapas: {contador.etapas})")
+    if maximo_commits is not None and contador.commits > maximo_commits:
+        raise AssertionError(f"Orçamento de commits excedido: {contador.commits} > {maximo_commits} (etapas: {contador.etapas})")
+
+def _iniciar_contagem_requisicao():
+    contador = ContadorConsultas()
+    _contadores_ativos().append(contador)
+    _local.contador_requisicao = contador
+    _local.etapa = None
+
+def _adicionar_cabecalhos(resposta):
+    contador = getattr(_local, 'contador_requisicao', None)
+    if contador is None:
+        return resposta
+
+    # Registra no log as sentenças repetidas demais dentro da requisição
+    repetidas = contador.repetidas(current_app.config.get('LIMITE_CONSULTAS_REPETIDAS', 20))
+    for sentenca, total in repetidas.items():
+        logger.warning(f"Possível N+1: sentença executada {total} vezes na mesma requisição: {sentenca}")
+
+    # Expõe os números nos cabeçalhos apenas em modo de depuração
+    if current_app.debug or current_app.config.get('INSTRUMENTAR_CONSULTAS'):
+        resposta.headers['X-DB-Consultas'] = str(contador.consultas)
+        resposta.headers['X-DB-Commits'] = str(contador.commits)
+        resposta.headers['X-DB-Tempo-ms'] = f"{contador.tempo_db * 1000:.3f}"
+        resposta.headers['X-DB-Etapas'] = ";".join(
+            f"{nome}={consultas}/{commits}/{tempo * 1000:.3f}ms" for nome, (consultas, commits, tempo) in contador.etapas.items()
+        )
+        resposta.headers['X-DB-Repetidas'] = str(len(repetidas))
+    return resposta
+
+def _encerrar_contagem_requisicao(excecao=None):
+    contador = getattr(_local, 'contador_requisicao', None)
+    if contador is not None:
+        if contador in _contadores_ativos():
+            _contadores_ativos().remove(contador)
+        _local.contador_requisicao = None
+    _local.etapa = None
+
+def init_app(app):
+    # Instrumenta o engine da aplicação e registra a contagem por requisição
+    from .models import db
+    with app.app_context():
+        instrumentar_engine(db.engine)
+    app.before_request(_iniciar_contagem_requisicao)
+    app.after_request(_adicionar_cabecalhos)
+    app.teardown_request(_encerrar_contagem_requisicao)
@@ -0,0 +1,52 @@
+import logging
+from sqlalchemy import inspect, text
+from .models import db, Transacao
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Migrações do esquema de bancos criados antes das colunas atuais. O db.create_all() só cria tabelas
+# novas e não altera as existentes; estas alterações são idempotentes e rodam na inicialização.
+# Cada entrada: (tabela, coluna, valor padrão em SQL para as linhas já existentes)
+COLUNAS_ADICIONADAS = (
+    ('transacao', 'tentativas', '0'),
+    ('transacao', 'proxima_tentativa', "'1970-01-01 00:00:00'"), # Pendentes antigas ficam prontas para a drenagem
+)
+
+def atualizar_esquema(engine):
+    # Adiciona as colunas e índices que faltam nas tabelas existentes; retorna as alterações aplicadas
+    inspetor = inspect(engine)
+    tabelas = set(inspetor.get_table_names())
+    aplicadas = []
+    with engine.begin() as conexao:
+        for tabela, coluna, padrao in COLUNAS_ADICIONADAS:
+            if tabela not in tabelas or coluna in {c['name'] for c in inspetor.get_columns(tabela)}:
+                continue
+            tipo = db.metadata.tables[tabela].c[coluna].type.compile(dialect=engine.dialect)
+            conexao.execute(text(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo} NOT NULL DEFAULT {padrao}'))
+            aplicadas.append(f'{tabela}.{coluna}')
+
+        if 'transacao' in tabelas:
+            existentes = {indice['name'] for indice in inspetor.get_indexes('transacao')}
+            for indice in Transacao.__table__.indexes:
+                if indice.name not in existentes:
+                    indice.create(conexao)
+                    aplicadas.append(indice.name)
+
+            # keys_validacao passou de VARCHAR(100) para TEXT. ALTER COLUMN ... TYPE é sintaxe do PostgreSQL;
+            # o SQLite não aplica o tamanho do VARCHAR e não precisa da mudança, e outros dialetos usam outra sintaxe
+            colunas = {c['name']: c for c in inspetor.get_columns('transacao')}
+            if engine.dialect.name == 'postgresql' and getattr(colunas['keys_validacao']['type'], 'length', None):
+                conexao.execute(text('ALTER TABLE transacao ALTER COLUMN keys_validacao TYPE TEXT'))
+                aplicadas.append('transacao.keys_validacao')
+
+    if aplicadas:
+        logger.info(f"Esquema do banco atualizado: {', '.join(aplicadas)}")
+    return aplicadas
+
+def init_app(app):
+    # Atualiza o esquema de um banco existente na inicialização, quando configurado
+    if app.config.get('MIGRAR_ESQUEMA', True):
+        with app.app_context():
+            atualizar_esquema(db.engine)
@@ -16,9 +16,14 @@ class Transacao(db.Model):
     id_remetente = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     id_receptor = db.Column(db.Integer, db.ForeignKey('usuario.id'), nullable=False)
     quantia = db.Column(db.Float, nullable=False)
-    status = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Integer, nullable=False) # 0 pendente, 1 validada, 2 rejeitada, 3 descartada após esgotar as tentativas
     horario = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    keys_validacao = db.Column(db.String(100), nullable=False) # Coluna para armazenar as chaves únicas de validação
+    keys_validacao = db.Column(db.Text, nullable=False) # Digests de tamanho fixo das chaves únicas de validação, concatenados (ver app/chaves.py)
+    tentativas = db.Column(db.Integer, nullable=False, default=0) # Tentativas de consenso adiadas por falta de comitê
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # A transação pendente só é drenada a partir deste horário
+
+    # Índice da fila de pendentes: a drenagem lê apenas as transações com status 0 prontas para nova tentativa
+    __table_args__ = (db.Index('ix_transacao_fila', 'status', 'proxima_tentativa'),)
 
 # Classe Seletor
 class Seletor(db.Model):
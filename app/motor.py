@@ -0,0 +1,686 @@
+import bisect
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from .chaves import chave_valida
+from .reputacao import LIMITE_FLAGS, LIMITE_TRANSACOES_COERENTES, ReputacaoLote
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+TAMANHO_COMITE = 3 # Número de validadores selecionados por transação
+TAXA_TRANSACAO = 0.015 # Taxa exigida do remetente (1,5% da quantia)
+TAXA_SELETOR = 0.015 # 1,5% da quantia transacionada
+TAXA_VALIDADORES = 0.01 # 1% da quantia transacionada, dividida entre os validadores honestos
+TAXA_TRAVADA = 0.005 # 0,5% da quantia transacionada para cada validador honesto
+LIMITE_TRANSACOES_MINUTO = 100 # Acima disso o remetente é bloqueado por um minuto
+LIMITE_SELECOES_CONSECUTIVAS = 5 # Seleções consecutivas antes de colocar o validador em hold
+TRANSACOES_HOLD = 5 # Transações em hold após o limite de seleções consecutivas
+FATOR_FLAG = {1: 0.5, 2: 0.25} # Redução da probabilidade de seleção por número de flags
+
+# Motivos de rejeição que não indicam um validador malicioso
+MOTIVOS_LEGITIMOS = (
+    'Saldo insuficiente',
+    'Horário incorreto',
+    'Transação anterior à última',
+    'Número de transações excedido, remetente bloqueado',
+    'Remetente bloqueado',
+)
+
+# Voto de uma fonte externa que não respondeu a tempo: não aprova, mas também não indica um validador malicioso
+MOTIVO_TEMPO_ESGOTADO = 'Tempo de voto esgotado'
+
+# Registros compactos usados pelo armazenamento em memória, com os mesmos atributos dos modelos
+class RegistroUsuario:
+    __slots__ = ('id', 'nome', 'saldo', 'tempo_bloqueio')
+
+    def __init__(self, id, nome, saldo=0.0, tempo_bloqueio=None):
+        self.id = id
+        self.nome = nome
+        self.saldo = saldo
+        self.tempo_bloqueio = tempo_bloqueio
+
+class RegistroSeletor:
+    __slots__ = ('id', 'endereco', 'saldo')
+
+    def __init__(self, id, endereco, saldo=0.0):
+        self.id = id
+        self.endereco = endereco
+        self.saldo = saldo
+
+class RegistroValidador:
+    __slots__ = (
+        'id', 'endereco', 'stake', 'key', 'chave_seletor', 'flag', 'status', 'selecoes_consecutivas',
+        'transacoes_coerentes', 'transacoes_hold_restantes', 'retorno_contagem', 'seletor_id'
+    )
+
+    def __init__(self, id, endereco, stake, key, chave_seletor, seletor_id, flag=0, status='ativo', selecoes_consecutivas=0,
+                 transacoes_coerentes=0, transacoes_hold_restantes=0, retorno_contagem=0):
+        self.id = id
+        self.endereco = endereco
+        self.stake = stake
+        self.key = key
+        self.chave_seletor = chave_seletor
+        self.seletor_id = seletor_id
+        self.flag = flag
+        self.status = status
+        self.selecoes_consecutivas = selecoes_consecutivas
+        self.transacoes_coerentes = transacoes_coerentes
+        self.transacoes_hold_restantes = transacoes_hold_restantes
+        self.retorno_contagem = retorno_contagem
+
+class RegistroTransacao:
+    __slots__ = ('id', 'id_remetente', 'id_receptor', 'quantia', 'status', 'horario', 'keys_validacao')
+
+    def __init__(self, id_remetente, id_receptor, quantia, keys_validacao, horario, status=0, id=None):
+        self.id = id
+        self.id_remetente = id_remetente
+        self.id_receptor = id_receptor
+        self.quantia = quantia
+        self.status = status
+        self.horario = horario
+        self.keys_validacao = keys_validacao
+
+class Armazenamento:
+    # Interface de armazenamento usada pelo motor do ledger
+    tipo_transacao = RegistroTransacao
+
+    def obter_usuario(self, id_usuario):
+        raise NotImplementedError
+
+    def obter_seletor(self, id_seletor):
+        raise NotImplementedError
+
+    def obter_validador(self, endereco):
+        raise NotImplementedError
+
+    def validadores_ativos(self, seletor_id):
+        raise NotImplementedError
+
+    def validadores_do_seletor(self, seletor_id):
+        # Validadores ativos ou em hold, que participam da agenda de comitês
+        raise NotImplementedError
+
+    def atualizar_validadores(self, alteracoes):
+        # Aplica as alterações agrupadas por (coluna, valor) aos validadores de cada grupo de ids
+        raise NotImplementedError
+
+    def ultima_transacao(self, id_remetente, ate_id=None):
+        # Transação mais recente do remetente, considerando apenas ids até ate_id quando informado
+        raise NotImplementedError
+
+    def contar_transacoes_desde(self, id_remetente, desde, ate_id=None):
+        # Número de transações do remetente após o horário, considerando apenas ids até ate_id quando informado
+        raise NotImplementedError
+
+    def obter_usuarios(self, ids_usuarios):
+        # Usuários dos ids informados de uma só vez, por id; ids inexistentes ficam de fora
+        raise NotImplementedError
+
+    def historico_remetentes(self, ids_remetentes, id_min, id_max, desde):
+        # Resumo das transações de cada remetente com id abaixo de id_min (maior horário e quantas após desde)
+        # e as tuplas (remetente, id, horário) das transações com id entre id_min e id_max, ordenadas por remetente e id
+        raise NotImplementedError
+
+    def adicionar_transacao(self, transacao):
+        raise NotImplementedError
+
+    def confirmar(self):
+        raise NotImplementedError
+
+class ArmazenamentoMemoria(Armazenamento):
+    # Armazenamento puramente em memória, para simulações e testes sem banco de dados
+    def __init__(self):
+        self.usuarios = {}
+        self.seletores = {}
+        self.validadores = {} # Endereço -> validador
+        self.transacoes = []
+        self.ultimo_id = 0 # Maior id de transação atribuído, inclusive antes de um checkpoint
+        self._horarios_remetente = {} # Remetente -> horários ordenados das suas transações
+        self._transacoes_remetente = {} # Remetente -> transações na mesma ordem dos horários
+
+    def adicionar_usuario(self, usuario):
+        self.usuarios[usuario.id] = usuario
+        return usuario
+
+    def adicionar_seletor(self, seletor):
+        self.seletores[seletor.id] = seletor
+        return seletor
+
+    def adicionar_validador(self, validador):
+        self.validadores[validador.endereco] = validador
+        return validador
+
+    def obter_usuario(self, id_usuario):
+        return self.usuarios.get(id_usuario)
+
+    def obter_seletor(self, id_seletor):
+        return self.seletores.get(id_seletor)
+
+    def obter_validador(self, endereco):
+        return self.validadores.get(endereco)
+
+    def validadores_ativos(self, seletor_id):
+        return [validador for validador in self.validadores.values() if validador.status == 'ativo' and validador.seletor_id == seletor_id]
+
+    def validadores_do_seletor(self, seletor_id):
+        return [validador for validador in self.validadores.values() if validador.status in ('ativo', 'on_hold') and validador.seletor_id == seletor_id]
+
+    def atualizar_validadores(self, alteracoes):
+        por_id = {validador.id: validador for validador in self.validadores.values()}
+        for mudancas, ids in alteracoes.items():
+            for id_validador in ids:
+                for coluna, valor in mudancas:
+                    setattr(por_id[id_validador], coluna, valor)
+
+    def ultima_transacao(self, id_remetente, ate_id=None):
+        for transacao in reversed(self._transacoes_remetente.get(id_remetente, [])):
+            if ate_id is None or transacao.id <= ate_id:
+                return transacao
+        return None
+
+    def contar_transacoes_desde(self, id_remetente, desde, ate_id=None):
+        horarios = self._horarios_remetente.get(id_remetente, [])
+        posicao = bisect.bisect_right(horarios, desde)
+        if ate_id is None:
+            return len(horarios) - posicao
+        return sum(1 for transacao in self._transacoes_remetente[id_remetente][posicao:] if transacao.id <= ate_id)
+
+    def obter_usuarios(self, ids_usuarios):
+        return {id_usuario: self.usuarios[id_usuario] for id_usuario in ids_usuarios if id_usuario in self.usuarios}
+
+    def historico_remetentes(self, ids_remetentes, id_min, id_max, desde):
+        resumo, linhas = {}, []
+        for id_remetente in sorted(ids_remetentes):
+            transacoes = self._transacoes_remetente.get(id_remetente, [])
+            anteriores = [transacao for transacao in transacoes if transacao.id < id_min]
+            if anteriores:
+                resumo[id_remetente] = (max(t.horario for t in anteriores), sum(1 for t in anteriores if t.horario > desde))
+            linhas.extend(sorted((id_remetente, t.id, t.horario) for t in transacoes if id_min <= t.id <= id_max))
+        return resumo, linhas
+
+    def adicionar_transacao(self, transacao):
+        if transacao.id is None:
+            transacao.id = self.ultimo_id + 1
+        self.transacoes.append(transacao)
+        return self.indexar_transacao(transacao)
+
+    def indexar_transacao(self, transacao):
+        # Mantém o índice por remetente ordenado por horário
+        self.ultimo_id = max(self.ultimo_id, transacao.id)
+        horarios = self._horarios_remetente.setdefault(transacao.id_remetente, [])
+        transacoes = self._transacoes_remetente.setdefault(transacao.id_remetente, [])
+        posicao = bisect.bisect_right(horarios, transacao.horario)
+        horarios.insert(posicao, transacao.horario)
+        transacoes.insert(posicao, transacao)
+        return transacao
+
+    def confirmar(self):
+        pass
+
+class TabelaValidadores:
+    # Estado de seleção dos validadores mantido em listas paralelas durante uma rodada de seleção;
+    # as transições são agrupadas e gravadas de uma só vez no final
+    COLUNAS = ('status', 'transacoes_hold_restantes', 'selecoes_consecutivas')
+
+    def __init__(self, validadores):
+        self.validadores = list(validadores)
+        self.status = [validador.status for validador in self.validadores]
+        self.hold = [validador.transacoes_hold_restantes or 0 for validador in self.validadores]
+        self.consecutivas = [validador.selecoes_consecutivas or 0 for validador in self.validadores]
+        self._iniciais = list(zip(self.status, self.hold, self.consecutivas))
+
+    def colocar_em_hold(self, indice):
+        self.status[indice] = 'on_hold'
+        self.hold[indice] = TRANSACOES_HOLD
+        self.consecutivas[indice] = 0
+
+    def alteracoes(self):
+        # Agrupa os ids dos validadores pelas colunas alteradas e seus novos valores
+        grupos = {}
+        for indice, validador in enumerate(self.validadores):
+            atual = (self.status[indice], self.hold[indice], self.consecutivas[indice])
+            inicial = self._iniciais[indice]
+            if atual == inicial:
+                continue
+            mudancas = tuple((coluna, valor) for coluna, valor, anterior in zip(self.COLUNAS, atual, inicial) if valor != anterior)
+            grupos.setdefault(mudancas, []).append(validador.id)
+        return grupos
+
+class LiquidacaoInvalida(ValueError):
+    # Lote com deltas de saldo para usuários inexistentes; nenhum saldo é alterado
+    def __init__(self, mensagem, ids_usuarios=()):
+        super().__init__(mensagem)
+        self.ids_usuarios = set(ids_usuarios)
+
+class ReservasLote:
+    # Saldo corrente dos usuários dentro de um lote: as transações validadas reservam a quantia
+    # em memória e os deltas líquidos são liquidados de uma só vez no final do lote
+    def __init__(self, armazenamento):
+        self.armazenamento = armazenamento
+        self.deltas = {} # Id do usuário -> variação pendente do saldo
+
+    def saldo_disponivel(self, usuario):
+        return usuario.saldo + self.deltas.get(usuario.id, 0.0)
+
+    def reservar(self, transacao):
+        self.deltas[transacao.id_remetente] = self.deltas.get(transacao.id_remetente, 0.0) - transacao.quantia
+        self.deltas[transacao.id_receptor] = self.deltas.get(transacao.id_receptor, 0.0) + transacao.quantia
+
+    def liquidar(self, confirmar=True):
+        # Aplica os deltas líquidos aos saldos com um único commit; sem confirmar, o commit fica com o chamador.
+        # Os usuários são todos carregados antes de qualquer alteração: um usuário inexistente não deixa o lote pela metade
+        if not self.deltas:
+            return 0
+        usuarios = [(self.armazenamento.obter_usuario(id_usuario), id_usuario, delta) for id_usuario, delta in self.deltas.items()]
+        inexistentes = [id_usuario for usuario, id_usuario, _ in usuarios if usuario is None]
+        if inexistentes:
+            raise LiquidacaoInvalida(f'Usuários inexistentes na liquidação do lote: {inexistentes}', inexistentes)
+        for usuario, _, delta in usuarios:
+            usuario.saldo += delta
+        if confirmar:
+            self.armazenamento.confirmar()
+        liquidados = len(self.deltas)
+        self.deltas = {}
+        return liquidados
+
+class MotorLedger:
+    # Núcleo do consenso, independente de Flask e do banco de dados
+    def __init__(self, armazenamento, rng=None, relogio=None, estatisticas=None, votar=None):
+        self.armazenamento = armazenamento
+        self.rng = rng or random
+        self.relogio = relogio or datetime.utcnow
+        self.estatisticas = estatisticas # Desempenho dos validadores (EstatisticasValidadores), opcional
+        # Fonte dos votos, opcional: votar(validador, transacao, validar_local) -> (valido, motivo), podendo levantar
+        # TimeoutError. Só os votos dela têm a latência medida; o voto local não tem latência de rede
+        self.votar = votar
+
+    def fator_desempenho(self, validador):
+        # Redução da probabilidade de seleção pelo desempenho recente do validador; 1.0 sem estatísticas
+        return self.estatisticas.fator(validador.id) if self.estatisticas is not None else 1.0
+
+    def selecionar_validadores(self, seletor):
+        # Seleciona os validadores disponíveis que pertencem ao seletor específico
+        tabela = TabelaValidadores(self.armazenamento.validadores_ativos(seletor.id))
+        validadores = tabela.validadores
+
+        # Calcula o stake total dos validadores disponíveis
+        stake_total = sum(validador.stake for validador in validadores)
+
+        # Se não houver stake total, retorna uma lista vazia
+        if stake_total == 0:
+            return []
+
+        # Índices dos validadores selecionados na tabela
+        selecionados = []
+
+        # Registra o início da tentativa de seleção
+        tentativa_inicio = time.monotonic()
+
+        # Continua tentando selecionar validadores até que tenha selecionado 3 ou até que tenha passado 60 segundos
+        disponiveis = list(range(len(validadores)))
+        while len(selecionados) < TAMANHO_COMITE and time.monotonic() - tentativa_inicio < 60:
+            # Atualiza a lista de validadores disponíveis removendo os já selecionados
+            disponiveis = [indice for indice in disponiveis if indice not in selecionados]
+
+            for indice in disponiveis:
+                # Gerencia o status 'on_hold' dos validadores
+                if tabela.status[indice] == 'on_hold':
+                    tabela.hold[indice] -= 1
+                    if tabela.hold[indice] <= 0:
+                        tabela.status[indice] = 'ativo'
+                    continue
+
+                # Coloca o validador em 'on_hold' caso ele tenha sido selecionado 5 vezes consecutivas
+                if tabela.consecutivas[indice] >= LIMITE_SELECOES_CONSECUTIVAS:
+                    tabela.colocar_em_hold(indice)
+                    continue
+
+                # Calcula a probabilidade de seleção baseada no stake, reduzida se o validador tiver flags ou for lento
+                validador = validadores[indice]
+                probabilidade = min(validador.stake / stake_total, 0.20) * FATOR_FLAG.get(validador.flag, 1.0) * self.fator_desempenho(validador)
+
+                # Seleciona o validador baseado na probabilidade
+                if self.rng.random() < probabilidade:
+                    tabela.consecutivas[indice] += 1
+                    selecionados.append(indice)
+                    if len(selecionados) == TAMANHO_COMITE:
+                        break
+
+        # Se menos de 3 validadores forem selecionados, grava apenas os holds e retorna uma lista vazia
+        if len(selecionados) < TAMANHO_COMITE:
+            for indice in selecionados:
+                tabela.consecutivas[indice] -= 1
+            self._gravar_tabela(tabela)
+            logger.debug("Não há validadores suficientes, colocando a transação em espera.")
+            return []
+
+        # Reseta o contador de seleções consecutivas para os validadores não selecionados
+        for indice in disponiveis:
+            if indice not in selecionados:
+                tabela.consecutivas[indice] = 0
+
+        # Grava todas as transições de estado de uma vez
+        self._gravar_tabela(tabela)
+
+        # Retorna a lista de validadores selecionados
+        return [validadores[indice] for indice in selecionados]
+
+    def selecionar_agenda(self, seletor, slots, rng=None):
+        # Sorteia de uma só vez os comitês das próximas transações, com um único commit no final
+        rng = rng or self.rng
+        tabela = TabelaValidadores(self.armazenamento.validadores_do_seletor(seletor.id))
+        agenda = []
+        for _ in range(slots):
+            comite = self._sortear_comite(tabela, rng)
+            if not comite:
+                logger.debug(f"Agenda interrompida no slot {len(agenda)}: não há validadores suficientes")
+                break
+            agenda.append(comite)
+
+        self._gravar_tabela(tabela)
+        return agenda
+
+    def _sortear_comite(self, tabela, rng):
+        # Sorteia um comitê aplicando na tabela as regras de hold e de seleções consecutivas
+        candidatos = []
+        for indice in range(len(tabela.validadores)):
+            if tabela.status[indice] == 'on_hold':
+                # Validadores em hold cumprem um slot da espera e não participam deste sorteio
+                tabela.hold[indice] -= 1
+                if tabela.hold[indice] <= 0:
+                    tabela.status[indice] = 'ativo'
+            elif tabela.status[indice] == 'ativo':
+                if tabela.consecutivas[indice] >= LIMITE_SELECOES_CONSECUTIVAS:
+                    # Coloca o validador em 'on_hold' caso ele tenha sido selecionado 5 vezes consecutivas
+                    tabela.colocar_em_hold(indice)
+                else:
+                    candidatos.append(indice)
+
+        # Os pesos são os mesmos da seleção individual: stake limitado a 20% e reduzido pelas flags e pelo desempenho
+        stake_total = sum(tabela.validadores[indice].stake for indice in candidatos)
+        if stake_total <= 0:
+            return []
+        sorteio = []
+        for indice in candidatos:
+            validador = tabela.validadores[indice]
+            peso = min(validador.stake / stake_total, 0.20) * FATOR_FLAG.get(validador.flag, 1.0) * self.fator_desempenho(validador)
+            if peso > 0:
+                # Amostragem ponderada sem reposição (Efraimidis-Spirakis): maiores chaves u^(1/peso) vencem
+                sorteio.append((rng.random() ** (1.0 / peso), indice))
+        if len(sorteio) < TAMANHO_COMITE:
+            return []
+        sorteio.sort(reverse=True)
+        comite = [indice for _, indice in sorteio[:TAMANHO_COMITE]]
+
+        # Incrementa as seleções consecutivas do comitê e reseta as dos demais candidatos
+        for indice in candidatos:
+            if indice in comite:
+                tabela.consecutivas[indice] += 1
+            else:
+                tabela.consecutivas[indice] = 0
+        return [tabela.validadores[indice] for indice in comite]
+
+    def _gravar_tabela(self, tabela):
+        # Grava as transições da rodada com uma atualização por grupo de alterações e um único commit
+        alteracoes = tabela.alteracoes()
+        if alteracoes:
+            self.armazenamento.atualizar_validadores(alteracoes)
+        self.armazenamento.confirmar()
+
+    def logica_validacao(self, validador, transacao, reservas=None, prevalidacao=None):
+        # Obtém o remetente da transação
+        remetente = self.armazenamento.obter_usuario(transacao.id_remetente)
+        tempo_atual = self.relogio()
+
+        # Verifica se o remetente está bloqueado
+        if remetente.tempo_bloqueio:
+            if remetente.tempo_bloqueio > tempo_atual:
+                logger.debug(f"Validação falhou: remetente {remetente.id} está bloqueado até {remetente.tempo_bloqueio}")
+                return False, "Remetente bloqueado"
+            else:
+                # Remove o bloqueio se o tempo de bloqueio tiver expirado; dentro de um lote o commit fica para a liquidação
+                remetente.tempo_bloqueio = None
+                if reservas is None:
+                    self.armazenamento.confirmar()
+                logger.debug(f"Remetente {remetente.id} não está mais bloqueado")
+
+        # Calcula as taxas da transação (1.5% da quantia)
+        taxas = transacao.quantia * TAXA_TRANSACAO
+
+        # Verifica se o remetente tem saldo suficiente para a transação acrescido das taxas,
+        # descontando o que já foi reservado por transações anteriores do mesmo lote
+        saldo = reservas.saldo_disponivel(remetente) if reservas is not None else remetente.saldo
+        if saldo < transacao.quantia + taxas:
+            logger.debug(f"Validação falhou: remetente {remetente.id} não tem saldo suficiente")
+            return False, "Saldo insuficiente"
+
+        # Verifica o horário da transação
+        if transacao.horario > tempo_atual:
+            logger.debug(f"Validação falhou: horário da transação está incorreto {transacao.horario}")
+            return False, "Horário incorreto"
+
+        # A janela do remetente vem da pré-validação do lote, quando houver; senão é consultada no armazenamento
+        janela = prevalidacao.janela(transacao) if prevalidacao is not None else None
+
+        # Verifica se a transação é posterior à última transação (transações registradas depois desta não contam)
+        if janela is not None:
+            ultimo_horario = janela[0]
+        else:
+            ultima_transacao = self.armazenamento.ultima_transacao(transacao.id_remetente, transacao.id)
+            ultimo_horario = ultima_transacao.horario if ultima_transacao else None
+        if ultimo_horario and transacao.horario < ultimo_horario:
+            logger.debug(f"Validação falhou: horário da transação {transacao.horario} foi feita antes da última transação {ultimo_horario}")
+            return False, "Transação anterior à última"
+
+        # Verifica o número de transações feitas em 1 minuto
+        if janela is not None:
+            num_transacoes = janela[1]
+        else:
+            um_minuto = tempo_atual - timedelta(minutes=1)
+            num_transacoes = self.armazenamento.contar_transacoes_desde(transacao.id_remetente, um_minuto, transacao.id)
+        if num_transacoes >= LIMITE_TRANSACOES_MINUTO:
+            remetente.tempo_bloqueio = tempo_atual + timedelta(minutes=1)
+            if reservas is None:
+                self.armazenamento.confirmar()
+            logger.debug(f"Validação falhou: remetente {remetente.id} fez mais de 100 transações no último minuto e está bloqueado até {remetente.tempo_bloqueio}")
+            return False, "Número de transações excedido, remetente bloqueado"
+
+        # Verifica a chave de validação
+        if not chave_valida(validador.chave_seletor, transacao.keys_validacao):
+            logger.debug(f"Chave de validação inválida: fornecida: {validador.chave_seletor}")
+            return False, "Chave de validação inválida"
+
+        # Se todas as verificações passaram a transação é válida
+        logger.debug(f"Chave de validação válida. Chave do validador: {validador.chave_seletor}")
+        return True, "Validação bem-sucedida"
+
+    def obter_voto(self, validador, transacao, reservas=None, prevalidacao=None):
+        # Voto de um validador: a lógica de validação local ou, se configurada, a fonte externa com a latência medida
+        if self.votar is None:
+            valido, motivo = self.logica_validacao(validador, transacao, reservas, prevalidacao)
+            return valido, motivo, None
+
+        inicio = time.perf_counter()
+        try:
+            valido, motivo = self.votar(validador, transacao, lambda: self.logica_validacao(validador, transacao, reservas, prevalidacao))
+        except TimeoutError:
+            logger.debug(f"Validador {validador.id} não votou a tempo na transação {transacao.id}")
+            valido, motivo = False, MOTIVO_TEMPO_ESGOTADO
+        return valido, motivo, time.perf_counter() - inicio
+
+    def gerenciar_consenso(self, transacoes, validadores, seletor, reservas=None, reputacao=None, prevalidacao=None):
+        # Gerencia o consenso dos validadores nas transações
+        if not validadores:
+            return {'mensagem': 'Sem validadores disponíveis', 'status_code': 503}
+
+        # Votos e flags são acumulados e aplicados de uma vez: no final do lote, se a reputação
+        # for compartilhada pelo chamador, ou no final desta chamada
+        reputacao_local = reputacao is None
+        # Com as reservas de um lote nada é confirmado aqui: status, taxas, reputação e saldos são gravados
+        # pelo chamador com um único commit na liquidação, ou descartados juntos se ela falhar
+        confirmar = reservas is None
+        if reputacao_local:
+            reputacao = ReputacaoLote(self.armazenamento)
+
+        # Inicializa a lista de resultados
+        resultados = []
+
+        # Processa cada transação
+        for transacao in transacoes:
+            if not isinstance(transacao, self.armazenamento.tipo_transacao):
+                logger.error(f"Objeto inválido encontrado na lista de transações: {transacao}")
+                continue
+
+            # Inicializa contadores para aprovações e rejeições
+            aprovacoes = 0
+            rejeicoes = 0
+            validadores_maliciosos = []
+            rejeicoes_legitimas = False
+            votos = []
+
+            # Verifica todos os validadores selecionados
+            for validador in validadores:
+                valido, motivo, latencia = self.obter_voto(validador, transacao, reservas, prevalidacao)
+                votos.append((validador, valido, latencia, motivo == MOTIVO_TEMPO_ESGOTADO))
+                if valido:
+                    aprovacoes += 1
+                else:
+                    rejeicoes += 1
+                    # Identifica se a rejeição é legítima ou maliciosa; um voto que não chegou a tempo não é nenhuma das duas
+                    if motivo == MOTIVO_TEMPO_ESGOTADO:
+                        pass
+                    elif motivo in MOTIVOS_LEGITIMOS:
+                        rejeicoes_legitimas = True
+                    else:
+                        validadores_maliciosos.append(validador)
+
+                # Registra o voto para a contagem de transações coerentes e remoção de flags
+                reputacao.registrar_voto(validador, valido)
+
+            logger.debug(f"Transação {transacao.id}: Aprovado por {aprovacoes} validadores, Rejeitado por {rejeicoes} validadores")
+
+            # Verifica o consenso baseado na aprovação de pelo menos dois validadores honestos
+            consenso = 1 if aprovacoes > 1 else 2
+            transacao.status = consenso
+            if confirmar:
+                self.armazenamento.confirmar()
+
+            # Registra se cada voto concordou com o consenso final e, para os votos da fonte externa, a latência
+            if self.estatisticas is not None:
+                for validador, valido, latencia, esgotado in votos:
+                    self.estatisticas.registrar_voto(validador.id, valido == (consenso == 1), latencia, esgotado)
+
+            # Distribui as taxas se a transação foi validada
+            if consenso == 1:
+                self.distribuir_taxas(transacao, seletor, validadores, validadores_maliciosos, confirmar)
+                # Reserva a quantia no lote para que as próximas transações vejam o saldo corrente
+                if reservas is not None:
+                    reservas.reservar(transacao)
+
+            # Adiciona flags aos validadores maliciosos se não houver rejeições legítimas
+            if not rejeicoes_legitimas:
+                for validador_malicioso in validadores_maliciosos:
+                    reputacao.registrar_flag(validador_malicioso)
+
+            # Adiciona o resultado da transação na lista de resultados
+            resultados.append({'id_transacao': transacao.id, 'status': 'validada' if consenso == 1 else 'rejeitada'})
+
+        # Define o código de status com base no consenso de todas as transações
+        status_code = 200 if all(transacao.status == 1 for transacao in transacoes) else 500
+        if reputacao_local:
+            reputacao.aplicar(confirmar)
+        elif confirmar:
+            self.armazenamento.confirmar()
+
+        # Retorna os resultados e o código de status
+        return {'resultados': resultados, 'status_code': status_code}
+
+    def distribuir_taxas(self, transacao, seletor, validadores, validadores_maliciosos, confirmar=True):
+        # Filtra validadores para remover os maliciosos
+        validadores_honestos = [validador for validador in validadores if validador not in validadores_maliciosos]
+
+        if not validadores_honestos:
+            return {'mensagem': 'Sem validadores honestos disponíveis', 'status_code': 503}
+
+        # Calcula as taxas
+        quantia_transacionada = transacao.quantia
+        taxa_seletor = quantia_transacionada * TAXA_SELETOR
+        taxa_validadores = quantia_transacionada * TAXA_VALIDADORES
+        taxa_travada = quantia_transacionada * TAXA_TRAVADA
+
+        # Distribui a taxa de 1% entre os validadores honestos
+        taxa_por_validador = taxa_validadores / len(validadores_honestos)
+        for validador in validadores_honestos:
+            validador.stake += taxa_por_validador
+
+        # Adiciona a taxa travada de 0,5% a cada validador individualmente
+        for validador in validadores_honestos:
+            validador.stake += taxa_travada
+
+        # Adiciona a taxa ao saldo do seletor
+        seletor.saldo += taxa_seletor
+
+        if confirmar:
+            self.armazenamento.confirmar()
+
+        return {'mensagem': 'Taxas distribuídas', 'status_code': 200}
+
+    def liquidar_transacao(self, transacao):
+        # Transfere a quantia do remetente para o receptor de uma transação validada
+        remetente = self.armazenamento.obter_usuario(transacao.id_remetente)
+        receptor = self.armazenamento.obter_usuario(transacao.id_receptor)
+        remetente.saldo -= transacao.quantia
+        receptor.saldo += transacao.quantia
+        self.armazenamento.confirmar()
+
+    def atualizar_flags(self, endereco, acao):
+        # Atualiza as flags de um validador com base na ação especificada
+        validador = self.armazenamento.obter_validador(endereco)
+
+        if not validador:
+            return {'mensagem': f'Endereço {endereco} não foi encontrado', 'status_code': 404}
+
+        # Adiciona uma flag ao validador
+        if acao == 'add':
+            # Incrementa a flag do validador limitando ao máximo de 3
+            validador.flag = min(validador.flag + 1, LIMITE_FLAGS + 1)
+
+            # Verifica se o validador deve ser expulso por excesso de flags
+            if validador.flag > LIMITE_FLAGS:
+                self.expulsar_validador(endereco)
+                return {'mensagem': f'Validador de endereço {endereco} foi expulso por excesso de flags', 'status_code': 200}
+
+        # Remove uma flag do validador
+        elif acao == 'remover':
+            # Decrementa a flag do validador limitando ao mínimo de 0
+            validador.flag = max(validador.flag - 1, 0)
+
+        else:
+            # Retorna uma mensagem de erro se a ação for inválida
+            return {'mensagem': f'Ação {acao} inválida', 'status_code': 400}
+
+        self.armazenamento.confirmar()
+
+        return {'mensagem': f'Flag do validador de endereço {endereco} foi atualizado', 'status_code': 200}
+
+    def remover_flag_validador(self, validador, confirmar=True):
+        # Remove flags de um validador após 10000 transações coerentes
+        if validador.transacoes_coerentes >= LIMITE_TRANSACOES_COERENTES:
+            validador.flag = max(validador.flag - 1, 0)
+            validador.transacoes_coerentes = 0  # Reseta o contador de transações coerentes
+            if confirmar:
+                self.armazenamento.confirmar()
+
+    def expulsar_validador(self, endereco):
+        # Expulsa um validador
+        validador = self.armazenamento.obter_validador(endereco)
+        if validador:
+            validador.status = 'expulso'
+            validador.stake = 0  # Zera o saldo do validador
+            self.armazenamento.confirmar()
+            return {"mensagem": f"Validador de endereço {endereco} foi expulso", "status_code": 200}
+        else:
+            return {"mensagem": "Validador não encontrado", "status_code": 404}
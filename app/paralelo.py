@@ -0,0 +1,174 @@
+import atexit
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from .motor import TAXA_TRANSACAO, LIMITE_TRANSACOES_MINUTO, ReservasLote
+from .reputacao import ReputacaoLote
+from .chaves import conjunto_chaves, digest_chave
+from .prevalidacao import PreValidacaoLote
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Executores reutilizados entre lotes, por tipo e número de trabalhadores
+_executores = {}
+
+def obter_executor(tipo, trabalhadores):
+    chave = (tipo, trabalhadores)
+    if chave not in _executores:
+        classe = ProcessPoolExecutor if tipo == 'processo' else ThreadPoolExecutor
+        _executores[chave] = classe(max_workers=trabalhadores)
+    return _executores[chave]
+
+@atexit.register
+def encerrar_executores():
+    # Encerra os pools na saída do processo, para que os processos trabalhadores não fiquem órfãos
+    while _executores:
+        _, executor = _executores.popitem()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def validar_particao(estado, transacoes, agora):
+    # Valida em ordem as transações de um único remetente, sem acesso ao armazenamento.
+    # estado: (saldo, tempo_bloqueio, horario da última transação anterior ao lote, transações anteriores no último minuto)
+    # transacoes: tuplas (id, quantia, horario, digests das chaves da transação, digests das chaves dos validadores do comitê)
+    saldo, tempo_bloqueio, ultimo_horario, recentes = estado
+    um_minuto = agora - timedelta(minutes=1)
+    resultados = []
+
+    for id_transacao, quantia, horario, chaves, chaves_comite in transacoes:
+        # Contabiliza esta transação na ordem e na janela de um minuto, como no consenso sequencial
+        ultimo_horario = horario if ultimo_horario is None else max(ultimo_horario, horario)
+        if horario > um_minuto:
+            recentes += 1
+
+        # As verificações do remetente são as mesmas para todos os validadores do comitê
+        motivo = None
+        if tempo_bloqueio and tempo_bloqueio > agora:
+            motivo = "Remetente bloqueado"
+        else:
+            tempo_bloqueio = None
+            if saldo < quantia + quantia * TAXA_TRANSACAO:
+                motivo = "Saldo insuficiente"
+            elif horario > agora:
+                motivo = "Horário incorreto"
+            elif horario < ultimo_horario:
+                motivo = "Transação anterior à última"
+            elif recentes >= LIMITE_TRANSACOES_MINUTO:
+                tempo_bloqueio = agora + timedelta(minutes=1)
+                motivo = "Número de transações excedido, remetente bloqueado"
+
+        if motivo:
+            resultados.append((id_transacao, 2, (), (), True, motivo))
+            continue
+
+        # Cada validador aprova se a sua chave do seletor estiver entre as chaves da transação
+        aprovadores = tuple(indice for indice, chave in enumerate(chaves_comite) if chave in chaves)
+        maliciosos = tuple(indice for indice in range(len(chaves_comite)) if indice not in aprovadores)
+        status = 1 if len(aprovadores) > 1 else 2
+        if status == 1:
+            saldo -= quantia
+        resultados.append((id_transacao, status, aprovadores, maliciosos, False, None))
+
+    return resultados, tempo_bloqueio
+
+def validar_particoes(trabalho):
+    # Executa um grupo de partições em um trabalhador
+    agora, particoes = trabalho
+    return [(id_remetente, validar_particao(estado, transacoes, agora)) for id_remetente, estado, transacoes in particoes]
+
+def consenso_paralelo(motor, transacoes, comites, trabalhadores=None, tipo_executor='processo', confirmar=True, prevalidacao=None):
+    # Consenso de um lote particionado por remetente. Apenas transações do mesmo remetente dependem
+    # entre si (ordem, saldo e limite por minuto); créditos dos receptores e taxas são aplicados na
+    # fusão, em memória, e liquidados com um único commit. Créditos recebidos dentro do lote só ficam
+    # disponíveis para gastos no lote seguinte. O estado dos remetentes vem da pré-validação do lote,
+    # que o carrega com consultas em bloco; sem ela, a pré-validação é feita aqui.
+    armazenamento = motor.armazenamento
+    agora = motor.relogio()
+    um_minuto = agora - timedelta(minutes=1)
+    trabalhadores = trabalhadores or os.cpu_count() or 1
+
+    # Agrupa as transações por remetente, na ordem em que foram registradas
+    por_remetente = {}
+    for transacao in sorted(transacoes, key=lambda t: t.id):
+        por_remetente.setdefault(transacao.id_remetente, []).append(transacao)
+
+    # Estado de cada remetente anterior ao lote, a partir da janela da sua primeira transação
+    if por_remetente and prevalidacao is None:
+        prevalidacao = PreValidacaoLote(armazenamento, transacoes, agora)
+    particoes = []
+    for id_remetente, transacoes_remetente in por_remetente.items():
+        primeira = transacoes_remetente[0]
+        remetente = prevalidacao.usuarios.get(id_remetente) or armazenamento.obter_usuario(id_remetente)
+        janela = prevalidacao.janela(primeira)
+        if janela is not None:
+            # A janela já conta a própria transação, que validar_particao volta a contabilizar
+            ultimo_horario, recentes = janela[0], janela[1] - (primeira.horario > prevalidacao.desde)
+        else:
+            ultima = armazenamento.ultima_transacao(id_remetente, primeira.id - 1)
+            ultimo_horario = ultima.horario if ultima else None
+            recentes = armazenamento.contar_transacoes_desde(id_remetente, um_minuto, primeira.id - 1)
+        estado = (remetente.saldo, remetente.tempo_bloqueio, ultimo_horario, recentes)
+        trabalho = [
+            (t.id, t.quantia, t.horario, conjunto_chaves(t.keys_validacao), tuple(digest_chave(v.chave_seletor) for v in comites[t.id]))
+            for t in transacoes_remetente
+        ]
+        particoes.append((id_remetente, estado, trabalho))
+
+    # Distribui as partições entre os trabalhadores, equilibrando o número de transações
+    grupos = [[] for _ in range(min(trabalhadores, len(particoes)) or 1)]
+    cargas = [0] * len(grupos)
+    for particao in sorted(particoes, key=lambda p: len(p[2]), reverse=True):
+        indice = cargas.index(min(cargas))
+        grupos[indice].append(particao)
+        cargas[indice] += len(particao[2])
+
+    if len(grupos) > 1:
+        executor = obter_executor(tipo_executor, trabalhadores)
+        respostas = executor.map(validar_particoes, [(agora, grupo) for grupo in grupos])
+    else:
+        respostas = [validar_particoes((agora, grupos[0]))]
+
+    decisoes = {}
+    for resposta in respostas:
+        for id_remetente, (resultados, tempo_bloqueio) in resposta:
+            (prevalidacao.usuarios.get(id_remetente) or armazenamento.obter_usuario(id_remetente)).tempo_bloqueio = tempo_bloqueio
+            for resultado in resultados:
+                decisoes[resultado[0]] = resultado
+
+    # Fusão: aplica na ordem das transações os contadores, taxas, flags e saldos
+    reservas = ReservasLote(armazenamento)
+    reputacao = ReputacaoLote(armazenamento)
+    resultados = []
+    for transacao in sorted(transacoes, key=lambda t: t.id):
+        _, status, aprovadores, maliciosos, rejeicoes_legitimas, motivo = decisoes[transacao.id]
+        comite = comites[transacao.id]
+        transacao.status = status
+
+        for indice, validador in enumerate(comite):
+            reputacao.registrar_voto(validador, indice in aprovadores)
+            if motor.estatisticas is not None:
+                # Os votos das partições não têm latência individual: só a concordância é registrada
+                motor.estatisticas.registrar_voto(validador.id, (indice in aprovadores) == (status == 1))
+
+        validadores_maliciosos = [comite[indice] for indice in maliciosos]
+        if status == 1:
+            reservas.reservar(transacao)
+            # Mesma divisão de taxas do consenso sequencial; o commit fica para a liquidação
+            motor.distribuir_taxas(transacao, armazenamento.obter_seletor(comite[0].seletor_id), comite, validadores_maliciosos, confirmar=False)
+
+        if not rejeicoes_legitimas:
+            for validador in validadores_maliciosos:
+                reputacao.registrar_flag(validador)
+
+        logger.debug(f"Transação {transacao.id}: {'validada' if status == 1 else 'rejeitada'} no consenso paralelo ({motivo or 'chaves verificadas'})")
+        resultados.append({'id_transacao': transacao.id, 'status': 'validada' if status == 1 else 'rejeitada'})
+
+    # Liquida saldos e taxas e aplica contadores, flags e expulsões de uma só vez; sem confirmar, o commit fica com o chamador
+    reputacao.aplicar(confirmar=False)
+    reservas.liquidar(confirmar=False)
+    if confirmar:
+        armazenamento.confirmar()
+
+    return resultados
@@ -0,0 +1,109 @@
+import cProfile
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from flask import current_app, g, request
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+EXTENSAO_PERFIL = '.prof'
+EXTENSAO_METADADOS = '.json'
+
+def diretorio_perfis(app=None):
+    # Diretório dos arquivos de perfil (relativo à pasta instance quando não for absoluto)
+    app = app or current_app
+    return os.path.join(app.instance_path, app.config.get('PERFIL_DIRETORIO', 'perfis'))
+
+def _perfil_solicitado():
+    # O perfil é ativado pelo cabeçalho X-Perfil ou pelo parâmetro ?perfil=1
+    return request.headers.get('X-Perfil') == '1' or request.args.get('perfil') == '1'
+
+def _iniciar_perfil():
+    if not _perfil_solicitado():
+        return
+    perfilador = cProfile.Profile()
+    g.perfil = (perfilador, time.perf_counter())
+    perfilador.enable()
+
+def _finalizar_perfil(resposta):
+    dados_perfil = g.pop('perfil', None)
+    if dados_perfil is None:
+        return resposta
+
+    perfilador, inicio = dados_perfil
+    perfilador.disable()
+    duracao = time.perf_counter() - inicio
+
+    try:
+        nome = salvar_perfil(perfilador, {
+            'metodo': request.method,
+            'caminho': request.path,
+            'parametros': request.query_string.decode('utf-8', 'replace'),
+            'status_code': resposta.status_code,
+            'duracao_ms': round(duracao * 1000, 3),
+            'tamanho_corpo': request.content_length,
+            'horario': datetime.utcnow().isoformat(),
+        })
+        resposta.headers['X-Perfil-Arquivo'] = nome
+    except OSError:
+        logger.error("Erro ao salvar o perfil da requisição", exc_info=True)
+    return resposta
+
+def _descartar_perfil(excecao=None):
+    # Garante que o perfilador seja desligado se a requisição falhar antes do after_request
+    dados_perfil = g.pop('perfil', None)
+    if dados_perfil is not None:
+        dados_perfil[0].disable()
+
+def salvar_perfil(perfilador, metadados):
+    # Grava o perfil e os metadados e mantém apenas os arquivos mais recentes
+    diretorio = diretorio_perfis()
+    os.makedirs(diretorio, exist_ok=True)
+
+    nome = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}"
+    perfilador.dump_stats(os.path.join(diretorio, nome + EXTENSAO_PERFIL))
+    with open(os.path.join(diretorio, nome + EXTENSAO_METADADOS), 'w', encoding='utf-8') as arquivo:
+        json.dump(metadados, arquivo)
+    logger.debug(f"Perfil {nome} salvo para {metadados['metodo']} {metadados['caminho']}")
+
+    # Remove os perfis mais antigos que excedem o tamanho do anel
+    maximo = current_app.config.get('PERFIL_MAX_ARQUIVOS', 20)
+    nomes = listar_nomes_perfis(diretorio)
+    for antigo in nomes[:max(len(nomes) - maximo, 0)]:
+        for extensao in (EXTENSAO_PERFIL, EXTENSAO_METADADOS):
+            caminho = os.path.join(diretorio, antigo + extensao)
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    return nome + EXTENSAO_PERFIL
+
+def listar_nomes_perfis(diretorio):
+    # Nomes (sem extensão) dos perfis gravados, do mais antigo ao mais recente
+    if not os.path.isdir(diretorio):
+        return []
+    return sorted(arquivo[:-len(EXTENSAO_PERFIL)] for arquivo in os.listdir(diretorio) if arquivo.endswith(EXTENSAO_PERFIL))
+
+def listar_perfis():
+    # Lista os perfis gravados com os seus metadados
+    diretorio = diretorio_perfis()
+    perfis = []
+    for nome in reversed(listar_nomes_perfis(diretorio)):
+        metadados = {}
+        caminho_metadados = os.path.join(diretorio, nome + EXTENSAO_METADADOS)
+        if os.path.exists(caminho_metadados):
+            with open(caminho_metadados, encoding='utf-8') as arquivo:
+                metadados = json.load(arquivo)
+        perfis.append({'arquivo': nome + EXTENSAO_PERFIL, **metadados})
+    return perfis
+
+def init_app(app):
+    # Os ganchos só são registrados se o perfil estiver habilitado, sem custo quando desligado
+    if not app.config.get('PERFIL_HABILITADO'):
+        return
+    app.before_request(_iniciar_perfil)
+    app.after_request(_finalizar_perfil)
+    app.teardown_request(_descartar_perfil)
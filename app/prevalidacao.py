@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime, timedelta
+from .motor import TAXA_TRANSACAO
+
+# Dependência opcional: sem o numpy as mesmas verificações são feitas em Python puro
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+# Pré-validação de um lote do /trans. Os saldos, bloqueios e janelas de atividade dos remetentes são
+# carregados uma vez para o lote inteiro e as verificações de cada validador que dependem só desse estado
+# são avaliadas sobre o lote todo. Uma transação só é rejeitada aqui quando a rejeição é certa em qualquer
+# ordem de consenso; as demais seguem para o consenso com a janela do remetente já calculada, sem as
+# consultas de última transação e de contagem por validador.
+#
+# O saldo é um limite superior: o saldo atual mais tudo o que o remetente pode receber no lote. Os débitos
+# acumulados das transações anteriores do mesmo remetente não servem para rejeitar, porque elas ainda
+# podem ser rejeitadas pelo consenso; o saldo corrente exato continua nas reservas do lote.
+# O limite de transações por minuto também fica para o consenso: o bloqueio do remetente só é gravado
+# quando as verificações anteriores passam, o que depende do saldo corrente.
+
+JANELA_TAXA = timedelta(minutes=1) # Mesma janela do limite de transações por minuto
+FOLGA_SALDO = 1e-9 # Margem relativa para diferenças de arredondamento na soma dos créditos
+EPOCA = datetime(1970, 1, 1)
+UM_MICROSSEGUNDO = timedelta(microseconds=1)
+NULO = -(2 ** 63)
+
+# Motivos na mesma ordem das verificações de logica_validacao; usuários inexistentes são rejeitados antes de tudo,
+# para que a liquidação do lote nunca encontre um saldo sem dono
+MOTIVOS = (None, 'Remetente bloqueado', 'Saldo insuficiente', 'Horário incorreto', 'Transação anterior à última', 'Remetente ou receptor inexistente')
+
+def microssegundos(horario):
+    return NULO if horario is None else (horario - EPOCA) // UM_MICROSSEGUNDO
+
+def maximo_acumulado_por_grupo(valores, inicios, grupos, limite=2 ** 62):
+    # Máximo acumulado de valores inteiros dentro de cada grupo contíguo: os grupos são deslocados para faixas
+    # disjuntas crescentes e um único maximum.accumulate serve para todos. Quando as faixas deslocadas passam
+    # do limite do int64, o máximo é acumulado em um laço Python
+    menor = int(valores.min())
+    faixa = int(valores.max()) - menor + 1
+    if faixa * (int(grupos[-1]) + 1) < limite:
+        deslocamento = grupos * faixa
+        return numpy.maximum.accumulate(valores - menor + deslocamento) - deslocamento + menor
+    maior = valores.copy()
+    for indice in range(1, len(maior)):
+        if not inicios[indice] and maior[indice - 1] > maior[indice]:
+            maior[indice] = maior[indice - 1]
+    return maior
+
+class PreValidacaoLote:
+    def __init__(self, armazenamento, transacoes, agora, vetorizar=None):
+        self.agora = agora
+        self.desde = agora - JANELA_TAXA
+        self.vetorizada = numpy is not None and vetorizar is not False
+        self.janelas = {} # Id da transação -> (maior horário do remetente até ela, transações do remetente no último minuto até ela)
+        self.rejeitadas = [] # (transação, motivo)
+        self.sobreviventes = []
+        if not transacoes:
+            return
+
+        ids_remetentes = {transacao.id_remetente for transacao in transacoes}
+        ids = [transacao.id for transacao in transacoes]
+        self.usuarios = armazenamento.obter_usuarios(ids_remetentes | {transacao.id_receptor for transacao in transacoes})
+        resumo, linhas = armazenamento.historico_remetentes(ids_remetentes, min(ids), max(ids), self.desde)
+
+        if self.vetorizada:
+            self.janelas = self.janelas_numpy(resumo, linhas, ids)
+            motivos = self.motivos_numpy(transacoes)
+        else:
+            self.janelas = self.janelas_python(resumo, linhas, set(ids))
+            motivos = self.motivos_python(transacoes)
+
+        for transacao, motivo in zip(transacoes, motivos):
+            if motivo:
+                self.rejeitadas.append((transacao, MOTIVOS[motivo]))
+            else:
+                self.sobreviventes.append(transacao)
+        if self.rejeitadas:
+            logger.debug(f"Pré-validação: {len(self.rejeitadas)} de {len(transacoes)} transações rejeitadas antes do consenso")
+
+    def janela(self, transacao):
+        # Maior horário e contagem do último minuto do remetente, considerando os ids até o da transação
+        return self.janelas.get(transacao.id)
+
+    def creditos(self, transacoes):
+        # Quanto cada usuário pode ganhar no lote: os créditos recebidos e as quantias negativas enviadas
+        creditos = {}
+        for transacao in transacoes:
+            if transacao.quantia > 0:
+                creditos[transacao.id_receptor] = creditos.get(transacao.id_receptor, 0.0) + transacao.quantia
+            else:
+                creditos[transacao.id_remetente] = creditos.get(transacao.id_remetente, 0.0) - transacao.quantia
+        return creditos
+
+    def janelas_python(self, resumo, linhas, ids_lote):
+        janelas = {}
+        atual = None
+        for id_remetente, id_transacao, horario in linhas:
+            if id_remetente != atual:
+                atual = id_remetente
+                maior, recentes = resumo.get(id_remetente, (None, 0))
+            if maior is None or horario > maior:
+                maior = horario
+            if horario > self.desde:
+                recentes += 1
+            if id_transacao in ids_lote:
+                janelas[id_transacao] = (maior, recentes)
+        return janelas
+
+    def motivos_python(self, transacoes):
+        creditos = self.creditos(transacoes)
+        motivos = []
+        for transacao in transacoes:
+            remetente = self.usuarios.get(transacao.id_remetente)
+            janela = self.janelas.get(transacao.id)
+            motivo = 0
+            if remetente is None or transacao.id_receptor not in self.usuarios:
+                motivo = 5
+            elif janela is None:
+                pass # O consenso trata a transação como antes
+            elif remetente.tempo_bloqueio and remetente.tempo_bloqueio > self.agora:
+                motivo = 1
+            elif (remetente.saldo + creditos.get(remetente.id, 0.0)) * (1 + FOLGA_SALDO) < transacao.quantia + transacao.quantia * TAXA_TRANSACAO:
+                motivo = 2
+            elif transacao.horario > self.agora:
+                motivo = 3
+            elif janela[0] is not None and transacao.horario < janela[0]:
+                motivo = 4
+            motivos.append(motivo)
+        return motivos
+
+    def janelas_numpy(self, resumo, linhas, ids):
+        if not linhas:
+            return {}
+        remetentes = numpy.fromiter((linha[0] for linha in linhas), dtype=numpy.int64, count=len(linhas))
+        ids_linhas = numpy.fromiter((linha[1] for linha in linhas), dtype=numpy.int64, count=len(linhas))
+        horarios = numpy.fromiter((microssegundos(linha[2]) for linha in linhas), dtype=numpy.int64, count=len(linhas))
+
+        # As linhas vêm ordenadas por remetente e id: cada remetente é um grupo contíguo
+        inicios = numpy.ones(len(linhas), dtype=bool)
+        inicios[1:] = remetentes[1:] != remetentes[:-1]
+        grupos = numpy.cumsum(inicios) - 1
+        remetentes_grupo = remetentes[inicios]
+        maior_antes = numpy.array([microssegundos(resumo.get(r, (None, 0))[0]) for r in remetentes_grupo.tolist()], dtype=numpy.int64)
+        recentes_antes = numpy.array([resumo.get(r, (None, 0))[1] for r in remetentes_grupo.tolist()], dtype=numpy.int64)
+
+        # Contagem acumulada do último minuto dentro de cada grupo
+        na_janela = (horarios > microssegundos(self.desde)).astype(numpy.int64)
+        acumulada = numpy.cumsum(na_janela)
+        recentes = recentes_antes[grupos] + acumulada - (acumulada - na_janela)[inicios][grupos]
+
+        maior = numpy.maximum(maximo_acumulado_por_grupo(horarios, inicios, grupos), maior_antes[grupos])
+
+        do_lote = numpy.isin(ids_linhas, numpy.array(ids, dtype=numpy.int64))
+        return {
+            id_transacao: (EPOCA + horario * UM_MICROSSEGUNDO, contagem)
+            for id_transacao, horario, contagem in zip(ids_linhas[do_lote].tolist(), maior[do_lote].tolist(), recentes[do_lote].tolist())
+        }
+
+    def motivos_numpy(self, transacoes):
+        total = len(transacoes)
+        inexistentes = numpy.array([t.id_remetente not in self.usuarios or t.id_receptor not in self.usuarios for t in transacoes], dtype=bool)
+        com_janela = numpy.array([t.id in self.janelas for t in transacoes], dtype=bool)
+        remetentes = [self.usuarios.get(t.id_remetente) for t in transacoes]
+        creditos = self.creditos(transacoes)
+
+        saldos = numpy.fromiter((r.saldo + creditos.get(r.id, 0.0) if r else 0.0 for r in remetentes), dtype=numpy.float64, count=total)
+        bloqueios = numpy.fromiter((microssegundos(r.tempo_bloqueio) if r else NULO for r in remetentes), dtype=numpy.int64, count=total)
+        quantias = numpy.fromiter((t.quantia for t in transacoes), dtype=numpy.float64, count=total)
+        horarios = numpy.fromiter((microssegundos(t.horario) for t in transacoes), dtype=numpy.int64, count=total)
+        ultimos = numpy.fromiter((microssegundos(self.janelas.get(t.id, (None, 0))[0]) for t in transacoes), dtype=numpy.int64, count=total)
+        agora = microssegundos(self.agora)
+
+        motivos = numpy.select(
+            [
+                inexistentes,
+                ~com_janela,
+                bloqueios > agora,
+                saldos * (1 + FOLGA_SALDO) < quantias + quantias * TAXA_TRANSACAO,
+                horarios > agora,
+                (ultimos != NULO) & (horarios < ultimos),
+            ],
+            [5, 0, 1, 2, 3, 4],
+            0,
+        )
+        return motivos.tolist()
@@ -0,0 +1,68 @@
+import logging
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+LIMITE_TRANSACOES_COERENTES = 10000 # Transações coerentes necessárias para remover uma flag
+LIMITE_FLAGS = 2 # Acima disso o validador é expulso
+
+# Eventos registrados para cada validador, reaplicados em ordem no final do lote
+VOTO_INCOERENTE = 0
+VOTO_COERENTE = 1
+FLAG = 2
+
+class ReputacaoLote:
+    # Acumula os votos e as flags dos validadores durante um lote e aplica contadores,
+    # remoção de flags e expulsões em uma única passada, com um único commit
+    def __init__(self, armazenamento):
+        self.armazenamento = armazenamento
+        self.eventos = {} # Validador -> lista de eventos na ordem em que ocorreram
+
+    def registrar_voto(self, validador, coerente):
+        self.eventos.setdefault(validador, []).append(VOTO_COERENTE if coerente else VOTO_INCOERENTE)
+
+    def registrar_flag(self, validador):
+        self.eventos.setdefault(validador, []).append(FLAG)
+
+    def aplicar(self, confirmar=True):
+        # Reaplica os eventos de cada validador com as mesmas regras do processamento individual;
+        # sem confirmar, o commit fica para a liquidação do lote
+        resumo = {'flags': 0, 'flags_removidas': 0, 'expulsos': []}
+        if not self.eventos:
+            return resumo
+
+        for validador, eventos in self.eventos.items():
+            coerentes = validador.transacoes_coerentes or 0
+            flag = validador.flag or 0
+            expulso = False
+            for evento in eventos:
+                if evento == FLAG:
+                    # Incrementa a flag limitando ao máximo de 3; acima de 2 o validador é expulso
+                    flag = min(flag + 1, LIMITE_FLAGS + 1)
+                    resumo['flags'] += 1
+                    if flag > LIMITE_FLAGS:
+                        expulso = True
+                    continue
+                if evento == VOTO_COERENTE:
+                    coerentes += 1
+                # Remove uma flag a cada 10000 transações coerentes
+                if coerentes >= LIMITE_TRANSACOES_COERENTES:
+                    if flag > 0:
+                        resumo['flags_removidas'] += 1
+                    flag = max(flag - 1, 0)
+                    coerentes = 0
+
+            validador.transacoes_coerentes = coerentes
+            validador.flag = flag
+            if expulso:
+                validador.status = 'expulso'
+                validador.stake = 0  # Zera o saldo do validador
+                resumo['expulsos'].append(validador.endereco)
+
+        if confirmar:
+            self.armazenamento.confirmar()
+        self.eventos = {}
+        if resumo['flags'] or resumo['expulsos']:
+            logger.debug(f"Reputação do lote aplicada: {resumo}")
+        return resumo
@@ -1,10 +1,21 @@
-from flask import Blueprint, current_app, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, send_from_directory
+from collections import deque
 from datetime import datetime
-from .models import db, Usuario, Transacao, Seletor
+from .models import db, Usuario, Transacao, Seletor, Validador
 from .validacao import (
     editar_seletor_, editar_validador_, gerenciar_consenso, update_flags_validador, hold_validador_, registrar_validador_, expulsar_validador_, 
-    selecionar_validadores, lista_validadores, remover_validador_, registrar_seletor_, remover_seletor_
+    selecionar_validadores, lista_validadores, remover_validador_, registrar_seletor_, remover_seletor_, reservas_lote, reputacao_lote,
+    selecionar_agenda, gerenciar_consenso_paralelo, prevalidar_lote
 )
+from .instrumentacao import etapa
+from .perfil import diretorio_perfis, listar_perfis
+from . import fila, cadastro_lote
+from .chaves import compactar_chaves
+from .motor import LiquidacaoInvalida
+from .cache_validadores import cache_atual
+from .estatisticas_validadores import estatisticas_atual
+from .serializacao import ErroSerializacao, ler_corpo, responder, responder_stream
+import json
 import logging
 
 # Configura o logger
@@ -18,13 +29,26 @@ BASE_URL = 'http://127.0.0.1:5000' # URL base para as requisições internas
 
 @bp.route('/trans', methods=['POST'])
 def transacao():
-    dados = request.json  # Obtém os dados JSON da requisição
+    try:
+        dados = ler_corpo()  # Obtém os dados da requisição em JSON ou MessagePack
+    except ErroSerializacao as e:
+        return jsonify({'mensagem': str(e), 'status_code': e.status_code}), e.status_code
 
     # Verifica se os dados recebidos são uma lista. Se não forem, transforma o único objeto em uma lista.
     if not isinstance(dados, list):
         dados = [dados]  # Transforma um único objeto em uma lista para processamento uniforme
 
     resultados = []  # Lista para armazenar os resultados das transações processadas
+    novas_transacoes = []  # Transações criadas nesta requisição
+    comites = {}  # Comitê de cada transação criada a partir da agenda do seletor
+    validadores_selecionados = current_app.config.get('validadores_selecionados')
+    agenda = current_app.config.get('agenda_validadores')
+    validadores_agenda = {}
+    if agenda:
+        # Carrega de uma vez os validadores dos slots que este lote vai consumir
+        ids_agenda = {id_validador for comite_ids in list(agenda)[:len(dados)] for id_validador in comite_ids}
+        with etapa('agenda'):
+            validadores_agenda = {v.id: v for v in Validador.query.filter(Validador.id.in_(ids_agenda)).all()}
 
     for transacao in dados:
         try:
@@ -37,13 +61,18 @@ def transacao():
             # Verifica se todos os dados necessários da transação estão presentes
             if not all([id_remetente, id_receptor, quantia, chaves_validacao]):
                 raise ValueError("Dados da transação incompletos")
+            if not isinstance(chaves_validacao, list):
+                raise ValueError("As chaves de validação devem ser uma lista")
+
+            # Usa o próximo comitê da agenda, se houver, ou os validadores já selecionados;
+            # sem comitê a transação é registrada e fica na fila até haver validadores
+            comite_ids = agenda.popleft() if agenda else None
+            if comite_ids:
+                comite = [validadores_agenda[id_validador] for id_validador in comite_ids if id_validador in validadores_agenda]
+            else:
+                comite = validadores_selecionados
 
-            # Verifica se os validadores já foram selecionados
-            validadores_selecionados = current_app.config.get('validadores_selecionados')
-            if not validadores_selecionados:
-                return jsonify({'mensagem': 'Validadores não selecionados', 'status_code': 400}), 400
-
-            logger.debug(f"Validadores selecionados: {[v.endereco for v in validadores_selecionados]}")
+            logger.debug(f"Validadores selecionados: {[v.endereco for v in comite or []]}")
 
             # Cria e armazena a nova transação no banco de dados
             nova_transacao = Transacao(
@@ -51,12 +80,17 @@ def transacao():
                 id_receptor=id_receptor,
                 quantia=quantia,
                 status=0,
-                keys_validacao=",".join(chaves_validacao),  # Armazena as chaves de validação como string separada por vírgulas
-                horario=datetime.utcnow()
+                keys_validacao=compactar_chaves(chaves_validacao),  # Armazena os digests de tamanho fixo das chaves de validação
+                horario=datetime.utcnow(),
+                proxima_tentativa=fila.arrendamento()  # Reivindicada por esta requisição: outra não a drena enquanto ela é processada
             )
 
-            db.session.add(nova_transacao)
-            db.session.commit()
+            with etapa('insercao'):
+                db.session.add(nova_transacao)
+                db.session.commit()
+            novas_transacoes.append(nova_transacao)
+            if comite:
+                comites[nova_transacao.id] = comite
 
         except Exception as e:
             # Lida com exceções durante a criação da transação
@@ -64,25 +98,58 @@ def transacao():
             resultados.append({'mensagem': str(e), 'status_code': 500})
             continue  # Continua para a próxima transação
 
+    # Reservas do lote: cada transação é validada contra o saldo corrente e os saldos são liquidados no final
+    reservas = reservas_lote()
+    # Votos, flags e expulsões dos validadores também são acumulados e aplicados uma vez no final do lote
+    reputacao = reputacao_lote()
+
+    prevalidacao = None
+    ids_lote = set() # Transações decididas neste lote, gravadas juntas com um único commit na liquidação
+    falha = None
     try:
-        # Recupera todas as transações criadas do banco de dados com status 0 (pendente)
-        transacoes_criadas = db.session.query(Transacao).filter(Transacao.status == 0).all()
-        
+        # Processa as transações criadas e drena da fila as pendentes prontas para nova tentativa
+        with etapa('pendentes'):
+            drenadas = fila.drenar({t.id for t in novas_transacoes})
+            fila.rechavear(drenadas, validadores_selecionados)
+            transacoes_criadas = novas_transacoes + drenadas
+
+        # Transações sem comitê voltam para a fila com espera exponencial, sem passar pelo consenso
+        sem_comite = [t for t in transacoes_criadas if not comites.get(t.id, validadores_selecionados)]
+        if sem_comite:
+            with etapa('fila'):
+                resultados.extend(fila.adiar(sem_comite))
+            transacoes_criadas = [t for t in transacoes_criadas if comites.get(t.id, validadores_selecionados)]
+        ids_lote = {t.id for t in transacoes_criadas}
+
+        # Pré-validação do lote: as rejeições certas não passam pelos validadores e as demais transações
+        # seguem com a janela do remetente já carregada
+        if current_app.config.get('PREVALIDACAO_LOTE', True) and transacoes_criadas:
+            inicio_consenso = len(resultados)
+            ordem = {t.id: indice for indice, t in enumerate(transacoes_criadas)}
+            with etapa('prevalidacao'):
+                prevalidacao = prevalidar_lote(transacoes_criadas)
+                for transacao_rejeitada, motivo in prevalidacao.rejeitadas:
+                    transacao_rejeitada.status = 2
+                    resultados.append({'id_transacao': transacao_rejeitada.id, 'mensagem': 'Transação rejeitada', 'motivo': motivo, 'status': 'rejeitada', 'status_code': 500})
+            transacoes_criadas = prevalidacao.sobreviventes
+
+        # Lotes grandes podem ser particionados por remetente e validados em paralelo
+        if current_app.config.get('CONSENSO_PARALELO') and len(transacoes_criadas) >= current_app.config.get('CONSENSO_PARALELO_MIN_LOTE', 64):
+            resultados.extend(consenso_paralelo_lote(transacoes_criadas, comites, validadores_selecionados, prevalidacao))
+            transacoes_criadas = []
+
         # Gerencia o consenso dos validadores para cada transação pendente
         for transacao_atual in transacoes_criadas:
-            seletor_id = validadores_selecionados[0].seletor_id if validadores_selecionados else None
-            seletor = db.session.get(Seletor, seletor_id)
-            resultado = gerenciar_consenso([transacao_atual], validadores_selecionados, seletor)
+            validadores_transacao = comites.get(transacao_atual.id, validadores_selecionados)
+            seletor_id = validadores_transacao[0].seletor_id if validadores_transacao else None
+            with etapa('consenso'):
+                seletor = db.session.get(Seletor, seletor_id)
+                resultado = gerenciar_consenso([transacao_atual], validadores_transacao, seletor, reservas, reputacao, prevalidacao)
             logger.debug(f"Resultado da validação do consenso: {resultado}")
 
             if resultado['status_code'] == 200:
                 if transacao_atual.status == 1:
-                    # Se a transação é validada com sucesso, atualiza os saldos
-                    remetente = db.session.get(Usuario, transacao_atual.id_remetente)
-                    receptor = db.session.get(Usuario, transacao_atual.id_receptor)
-                    remetente.saldo -= transacao_atual.quantia
-                    receptor.saldo += transacao_atual.quantia
-                    db.session.commit()
+                    # A transação validada já reservou a quantia; os saldos são atualizados na liquidação do lote
                     resultados.append({'id_transacao': transacao_atual.id, 'mensagem': 'Transação feita com sucesso', 'status': 'sucesso'})
                 else:
                     resultado.update({'id_transacao': transacao_atual.id, 'mensagem': 'Transação rejeitada', 'status': 'rejeitada'})
@@ -90,16 +157,92 @@ def transacao():
             else:
                 # Se a transação é rejeitada pelo consenso
                 transacao_atual.status = 2  # Status 2
-                db.session.commit()
                 resultado.update({'id_transacao': transacao_atual.id, 'mensagem': 'Transação rejeitada', 'status': 'rejeitada'})
                 resultados.append(resultado)
 
     except Exception as e:
-        # Lida com exceções
+        # Um erro no consenso descarta o lote inteiro, como uma falha na liquidação
         logger.error("Erro ao processar a transação", exc_info=True)
-        resultados.append({'mensagem': str(e), 'status_code': 500})
+        falha = e
 
-    return jsonify(resultados), 200  # Retorna os resultados das transações processadas
+    if prevalidacao is not None and prevalidacao.rejeitadas:
+        # Os resultados das rejeições antecipadas voltam para a ordem das transações no lote
+        resultados[inicio_consenso:] = sorted(resultados[inicio_consenso:], key=lambda r: ordem.get(r.get('id_transacao'), len(ordem)))
+
+    if falha is None:
+        try:
+            # Liquida os deltas líquidos das transações validadas e grava status, taxas, reputação e saldos em um único commit
+            with etapa('liquidacao'):
+                reputacao.aplicar(confirmar=False)
+                reservas.liquidar(confirmar=False)
+                db.session.commit()
+        except Exception as e:
+            logger.error("Erro ao liquidar as transações do lote", exc_info=True)
+            falha = e
+
+    if falha is not None:
+        # Nada do lote é gravado; em seguida as transações do lote são tratadas em uma transação separada
+        db.session.rollback()
+        tratadas = tratar_lote_com_falha(ids_lote, falha)
+        resultados = [
+            tratadas.get(r['id_transacao'], {
+                'id_transacao': r['id_transacao'], 'mensagem': 'Falha ao processar o lote, a transação continua pendente', 'status': 'pendente', 'status_code': 500
+            })
+            if r.get('id_transacao') in ids_lote else r
+            for r in resultados
+        ]
+        # Transações que não chegaram a ter resultado antes da falha
+        com_resultado = {r.get('id_transacao') for r in resultados}
+        resultados.extend(r for id_transacao, r in sorted(tratadas.items()) if id_transacao not in com_resultado)
+        resultados.append({'mensagem': str(falha), 'status_code': 500})
+        return responder_stream(resultados, 500)
+
+    # Retorna os resultados das transações processadas, codificados um a um no formato negociado
+    return responder_stream(resultados, 200)
+
+def tratar_lote_com_falha(ids_lote, falha):
+    # As transações que envolvem usuários inexistentes são rejeitadas; as demais voltam para a fila com espera
+    # exponencial e, esgotadas as tentativas, são descartadas. Assim uma transação com erro não é drenada de novo
+    # a cada requisição nem bloqueia os próximos lotes
+    if not ids_lote:
+        return {}
+    inexistentes = falha.ids_usuarios if isinstance(falha, LiquidacaoInvalida) else set()
+    try:
+        with etapa('fila'):
+            pendentes = Transacao.query.filter(Transacao.id.in_(list(ids_lote)), Transacao.status == fila.STATUS_PENDENTE).all()
+            tratadas = {}
+            for transacao in pendentes:
+                if transacao.id_remetente in inexistentes or transacao.id_receptor in inexistentes:
+                    transacao.status = fila.STATUS_REJEITADA
+                    tratadas[transacao.id] = {
+                        'id_transacao': transacao.id, 'mensagem': 'Transação rejeitada', 'motivo': 'Remetente ou receptor inexistente',
+                        'status': 'rejeitada', 'status_code': 500
+                    }
+            tratadas.update((r['id_transacao'], r) for r in fila.adiar([t for t in pendentes if t.id not in tratadas], causa='falha_lote'))
+    except Exception:
+        logger.error("Erro ao adiar as transações do lote com falha", exc_info=True)
+        db.session.rollback()
+        return {}
+    return tratadas
+
+def consenso_paralelo_lote(transacoes, comites, validadores_selecionados, prevalidacao=None):
+    # Executa o consenso particionado por remetente e formata os resultados como no consenso sequencial
+    resultados = []
+    comites_lote = {t.id: comites.get(t.id, validadores_selecionados) for t in transacoes}
+
+    with etapa('consenso'):
+        decisoes = gerenciar_consenso_paralelo(
+            transacoes, comites_lote,
+            current_app.config.get('CONSENSO_PARALELO_TRABALHADORES'), current_app.config.get('CONSENSO_PARALELO_EXECUTOR', 'processo'),
+            confirmar=False, prevalidacao=prevalidacao
+        )
+
+    for decisao in decisoes:
+        if decisao['status'] == 'validada':
+            resultados.append({'id_transacao': decisao['id_transacao'], 'mensagem': 'Transação feita com sucesso', 'status': 'sucesso'})
+        else:
+            resultados.append({'id_transacao': decisao['id_transacao'], 'mensagem': 'Transação rejeitada', 'status': 'rejeitada', 'status_code': 500})
+    return resultados
 
 @bp.route('/hora', methods=['GET'])
 def get_tempo_atual():
@@ -219,19 +362,58 @@ def selecionar_validadores_seletor(seletor_id):
             return jsonify({'mensagem': 'Seletor não encontrado', 'status_code': 404}), 404
 
         # Chama a função selecionar_validadores passando o seletor e armazena os validadores selecionados
-        validadores_selecionados = selecionar_validadores(seletor)
+        with etapa('selecao'):
+            validadores_selecionados = selecionar_validadores(seletor)
         if not validadores_selecionados:
             return jsonify({'mensagem': 'Não há validadores suficientes', 'status_code': 400}), 400
 
         # Armazena os validadores selecionados e o ID do seletor na configuração da aplicação para uso na rota de transação
         current_app.config['validadores_selecionados'] = validadores_selecionados
         current_app.config['seletor_id'] = seletor_id
+        current_app.config['agenda_validadores'] = None  # Uma nova seleção substitui a agenda pendente
         
         return jsonify({'mensagem': 'Validadores selecionados com sucesso', 'validadores': [v.id for v in validadores_selecionados]}), 200
     except Exception as e:
         logger.error("Erro ao selecionar validadores", exc_info=True)
         return jsonify({'mensagem': str(e), 'status_code': 500}), 500
 
+# Rota para consultar o estado da fila de transações pendentes
+@bp.route('/fila', methods=['GET'])
+def estado_fila():
+    return jsonify(fila.estatisticas()), 200
+
+# Rota para um seletor sortear de uma vez os comitês das próximas transações
+@bp.route('/seletor/<int:seletor_id>/agendar_validadores', methods=['POST'])
+def agendar_validadores_seletor(seletor_id):
+    try:
+        dados = request.get_json(silent=True) or {}
+        slots = dados.get('slots', 1)
+        semente = dados.get('semente')
+
+        if not isinstance(slots, int) or slots < 1 or slots > current_app.config.get('AGENDA_MAX_SLOTS', 10000):
+            return jsonify({'mensagem': 'Número de slots inválido', 'status_code': 400}), 400
+
+        seletor = db.session.get(Seletor, seletor_id)
+        if not seletor:
+            return jsonify({'mensagem': 'Seletor não encontrado', 'status_code': 404}), 404
+
+        with etapa('selecao'):
+            agenda = selecionar_agenda(seletor, slots, semente)
+        if not agenda:
+            return jsonify({'mensagem': 'Não há validadores suficientes', 'status_code': 400}), 400
+
+        # Armazena a agenda para que cada transação do /trans consuma o próximo comitê
+        current_app.config['agenda_validadores'] = deque([v.id for v in comite] for comite in agenda)
+        current_app.config['seletor_id'] = seletor_id
+
+        return jsonify({
+            'mensagem': 'Agenda de validadores sorteada com sucesso',
+            'agenda': [{'slot': slot, 'validadores': [v.id for v in comite], 'enderecos': [v.endereco for v in comite]} for slot, comite in enumerate(agenda)]
+        }), 200
+    except Exception as e:
+        logger.error("Erro ao sortear a agenda de validadores", exc_info=True)
+        return jsonify({'mensagem': str(e), 'status_code': 500}), 500
+
 # Rota para registrar um usuário
 @bp.route('/usuario/registrar', methods=['POST'])
 def registrar_usuario():
@@ -288,4 +470,96 @@ def remover_usuario():
     db.session.delete(usuario)
     db.session.commit()
 
-    return jsonify({'mensagem': f'Usuário {nome} foi removido', 'status_code': 200}), 200
\ No newline at end of file
+    return jsonify({'mensagem': f'Usuário {nome} foi removido', 'status_code': 200}), 200
+
+# Rota para consultar as estatísticas do cache de validadores por endereço
+@bp.route('/admin/cache_validadores', methods=['GET'])
+def estatisticas_cache_validadores():
+    return jsonify(cache_atual().estatisticas()), 200
+
+# Rota para consultar o desempenho recente dos validadores: latência dos votos, timeouts e concordância com o consenso
+@bp.route('/admin/estatisticas_validadores', methods=['GET'])
+def estatisticas_desempenho_validadores():
+    estatisticas = estatisticas_atual().estatisticas()
+    resumos = estatisticas.pop('validadores')
+    enderecos = dict(db.session.query(Validador.id, Validador.endereco).filter(Validador.id.in_(list(resumos))).all()) if resumos else {}
+    estatisticas['validadores'] = [
+        {'id': id_validador, 'endereco': enderecos.get(id_validador), **resumo}
+        for id_validador, resumo in sorted(resumos.items()) if resumo is not None
+    ]
+    return jsonify(estatisticas), 200
+
+# Rota para listar os perfis de requisições gravados
+@bp.route('/admin/perfis', methods=['GET'])
+def listar_perfis_requisicoes():
+    if not current_app.config.get('PERFIL_HABILITADO'):
+        return jsonify({'mensagem': 'Perfil de requisições desabilitado', 'status_code': 404}), 404
+    return jsonify({'perfis': listar_perfis()}), 200
+
+# Rota para baixar um arquivo de perfil (formato pstats)
+@bp.route('/admin/perfis/<nome>', methods=['GET'])
+def baixar_perfil(nome):
+    if not current_app.config.get('PERFIL_HABILITADO'):
+        return jsonify({'mensagem': 'Perfil de requisições desabilitado', 'status_code': 404}), 404
+    return send_from_directory(diretorio_perfis(), nome, as_attachment=True)
+
+def itens_do_lote():
+    # Lê os itens de uma requisição em lote: lista JSON, objeto com 'itens' ou NDJSON (um objeto por linha)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        itens = [json.loads(linha) for linha in request.get_data(as_text=True).splitlines() if linha.strip()]
+    else:
+        dados = ler_corpo()
+        itens = dados.get('itens') if isinstance(dados, dict) else dados
+    if not isinstance(itens, list):
+        raise ValueError('O lote deve ser uma lista de itens')
+    limite = current_app.config.get('LOTE_MAX_ITENS', 50000)
+    if len(itens) > limite:
+        raise ValueError(f'O lote excede o limite de {limite} itens')
+    return itens
+
+def processar_lote(funcao):
+    # Executa uma operação em lote e responde com os resultados por item
+    try:
+        itens = itens_do_lote()
+    except ValueError as e:
+        status_code = getattr(e, 'status_code', 400)
+        return jsonify({'mensagem': str(e), 'status_code': status_code}), status_code
+    resultado = funcao(itens)
+    return responder(resultado, resultado['status_code'])
+
+# Rotas de cadastro em lote: mesmas regras das rotas de um único item, com resultado por item
+@bp.route('/usuario/registrar_lote', methods=['POST'])
+def registrar_usuarios_lote():
+    return processar_lote(cadastro_lote.registrar_usuarios_lote)
+
+@bp.route('/usuario/editar_lote', methods=['POST'])
+def editar_usuarios_lote():
+    return processar_lote(cadastro_lote.editar_usuarios_lote)
+
+@bp.route('/usuario/remover_lote', methods=['POST'])
+def remover_usuarios_lote():
+    return processar_lote(cadastro_lote.remover_usuarios_lote)
+
+@bp.route('/validador/registrar_lote', methods=['POST'])
+def registrar_validadores_lote():
+    return processar_lote(cadastro_lote.registrar_validadores_lote)
+
+@bp.route('/validador/editar_lote', methods=['POST'])
+def editar_validadores_lote():
+    return processar_lote(cadastro_lote.editar_validadores_lote)
+
+@bp.route('/validador/remover_lote', methods=['POST'])
+def remover_validadores_lote():
+    return processar_lote(cadastro_lote.remover_validadores_lote)
+
+@bp.route('/seletor/registrar_lote', methods=['POST'])
+def registrar_seletores_lote():
+    return processar_lote(cadastro_lote.registrar_seletores_lote)
+
+@bp.route('/seletor/editar_lote', methods=['POST'])
+def editar_seletores_lote():
+    return processar_lote(cadastro_lote.editar_seletores_lote)
+
+@bp.route('/seletor/remover_lote', methods=['POST'])
+def remover_seletores_lote():
+    return processar_lote(cadastro_lote.remover_seletores_lote)
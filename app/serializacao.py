@@ -0,0 +1,127 @@
+import logging
+from flask import Response, current_app, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+# Dependências opcionais: sem elas a aplicação usa o json da biblioteca padrão e só responde em JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+MIMETYPE_JSON = 'application/json'
+MIMETYPE_NDJSON = 'application/x-ndjson'
+MIMETYPES_MSGPACK = ('application/msgpack', 'application/x-msgpack')
+
+class ErroSerializacao(ValueError):
+    # Corpo em um formato não suportado ou inválido
+    def __init__(self, mensagem, status_code=400):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+class ProvedorJSONRapido(DefaultJSONProvider):
+    # Provedor de JSON do Flask sobre o orjson. Datas e demais tipos não nativos passam pelo mesmo
+    # conversor do provedor padrão; objetos que o orjson não aceita caem no json da biblioteca padrão
+    def _opcoes(self, indentar=False):
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if indentar:
+            opcoes |= orjson.OPT_INDENT_2
+        return opcoes
+
+    def codificar(self, obj, indentar=False):
+        # Serializa para bytes UTF-8
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._opcoes(indentar))
+        except TypeError:
+            return super().dumps(obj, indent=2 if indentar else None).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.codificar(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.codificar(obj, indentar) + b"\n", mimetype=self.mimetype)
+
+def codificar_json(obj):
+    # Serializa um objeto em bytes com o provedor de JSON da aplicação
+    provedor = current_app.json
+    if isinstance(provedor, ProvedorJSONRapido):
+        return provedor.codificar(obj)
+    return provedor.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def codificar_msgpack(obj):
+    # Tipos sem representação em MessagePack (datas, por exemplo) são enviados como texto
+    return msgpack.packb(obj, default=str, use_bin_type=True)
+
+def msgpack_habilitado():
+    return msgpack is not None and current_app.config.get('SERIALIZACAO_MSGPACK', True)
+
+def ler_corpo():
+    # Lê o corpo da requisição em JSON ou MessagePack, conforme o Content-Type
+    if request.mimetype in MIMETYPES_MSGPACK:
+        if not msgpack_habilitado():
+            raise ErroSerializacao('MessagePack não está disponível neste servidor', 415)
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except Exception as e:
+            raise ErroSerializacao(f'Corpo MessagePack inválido: {e}')
+    return request.get_json()
+
+def formato_resposta():
+    # Negocia o formato da resposta pelo cabeçalho Accept; JSON é o padrão
+    formatos = [MIMETYPE_JSON, MIMETYPE_NDJSON]
+    if msgpack_habilitado():
+        formatos.extend(MIMETYPES_MSGPACK)
+    return request.accept_mimetypes.best_match(formatos) or MIMETYPE_JSON
+
+def responder(obj, status_code=200):
+    # Resposta com um único objeto no formato negociado
+    formato = formato_resposta()
+    if formato in MIMETYPES_MSGPACK:
+        return Response(codificar_msgpack(obj), status=status_code, mimetype=formato)
+    return current_app.json.response(obj), status_code
+
+def responder_stream(itens, status_code=200):
+    # Resposta com uma lista de itens codificados um a um, sem montar o corpo inteiro em memória:
+    # uma lista JSON (padrão), um objeto por linha (NDJSON) ou uma sequência de objetos MessagePack
+    formato = formato_resposta()
+
+    def gerar():
+        if formato in MIMETYPES_MSGPACK:
+            for item in itens:
+                yield codificar_msgpack(item)
+        elif formato == MIMETYPE_NDJSON:
+            for item in itens:
+                yield codificar_json(item) + b"\n"
+        else:
+            yield b"["
+            for indice, item in enumerate(itens):
+                yield (b"," if indice else b"") + codificar_json(item)
+            yield b"]\n"
+
+    return Response(stream_with_context(gerar()), status=status_code, mimetype=formato)
+
+def init_app(app):
+    # Usa o provedor de JSON rápido quando o orjson estiver instalado e habilitado
+    if orjson is not None and app.config.get('SERIALIZACAO_JSON_RAPIDO', True):
+        app.json = ProvedorJSONRapido(app)
+    elif app.config.get('SERIALIZACAO_JSON_RAPIDO', True):
+        logger.debug("orjson não instalado: usando o provedor de JSON padrão")
@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from . import criar_app
+
+# Dependência opcional: com o a2wsgi a ponte ASGI -> WSGI é a do pacote, mantida fora deste projeto;
+# sem ele a aplicação é executada pela ponte local abaixo
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+# Configura o logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)  # Define o nível de log
+
+TAMANHO_BLOCO_RESPOSTA = 64 * 1024 # Bytes da resposta agrupados por ida ao executor
+
+class AplicacaoAsync:
+    # Serve a mesma aplicação Flask (mesmo blueprint) por ASGI. As conexões, a leitura do corpo e o envio
+    # da resposta ficam no laço de eventos, então clientes lentos custam uma corrotina e não uma thread;
+    # a aplicação só ocupa uma thread do executor depois que o corpo inteiro chegou. Dois limites separados:
+    # ASYNC_MAX_CONCORRENTES requisições executam a aplicação ao mesmo tempo (admissão no executor) e as
+    # demais aguardam a vez no laço; acima de ASYNC_MAX_PENDENTES conexões admitidas a resposta é 503 com
+    # Retry-After (contrapressão), antes de ler o corpo.
+    def __init__(self, app):
+        self.app = app
+        self.trabalhadores = app.config.get('ASYNC_TRABALHADORES', 8)
+        self.max_concorrentes = app.config.get('ASYNC_MAX_CONCORRENTES') or self.trabalhadores
+        self.max_pendentes = app.config.get('ASYNC_MAX_PENDENTES', 10000)
+        self.max_corpo = app.config.get('ASYNC_MAX_CORPO', 64 * 1024 * 1024)
+        if WSGIMiddleware is not None:
+            self.adaptador = WSGIMiddleware(app.wsgi_app, workers=self.trabalhadores)
+            self.executor = self.adaptador.executor
+        else:
+            self.adaptador = None
+            self.executor = ThreadPoolExecutor(max_workers=self.trabalhadores, thread_name_prefix='aplicacao')
+        self.admissao = None # Semáforo do executor, criado no laço de eventos em que é usado
+        self.laco_admissao = None
+        self.pendentes = 0
+        self.executando = 0
+        self.recusadas = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.ciclo_de_vida(receive, send)
+        elif scope['type'] == 'http':
+            await self.atender(scope, receive, send)
+        else:
+            raise RuntimeError(f"Tipo de conexão não suportado: {scope['type']}")
+
+    async def ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def responder_erro(self, send, status, mensagem, cabecalhos=()):
+        corpo = self.app.json.dumps({'mensagem': mensagem, 'status_code': status}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(corpo)).encode()), *cabecalhos]
+        })
+        await send({'type': 'http.response.body', 'body': corpo})
+
+    async def ler_corpo(self, receive):
+        # Lê o corpo inteiro sem ocupar uma thread; None se passar do limite
+        partes, tamanho = [], 0
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'http.disconnect':
+                raise ConnectionAbortedError()
+            parte = mensagem.get('body', b'')
+            tamanho += len(parte)
+            if tamanho > self.max_corpo:
+                return None
+            partes.append(parte)
+            if not mensagem.get('more_body', False):
+                return b''.join(partes)
+
+    def semaforo_admissao(self):
+        laco = asyncio.get_running_loop()
+        if self.laco_admissao is not laco:
+            self.admissao = asyncio.Semaphore(self.max_concorrentes)
+            self.laco_admissao = laco
+        return self.admissao
+
+    async def atender(self, scope, receive, send):
+        # Contrapressão: recusa cedo, antes de ler o corpo, em vez de aceitar conexões sem limite
+        if self.pendentes >= self.max_pendentes:
+            self.recusadas += 1
+            await self.responder_erro(send, 503, 'Servidor ocupado, tente novamente', [(b'retry-after', b'1')])
+            return
+
+        self.pendentes += 1
+        try:
+            try:
+                corpo = await self.ler_corpo(receive)
+            except ConnectionAbortedError:
+                return
+            if corpo is None:
+                await self.responder_erro(send, 413, 'Corpo da requisição excede o limite')
+                return
+
+            # Só max_concorrentes requisições ocupam o executor; as demais esperam aqui, sem thread
+            async with self.semaforo_admissao():
+                self.executando += 1
+                try:
+                    if self.adaptador is not None:
+                        await self.adaptador(scope, receber_corpo(corpo), send)
+                    else:
+                        await self.executar(scope, corpo, send)
+                finally:
+                    self.executando -= 1
+        finally:
+            self.pendentes -= 1
+
+    async def executar(self, scope, corpo, send):
+        # Ponte local, usada sem o a2wsgi
+        laco = asyncio.get_running_loop()
+        iteravel = None
+        try:
+            status, cabecalhos, iteravel = await laco.run_in_executor(self.executor, self.executar_wsgi, scope, corpo)
+            await send({'type': 'http.response.start', 'status': status, 'headers': cabecalhos})
+            while True:
+                # Respostas em stream são lidas no executor, em blocos, e enviadas conforme o cliente consome
+                bloco = await laco.run_in_executor(self.executor, iteravel.executar, self.proximo_bloco, iteravel)
+                if not bloco:
+                    break
+                await send({'type': 'http.response.body', 'body': bloco, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if iteravel is not None:
+                await laco.run_in_executor(self.executor, iteravel.executar, iteravel.close)
+
+    def executar_wsgi(self, scope, corpo):
+        # Executa a aplicação Flask em uma thread do executor
+        resposta = {}
+
+        def start_response(status, cabecalhos, exc_info=None):
+            resposta['status'] = int(status.split(' ', 1)[0])
+            resposta['cabecalhos'] = [(nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos]
+            return lambda dados: resposta.setdefault('escritos', []).append(dados)
+
+        # Um contexto por requisição: a aplicação, cada bloco e o close rodam nele, em qualquer thread do
+        # executor, para que as variáveis de contexto do Flask (stream_with_context) sejam sempre as mesmas
+        contexto = contextvars.copy_context()
+        iteravel = contexto.run(self.app.wsgi_app, ambiente_wsgi(scope, corpo), start_response)
+        iterador = contexto.run(iter, iteravel)
+        escritos = resposta.get('escritos')
+        if escritos:
+            iterador = iter([b''.join(escritos), *iterador])
+        return resposta['status'], resposta['cabecalhos'], IteravelResposta(iterador, iteravel, contexto)
+
+    def proximo_bloco(self, iteravel):
+        partes, tamanho = [], 0
+        for parte in iteravel.iterador:
+            partes.append(parte)
+            tamanho += len(parte)
+            if tamanho >= TAMANHO_BLOCO_RESPOSTA:
+                break
+        return b''.join(partes)
+
+    def estatisticas(self):
+        return {
+            'pendentes': self.pendentes,
+            'executando': self.executando,
+            'recusadas': self.recusadas,
+            'trabalhadores': self.trabalhadores,
+            'max_concorrentes': self.max_concorrentes,
+            'max_pendentes': self.max_pendentes,
+            'adaptador': 'a2wsgi' if self.adaptador is not None else 'local'
+        }
+
+class IteravelResposta:
+    # Guarda o iterador da resposta, o iterável original, que precisa ser fechado no final, e o contexto da
+    # requisição. As chamadas são sempre sequenciais, nunca concorrentes, como exige contextvars.Context.run
+    def __init__(self, iterador, original, contexto):
+        self.iterador = iterador
+        self.original = original
+        self.contexto = contexto
+
+    def executar(self, funcao, *argumentos):
+        return self.contexto.run(funcao, *argumentos)
+
+    def close(self):
+        if hasattr(self.original, 'close'):
+            self.original.close()
+
+def receber_corpo(corpo):
+    # Entrega ao adaptador o corpo já lido, em uma única mensagem; depois dela a conexão segue aberta,
+    # como em um servidor ASGI, e a espera só termina quando o adaptador a cancela
+    mensagens = [{'type': 'http.request', 'body': corpo, 'more_body': False}]
+
+    async def receive():
+        if mensagens:
+            return mensagens.pop()
+        await asyncio.Future()
+    return receive
+
+def ambiente_wsgi(scope, corpo):
+    # Monta o ambiente WSGI (PEP 3333) a partir do escopo ASGI
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    ambiente = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': cliente[0],
+        'REMOTE_PORT': str(cliente[1]),
+        'CONTENT_LENGTH': str(len(corpo)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1').upper().replace('-', '_')
+        valor = valor.decode('latin-1')
+        if nome == 'CONTENT_TYPE':
+            ambiente['CONTENT_TYPE'] = valor
+        elif nome != 'CONTENT_LENGTH':
+            chave = f'HTTP_{nome}'
+            ambiente[chave] = f'{ambiente[chave]},{valor}' if chave in ambiente else valor
+    return ambiente
+
+def criar_app_async(config_object='app.config.Config'):
+    # Cria a aplicação ASGI sobre a aplicação Flask configurada
+    return AplicacaoAsync(criar_app(config_object))
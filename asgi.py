@@ -0,0 +1,20 @@
+import argparse
+from app.servidor_async import criar_app_async
+
+# Modo de serviço assíncrono: a mesma aplicação servida por um servidor ASGI (uvicorn ou hypercorn),
+# por exemplo: uvicorn asgi:app --host 0.0.0.0 --port 5000
+app = criar_app_async()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a aplicação em modo assíncrono com o uvicorn')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit('O modo assíncrono requer um servidor ASGI: pip install uvicorn')
+    uvicorn.run(app, host=args.host, port=args.porta, lifespan='on')
+
+if __name__ == '__main__':
+    main()
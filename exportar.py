@@ -0,0 +1,28 @@
+import argparse
+import os
+from app.exportacao import FORMATOS, TABELAS, exportar
+
+# Exportação colunar das tabelas do ledger para análise offline, fora do banco de produção
+
+def url_somente_leitura(caminho):
+    # Abre o arquivo SQLite em modo somente leitura, sem bloquear as escritas do consenso
+    return f"sqlite:///file:{os.path.abspath(caminho)}?mode=ro&uri=true"
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta transações, usuários e validadores em formato colunar')
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--banco', help='Arquivo SQLite do ledger, aberto em modo somente leitura')
+    origem.add_argument('--url', help='URL SQLAlchemy do banco de dados')
+    parser.add_argument('--destino', required=True, help='Diretório da exportação; exportações seguintes continuam da marca d\'água')
+    parser.add_argument('--formato', choices=FORMATOS, default='bruto', help='bruto (arrays binários + manifesto) ou parquet (requer pyarrow)')
+    parser.add_argument('--linhas-por-parte', type=int, default=100000, help='Número de linhas lidas e gravadas por parte')
+    parser.add_argument('--tabelas', nargs='+', choices=list(TABELAS), help='Tabelas a exportar (padrão: todas)')
+    args = parser.parse_args()
+
+    url = args.url or url_somente_leitura(args.banco)
+    resumo = exportar(url, args.destino, args.formato, args.linhas_por_parte, args.tabelas)
+    for tabela, linhas in resumo.items():
+        print(f"{tabela}: {linhas} linhas exportadas")
+
+if __name__ == '__main__':
+    main()
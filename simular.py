@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from app.motor import (
+    MotorLedger, ArmazenamentoMemoria, RegistroUsuario, RegistroSeletor, RegistroValidador, RegistroTransacao
+)
+from app.validacao import gerar_chave
+from app.chaves import compactar_chaves
+from app.checkpoint import CheckpointInvalido, carregar_checkpoint, gravar_checkpoint
+
+# Replay offline de um fluxo de transações pelo motor do ledger, sem servidor Flask nem HTTP
+
+def ler_jsonl(caminho):
+    # Lê capturas de payloads do /trans (objeto ou lista por linha) ou uma exportação de Transacao em JSONL
+    with open(caminho, encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            linha = linha.strip()
+            if not linha:
+                continue
+            dados = json.loads(linha)
+            for transacao in (dados if isinstance(dados, list) else [dados]):
+                yield transacao
+
+def ler_banco(caminho, apos_id=None):
+    # Lê a tabela transacao de um banco SQLite na ordem em que foi gravada, opcionalmente após um id
+    conexao = sqlite3.connect(caminho)
+    try:
+        cursor = conexao.execute(
+            'SELECT id, id_remetente, id_receptor, quantia, horario FROM transacao WHERE id > ? ORDER BY id',
+            (apos_id if apos_id is not None else 0,)
+        )
+        for id_transacao, id_remetente, id_receptor, quantia, horario in cursor:
+            yield {'id': id_transacao, 'id_remetente': id_remetente, 'id_receptor': id_receptor, 'quantia': quantia, 'horario': horario}
+    finally:
+        conexao.close()
+
+def montar_ledger(args, rng):
+    # Cria o estado inicial em memória: seletor e validadores, com alguns maliciosos
+    armazenamento = ArmazenamentoMemoria()
+    seletor = armazenamento.adicionar_seletor(RegistroSeletor(1, 'seletor1', saldo=0.0))
+    maliciosos = set(rng.sample(range(1, args.validadores + 1), min(args.maliciosos, args.validadores)))
+    for i in range(1, args.validadores + 1):
+        endereco = f'validador{i}'
+        # Validadores maliciosos usam uma chave do seletor inválida, como o validador6 dos testes de rotas
+        chave_seletor = 'malicioso' if i in maliciosos else gerar_chave(seletor.id, endereco)
+        armazenamento.adicionar_validador(RegistroValidador(i, endereco, rng.uniform(1000, 5000), f'key{i}', chave_seletor, seletor.id))
+    return armazenamento, seletor, maliciosos
+
+def simular(transacoes, args, estado=None):
+    # Com um estado carregado de um checkpoint, transacoes contém apenas o fluxo posterior à marca d'água
+    rng = random.Random(args.semente)
+    if estado:
+        armazenamento = estado['armazenamento']
+        seletor = armazenamento.obter_seletor(1)
+        maliciosos = {v.id for v in armazenamento.validadores.values() if v.chave_seletor == 'malicioso'}
+        if estado['estado_rng']:
+            rng.setstate(estado['estado_rng'])
+        relogio = {'agora': estado['agora']}
+        posicao = estado['marca_dagua']
+    else:
+        armazenamento, seletor, maliciosos = montar_ledger(args, rng)
+        # Relógio simulado: avança com o horário de cada transação
+        relogio = {'agora': datetime(2024, 1, 1)}
+        posicao = 0
+
+    motor = MotorLedger(armazenamento, rng=rng, relogio=lambda: relogio['agora'])
+    intervalo = timedelta(milliseconds=args.intervalo_ms)
+    checkpoint = getattr(args, 'checkpoint', None)
+    checkpoint_cada = getattr(args, 'checkpoint_cada', 0)
+    id_fonte = estado['id_fonte'] if estado else None
+    retomado_de = posicao
+
+    totais = {'validadas': 0, 'rejeitadas': 0, 'sem_comite': 0}
+    comite = None
+    inicio = time.perf_counter()
+
+    for indice, dados in enumerate(transacoes):
+        if args.limite and indice >= args.limite:
+            break
+        # Checkpoint periódico do estado após as transações já processadas
+        if checkpoint and checkpoint_cada and indice and indice % checkpoint_cada == 0:
+            gravar_checkpoint(checkpoint, armazenamento, posicao, relogio['agora'], rng.getstate(), id_fonte)
+        # Posição no fluxo completo e id na fonte, gravados como marca d'água do checkpoint
+        posicao += 1
+        id_fonte = dados.get('id', id_fonte)
+
+        # Usuários desconhecidos são criados com o saldo inicial
+        for id_usuario in (dados['id_remetente'], dados['id_receptor']):
+            if armazenamento.obter_usuario(id_usuario) is None:
+                armazenamento.adicionar_usuario(RegistroUsuario(id_usuario, f'usuario{id_usuario}', saldo=args.saldo_inicial))
+
+        # Usa o horário gravado quando existir, senão avança o relógio pelo intervalo configurado
+        if dados.get('horario'):
+            horario = datetime.fromisoformat(str(dados['horario']))
+        else:
+            horario = relogio['agora'] + intervalo
+        relogio['agora'] = max(relogio['agora'], horario)
+
+        # Sorteia um comitê por transação, ou um único comitê para todo o fluxo
+        if comite is None or not args.comite_fixo:
+            comite = motor.selecionar_validadores(seletor)
+        if not comite:
+            totais['sem_comite'] += 1
+            continue
+
+        chaves = [gerar_chave(seletor.id, validador.endereco) for validador in comite]
+        transacao = armazenamento.adicionar_transacao(RegistroTransacao(
+            dados['id_remetente'], dados['id_receptor'], float(dados['quantia']), compactar_chaves(chaves), horario
+        ))
+        motor.gerenciar_consenso([transacao], comite, seletor)
+        if transacao.status == 1:
+            motor.liquidar_transacao(transacao)
+            totais['validadas'] += 1
+        else:
+            totais['rejeitadas'] += 1
+
+    duracao = time.perf_counter() - inicio
+    processadas = totais['validadas'] + totais['rejeitadas'] + totais['sem_comite']
+    if checkpoint:
+        gravar_checkpoint(checkpoint, armazenamento, posicao, relogio['agora'], rng.getstate(), id_fonte)
+    return {
+        'transacoes': processadas,
+        'retomado_de': retomado_de,
+        **totais,
+        'duracao_s': round(duracao, 3),
+        'transacoes_por_segundo': round(processadas / duracao, 1) if duracao else None,
+        'saldo_seletor': round(seletor.saldo, 6),
+        'validadores_maliciosos': sorted(f'validador{i}' for i in maliciosos),
+        'validadores_expulsos': sorted(v.endereco for v in armazenamento.validadores.values() if v.status == 'expulso'),
+        'saldos': {str(u.id): round(u.saldo, 6) for u in sorted(armazenamento.usuarios.values(), key=lambda u: u.id)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay determinístico de transações pelo motor do consenso')
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--jsonl', help='Arquivo JSONL com payloads do /trans ou exportação de Transacao')
+    origem.add_argument('--banco', help='Banco SQLite com a tabela transacao')
+    parser.add_argument('--semente', type=int, default=0, help='Semente da seleção de comitês')
+    parser.add_argument('--validadores', type=int, default=30, help='Número de validadores simulados')
+    parser.add_argument('--maliciosos', type=int, default=0, help='Número de validadores com chave do seletor inválida')
+    parser.add_argument('--saldo-inicial', type=float, default=2000.0, help='Saldo inicial dos usuários')
+    parser.add_argument('--intervalo-ms', type=int, default=1000, help='Intervalo entre transações sem horário gravado')
+    parser.add_argument('--comite-fixo', action='store_true', help='Reutiliza um único comitê para todo o fluxo, como um lote do /trans')
+    parser.add_argument('--limite', type=int, default=0, help='Número máximo de transações a processar')
+    parser.add_argument('--saida', help='Arquivo JSON para gravar o relatório completo')
+    parser.add_argument('--checkpoint', help='Arquivo de checkpoint: retoma dele se existir e grava o estado ao final')
+    parser.add_argument('--checkpoint-cada', type=int, default=0, help='Grava também um checkpoint a cada N transações')
+    args = parser.parse_args()
+
+    # Desliga os logs de depuração do motor, que dominariam o tempo do replay
+    logging.getLogger('app.motor').setLevel(logging.WARNING)
+
+    # Retoma do checkpoint quando existir: só o fluxo posterior à marca d'água é lido e processado
+    estado = None
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        try:
+            estado = carregar_checkpoint(args.checkpoint)
+        except CheckpointInvalido as e:
+            print(f"Checkpoint ignorado, recomeçando do início: {e}")
+
+    if args.banco:
+        transacoes = ler_banco(args.banco, estado['id_fonte'] if estado else None)
+    else:
+        transacoes = ler_jsonl(args.jsonl)
+        if estado:
+            transacoes = itertools.islice(transacoes, estado['marca_dagua'], None)
+    relatorio = simular(transacoes, args, estado)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+
+    saldos = relatorio.pop('saldos')
+    for chave, valor in relatorio.items():
+        print(f"{chave}: {valor}")
+    print(f"usuarios: {len(saldos)} (saldo total {sum(saldos.values()):.2f})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, insert, text
+from app.models import db, Usuario, Seletor, Validador, Transacao
+from app.exportacao import exportar, ler_manifesto, ler_coluna_bruta
+from exportar import url_somente_leitura
+
+class TesteExportacao(unittest.TestCase):
+    def setUp(self):
+        # Banco SQLite temporário com alguns usuários, validadores e transações
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.diretorio.name, 'ledger.db')}"
+        self.destino = os.path.join(self.diretorio.name, 'exportacao')
+        self.engine = create_engine(self.url)
+        db.metadata.create_all(self.engine)
+        with self.engine.begin() as conexao:
+            conexao.execute(insert(Usuario), [{'nome': f'usuário{i}', 'saldo': 100.0 * i} for i in range(1, 4)])
+            conexao.execute(insert(Seletor), [{'endereco': 'seletor1', 'saldo': 0.0}])
+            conexao.execute(insert(Validador), [{'endereco': 'validador1', 'stake': 100.0, 'key': 'key1', 'chave_seletor': '1-validador1', 'seletor_id': 1}])
+            self.inserir_transacoes(conexao, [1] * 5)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.diretorio.cleanup()
+
+    def inserir_transacoes(self, conexao, status):
+        conexao.execute(insert(Transacao), [
+            {'id_remetente': 1, 'id_receptor': 2, 'quantia': 1.5, 'status': s, 'keys_validacao': 'abc', 'horario': datetime(2024, 1, 1, 12, 0, i)}
+            for i, s in enumerate(status)
+        ])
+
+    def teste_exportacao_incremental(self):
+        resumo = exportar(self.url, self.destino, linhas_por_parte=2)
+        self.assertEqual(resumo, {'transacao': 5, 'usuario': 3, 'validador': 1})
+        manifesto = ler_manifesto(self.destino)
+        transacoes = manifesto['tabelas']['transacao']
+        self.assertEqual((transacoes['linhas'], transacoes['marca_dagua'], len(transacoes['partes'])), (5, 5, 3))
+
+        parte = transacoes['partes'][0]
+        self.assertEqual(ler_coluna_bruta(self.destino, parte, 'id'), [1, 2])
+        self.assertEqual(ler_coluna_bruta(self.destino, parte, 'quantia'), [1.5, 1.5])
+        self.assertEqual(ler_coluna_bruta(self.destino, parte, 'horario')[1], datetime(2024, 1, 1, 12, 0, 1))
+        usuarios = manifesto['tabelas']['usuario']['partes'][0]
+        self.assertEqual(ler_coluna_bruta(self.destino, usuarios, 'nome'), ['usuário1', 'usuário2'])
+        self.assertEqual(ler_coluna_bruta(self.destino, usuarios, 'tempo_bloqueio'), [None, None])
+
+        # A próxima exportação só lê as transações novas e para antes da primeira pendente
+        with self.engine.begin() as conexao:
+            self.inserir_transacoes(conexao, [2, 0, 1])
+        resumo = exportar(self.url, self.destino, linhas_por_parte=2)
+        self.assertEqual(resumo['transacao'], 1)
+        self.assertEqual(ler_manifesto(self.destino)['tabelas']['transacao']['marca_dagua'], 6)
+
+        # O instantâneo anterior dos usuários é substituído
+        self.assertEqual(len(os.listdir(os.path.join(self.destino, 'usuario'))), 1)
+
+    def teste_banco_anterior_a_migracao(self):
+        # Banco sem as colunas da fila, aberto somente para leitura: a exportação usa as colunas existentes
+        caminho = os.path.join(self.diretorio.name, 'antigo.db')
+        engine = create_engine(f'sqlite:///{caminho}')
+        with engine.begin() as conexao:
+            for tabela in ('usuario', 'seletor', 'validador'):
+                db.metadata.tables[tabela].create(conexao)
+            conexao.execute(text(
+                'CREATE TABLE transacao (id INTEGER PRIMARY KEY, id_remetente INTEGER NOT NULL, id_receptor INTEGER NOT NULL, '
+                'quantia FLOAT NOT NULL, status INTEGER NOT NULL, horario DATETIME NOT NULL, keys_validacao VARCHAR(100) NOT NULL)'
+            ))
+            conexao.execute(text("INSERT INTO transacao VALUES (1, 1, 2, 5.0, 1, '2024-01-01 00:00:00', 'abc')"))
+        engine.dispose()
+
+        resumo = exportar(url_somente_leitura(caminho), self.destino)
+        self.assertEqual(resumo, {'transacao': 1, 'usuario': 0, 'validador': 0})
+        transacoes = ler_manifesto(self.destino)['tabelas']['transacao']
+        self.assertNotIn('tentativas', transacoes['tipos'])
+        self.assertEqual(ler_coluna_bruta(self.destino, transacoes['partes'][0], 'quantia'), [5.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,406 @@
+import argparse
+import os
+import tempfile
+import time
+import random
+import unittest
+from datetime import datetime, timedelta
+from app.motor import (
+    MotorLedger, ArmazenamentoMemoria, ReservasLote, LiquidacaoInvalida, RegistroUsuario, RegistroSeletor, RegistroValidador, RegistroTransacao
+)
+from app.validacao import gerar_chave
+from app.chaves import compactar_chaves, conjunto_chaves, chave_valida
+from app.paralelo import consenso_paralelo
+from app import paralelo as paralelo_modulo
+from app.reputacao import ReputacaoLote
+from app.checkpoint import CheckpointInvalido, carregar_checkpoint
+from app import prevalidacao
+from app.estatisticas_validadores import EstatisticasValidadores
+from simular import simular
+
+class TesteMotor(unittest.TestCase):
+    def setUp(self):
+        # Monta um ledger em memória com usuários, um seletor e validadores
+        self.armazenamento = ArmazenamentoMemoria()
+        self.armazenamento.adicionar_usuario(RegistroUsuario(1, 'usuario1', saldo=600.0))
+        self.armazenamento.adicionar_usuario(RegistroUsuario(2, 'usuario2', saldo=200.0))
+        self.seletor = self.armazenamento.adicionar_seletor(RegistroSeletor(1, 'seletor1', saldo=100.0))
+        for i in range(1, 9):
+            chave_seletor = 'malicioso' if i == 6 else gerar_chave(1, f'validador{i}')
+            self.armazenamento.adicionar_validador(RegistroValidador(i, f'validador{i}', 250.0, f'key{i}', chave_seletor, 1))
+        self.agora = datetime(2024, 1, 1, 12, 0, 0)
+        self.motor = MotorLedger(self.armazenamento, rng=random.Random(42), relogio=lambda: self.agora)
+
+    def criar_transacao(self, validadores, quantia, id_remetente=1, id_receptor=2):
+        chaves = [gerar_chave(1, v.endereco) for v in validadores]
+        transacao = RegistroTransacao(id_remetente, id_receptor, quantia, compactar_chaves(chaves), self.agora - timedelta(seconds=1))
+        return self.armazenamento.adicionar_transacao(transacao)
+
+    def teste_selecao_deterministica(self):
+        selecionados = self.motor.selecionar_validadores(self.seletor)
+        self.assertEqual(len(selecionados), 3)
+
+        # A mesma semente produz o mesmo comitê
+        outro = ArmazenamentoMemoria()
+        for validador in self.armazenamento.validadores.values():
+            outro.adicionar_validador(RegistroValidador(validador.id, validador.endereco, 250.0, validador.key, validador.chave_seletor, 1))
+        outro_motor = MotorLedger(outro, rng=random.Random(42), relogio=lambda: self.agora)
+        self.assertEqual([v.id for v in outro_motor.selecionar_validadores(self.seletor)], [v.id for v in selecionados])
+
+    def teste_selecao_aplica_hold_em_lote(self):
+        validador = self.armazenamento.obter_validador('validador1')
+        validador.selecoes_consecutivas = 5
+
+        selecionados = self.motor.selecionar_validadores(self.seletor)
+        self.assertNotIn(validador, selecionados)
+        self.assertEqual(validador.status, 'on_hold')
+        # Cada nova passada da seleção consome uma transação do hold, como na seleção original
+        self.assertIn(validador.transacoes_hold_restantes, range(1, 6))
+        self.assertEqual(validador.selecoes_consecutivas, 0)
+        for outro in self.armazenamento.validadores.values():
+            self.assertEqual(outro.selecoes_consecutivas, 1 if outro in selecionados else 0)
+
+    def teste_agenda_de_comites(self):
+        agenda = self.motor.selecionar_agenda(self.seletor, 20, random.Random(3))
+        self.assertEqual(len(agenda), 20)
+        for comite in agenda:
+            self.assertEqual(len(set(comite)), 3)
+
+        # Nenhum validador aparece em mais de 5 slots consecutivos: o hold é aplicado durante o sorteio
+        for validador in self.armazenamento.validadores.values():
+            consecutivos = 0
+            for comite in agenda:
+                consecutivos = consecutivos + 1 if validador in comite else 0
+                self.assertLessEqual(consecutivos, 5)
+
+    def teste_consenso_e_liquidacao(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+        transacao = self.criar_transacao(validadores, 100.0)
+
+        resultado = self.motor.gerenciar_consenso([transacao], validadores, self.seletor)
+        self.assertEqual(resultado['status_code'], 200)
+        self.assertEqual(transacao.status, 1)
+        self.motor.liquidar_transacao(transacao)
+
+        self.assertAlmostEqual(self.armazenamento.obter_usuario(1).saldo, 500.0)
+        self.assertAlmostEqual(self.armazenamento.obter_usuario(2).saldo, 300.0)
+        self.assertAlmostEqual(self.seletor.saldo, 101.5)
+        self.assertAlmostEqual(validadores[0].stake, 250.0 + 1.0 / 3 + 0.5)
+
+    def teste_reservas_do_lote(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+        reservas = ReservasLote(self.armazenamento)
+        transacoes = [self.criar_transacao(validadores, 250.0) for _ in range(3)]
+
+        for transacao in transacoes:
+            self.motor.gerenciar_consenso([transacao], validadores, self.seletor, reservas)
+
+        # A terceira transação excede o saldo corrente do remetente
+        self.assertEqual([t.status for t in transacoes], [1, 1, 2])
+        self.assertEqual(self.armazenamento.obter_usuario(1).saldo, 600.0)
+        reservas.liquidar()
+        self.assertAlmostEqual(self.armazenamento.obter_usuario(1).saldo, 100.0)
+        self.assertAlmostEqual(self.armazenamento.obter_usuario(2).saldo, 700.0)
+
+    def teste_lote_confirmado_uma_vez(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+        reservas = ReservasLote(self.armazenamento)
+        commits = []
+        self.armazenamento.confirmar = lambda: commits.append(1)
+
+        # Com as reservas do lote, status, taxas e votos não são confirmados transação a transação
+        transacoes = [self.criar_transacao(validadores, 10.0), self.criar_transacao(validadores, 10.0, id_receptor=9999)]
+        for transacao in transacoes:
+            self.motor.gerenciar_consenso([transacao], validadores, self.seletor, reservas)
+        self.assertEqual([t.status for t in transacoes], [1, 1])
+        self.assertEqual(commits, [])
+
+        # Um receptor inexistente falha a liquidação antes de qualquer saldo ser alterado
+        with self.assertRaises(LiquidacaoInvalida):
+            reservas.liquidar()
+        self.assertEqual((self.armazenamento.obter_usuario(1).saldo, self.armazenamento.obter_usuario(2).saldo), (600.0, 200.0))
+        self.assertEqual(commits, [])
+
+    def teste_consenso_paralelo_equivale_ao_sequencial(self):
+        def montar():
+            armazenamento = ArmazenamentoMemoria()
+            for i in range(1, 11):
+                armazenamento.adicionar_usuario(RegistroUsuario(i, f'usuario{i}', saldo=300.0))
+            armazenamento.adicionar_seletor(RegistroSeletor(1, 'seletor1'))
+            for i in range(1, 7):
+                chave_seletor = 'malicioso' if i == 6 else gerar_chave(1, f'validador{i}')
+                armazenamento.adicionar_validador(RegistroValidador(i, f'validador{i}', 250.0, f'key{i}', chave_seletor, 1))
+            comites = {}
+            for i in range(120):
+                comite = [armazenamento.obter_validador(f'validador{(i + j) % 6 + 1}') for j in range(3)]
+                chaves = compactar_chaves(gerar_chave(1, v.endereco) for v in comite)
+                # Os remetentes 1 a 5 só enviam para os receptores 6 a 10; alguns estouram o saldo
+                transacao = armazenamento.adicionar_transacao(RegistroTransacao(i % 5 + 1, i % 5 + 6, 15.0 + i % 7, chaves, self.agora - timedelta(seconds=120 - i)))
+                comites[transacao.id] = comite
+            return armazenamento, comites
+
+        sequencial, comites_sequencial = montar()
+        motor = MotorLedger(sequencial, relogio=lambda: self.agora)
+        reservas = ReservasLote(sequencial)
+        for transacao in sequencial.transacoes:
+            motor.gerenciar_consenso([transacao], comites_sequencial[transacao.id], sequencial.obter_seletor(1), reservas)
+        reservas.liquidar()
+
+        for tipo_executor in ('thread', 'processo'):
+            paralelo, comites_paralelo = montar()
+            consenso_paralelo(MotorLedger(paralelo, relogio=lambda: self.agora), paralelo.transacoes, comites_paralelo, 4, tipo_executor)
+
+            self.assertEqual([t.status for t in paralelo.transacoes], [t.status for t in sequencial.transacoes])
+            for id_usuario, usuario in sequencial.usuarios.items():
+                self.assertAlmostEqual(paralelo.obter_usuario(id_usuario).saldo, usuario.saldo)
+            for endereco, validador in sequencial.validadores.items():
+                # As taxas passam pela mesma distribuir_taxas do motor: os valores são idênticos
+                self.assertEqual(paralelo.obter_validador(endereco).stake, validador.stake)
+                self.assertEqual(paralelo.obter_validador(endereco).status, validador.status)
+            self.assertEqual(paralelo.obter_seletor(1).saldo, sequencial.obter_seletor(1).saldo)
+
+        # Os pools reutilizados são encerrados na saída do processo
+        executores = list(paralelo_modulo._executores.values())
+        paralelo_modulo.encerrar_executores()
+        self.assertEqual(paralelo_modulo._executores, {})
+        for executor in executores:
+            with self.assertRaises(RuntimeError):
+                executor.submit(int)
+
+    def teste_validador_malicioso_recebe_flag(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 6)]
+        transacao = self.criar_transacao(validadores, 100.0)
+
+        self.motor.gerenciar_consenso([transacao], validadores, self.seletor)
+        self.assertEqual(transacao.status, 1)
+        self.assertEqual(validadores[2].flag, 1)
+        self.assertEqual(validadores[2].stake, 250.0)
+
+    def teste_reputacao_aplicada_no_fim_do_lote(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 6)]
+        validadores[0].flag = 1
+        validadores[0].transacoes_coerentes = 9998
+        reputacao = ReputacaoLote(self.armazenamento)
+        transacoes = [self.criar_transacao(validadores, 10.0) for _ in range(3)]
+
+        for transacao in transacoes:
+            self.motor.gerenciar_consenso([transacao], validadores, self.seletor, reputacao=reputacao)
+        # Nada muda nos validadores antes da aplicação do lote
+        self.assertEqual(validadores[2].flag, 0)
+        self.assertEqual(validadores[0].transacoes_coerentes, 9998)
+
+        resumo = reputacao.aplicar()
+        self.assertEqual(resumo['expulsos'], ['validador6'])
+        self.assertEqual(resumo['flags_removidas'], 1)
+        self.assertEqual((validadores[2].flag, validadores[2].status, validadores[2].stake), (3, 'expulso', 0))
+        # A segunda transação coerente completa as 10000 e remove a flag; a contagem recomeça
+        self.assertEqual((validadores[0].flag, validadores[0].transacoes_coerentes), (0, 1))
+
+    def teste_chaves_compactas(self):
+        # Comitês grandes cabem na coluna: 16 caracteres por chave, sem separador
+        chaves = [gerar_chave(1, f'validador{i}') for i in range(200)]
+        compactadas = compactar_chaves(chaves)
+        self.assertEqual(len(compactadas), 16 * 200)
+        self.assertEqual(len(conjunto_chaves(compactadas)), 200)
+        self.assertTrue(chave_valida('1-validador199', compactadas))
+        self.assertFalse(chave_valida('malicioso', compactadas))
+
+        # Transações gravadas no formato antigo, separado por vírgulas, continuam válidas
+        self.assertTrue(chave_valida('1-validador2', '1-validador1,1-validador2'))
+        self.assertFalse(chave_valida('1-validador3', '1-validador1,1-validador2'))
+
+    def teste_saldo_insuficiente(self):
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+        transacao = self.criar_transacao(validadores, 1000.0)
+
+        resultado = self.motor.gerenciar_consenso([transacao], validadores, self.seletor)
+        self.assertEqual(resultado['status_code'], 500)
+        self.assertEqual(transacao.status, 2)
+        self.assertEqual(self.seletor.saldo, 100.0)
+
+    def teste_replay_deterministico(self):
+        transacoes = [{'id_remetente': i % 5 + 1, 'id_receptor': (i + 1) % 5 + 1, 'quantia': 10.0} for i in range(200)]
+        args = argparse.Namespace(semente=7, validadores=10, maliciosos=1, saldo_inicial=500.0, intervalo_ms=1000, comite_fixo=False, limite=0)
+
+        relatorio = simular(transacoes, args)
+        self.assertEqual(relatorio['transacoes'], 200)
+        self.assertAlmostEqual(sum(relatorio['saldos'].values()), 2500.0)
+        # O validador malicioso acumula flags até ser expulso
+        self.assertEqual(relatorio['validadores_expulsos'], relatorio['validadores_maliciosos'])
+
+        # A mesma semente reproduz o mesmo resultado
+        outro = simular(transacoes, args)
+        self.assertEqual(outro['saldos'], relatorio['saldos'])
+        self.assertEqual(outro['saldo_seletor'], relatorio['saldo_seletor'])
+
+    def teste_retomada_de_checkpoint(self):
+        transacoes = [{'id_remetente': i % 5 + 1, 'id_receptor': (i + 2) % 5 + 1, 'quantia': 7.0 + i % 3} for i in range(300)]
+        args = argparse.Namespace(semente=11, validadores=10, maliciosos=1, saldo_inicial=500.0, intervalo_ms=250, comite_fixo=False, limite=0)
+        completo = simular(transacoes, args)
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            # Primeira execução interrompida após 180 transações, com checkpoints periódicos
+            caminho = os.path.join(diretorio, 'estado.ckpt')
+            parcial = argparse.Namespace(**vars(args), checkpoint=caminho, checkpoint_cada=50)
+            parcial.limite = 180
+            simular(transacoes, parcial)
+
+            # A retomada carrega o estado e processa apenas as transações posteriores à marca d'água
+            estado = carregar_checkpoint(caminho)
+            self.assertEqual(estado['marca_dagua'], 180)
+            parcial.limite = 0
+            retomado = simular(transacoes[180:], parcial, estado)
+
+            self.assertEqual(retomado['transacoes'], 120)
+            self.assertEqual(retomado['saldos'], completo['saldos'])
+            self.assertEqual(retomado['saldo_seletor'], completo['saldo_seletor'])
+            self.assertEqual(retomado['validadores_expulsos'], completo['validadores_expulsos'])
+
+            with open(caminho, 'r+b') as arquivo:
+                arquivo.write(b'XXXX')
+            with self.assertRaises(CheckpointInvalido):
+                carregar_checkpoint(caminho)
+
+    def teste_prevalidacao_equivale_ao_consenso(self):
+        def montar():
+            # Mesmo ledger e mesmo lote a cada chamada, com um remetente bloqueado e uma transação anterior do usuário 1
+            self.setUp()
+            self.armazenamento.adicionar_usuario(RegistroUsuario(3, 'usuario3', saldo=500.0, tempo_bloqueio=self.agora + timedelta(seconds=30)))
+            validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+            chaves = compactar_chaves([gerar_chave(1, v.endereco) for v in validadores])
+            self.armazenamento.adicionar_transacao(RegistroTransacao(1, 2, 1.0, chaves, self.agora - timedelta(seconds=2), status=1))
+            transacoes = [
+                self.armazenamento.adicionar_transacao(RegistroTransacao(id_remetente, id_receptor, quantia, chaves, self.agora + timedelta(seconds=segundos)))
+                for id_remetente, id_receptor, quantia, segundos in (
+                    (1, 2, 100.0, -1), (3, 1, 10.0, -1), (2, 1, 1000.0, -1), (2, 1, 250.0, -1), (1, 2, 10.0, 5), (1, 2, 10.0, -30)
+                )
+            ]
+            return validadores, transacoes
+
+        # Consenso sem pré-validação como referência
+        validadores, referencia = montar()
+        self.motor.gerenciar_consenso(referencia, validadores, self.seletor, ReservasLote(self.armazenamento))
+
+        validadores, transacoes = montar()
+        lote_pre = prevalidacao.PreValidacaoLote(self.armazenamento, transacoes, self.agora, vetorizar=False)
+        self.assertEqual([(t.id, motivo) for t, motivo in lote_pre.rejeitadas], [
+            (transacoes[1].id, 'Remetente bloqueado'),
+            (transacoes[2].id, 'Saldo insuficiente'),
+            (transacoes[4].id, 'Horário incorreto'),
+            (transacoes[5].id, 'Transação anterior à última'),
+        ])
+        for transacao, _ in lote_pre.rejeitadas:
+            transacao.status = 2
+
+        # As sobreviventes usam as janelas da pré-validação, sem consultar o armazenamento por validador
+        def sem_consulta(*args):
+            raise AssertionError('consulta por validador')
+        self.armazenamento.ultima_transacao = self.armazenamento.contar_transacoes_desde = sem_consulta
+        self.motor.gerenciar_consenso(lote_pre.sobreviventes, validadores, self.seletor, ReservasLote(self.armazenamento), prevalidacao=lote_pre)
+        self.assertEqual([t.status for t in transacoes], [t.status for t in referencia])
+        self.assertEqual([t.status for t in transacoes], [1, 2, 2, 1, 2, 2])
+
+    @unittest.skipUnless(prevalidacao.numpy is not None, 'requer numpy (dependência opcional da pré-validação vetorizada)')
+    def teste_prevalidacao_vetorizada_equivale(self):
+        # Lote aleatório com horários fora de ordem, remetentes bloqueados, saldos curtos, usuários inexistentes
+        # e histórico antes e dentro do lote: as duas implementações chegam às mesmas rejeições e janelas
+        aleatorio = random.Random(7)
+        for id_usuario in range(3, 13):
+            bloqueio = self.agora + timedelta(seconds=30) if id_usuario % 5 == 0 else None
+            self.armazenamento.adicionar_usuario(RegistroUsuario(id_usuario, f'usuario{id_usuario}', saldo=aleatorio.uniform(0, 300), tempo_bloqueio=bloqueio))
+        # O usuário 14 nunca recebe no lote: o limite superior do seu saldo é o saldo atual
+        self.armazenamento.adicionar_usuario(RegistroUsuario(14, 'usuario14', saldo=1.0))
+        for _ in range(40):
+            self.armazenamento.adicionar_transacao(RegistroTransacao(
+                aleatorio.randint(1, 12), aleatorio.randint(1, 12), 1.0, '', self.agora - timedelta(seconds=aleatorio.randint(60, 120)), status=1
+            ))
+        transacoes = [
+            self.armazenamento.adicionar_transacao(RegistroTransacao(
+                14 if indice % 10 == 0 else aleatorio.randint(1, 13), aleatorio.randint(1, 13), aleatorio.uniform(-20, 100), '',
+                self.agora + timedelta(seconds=indice / 2 - 59 + aleatorio.choice((0, 0, 0, -5, 10)))
+            ))
+            for indice in range(120)
+        ]
+
+        python = prevalidacao.PreValidacaoLote(self.armazenamento, transacoes, self.agora, vetorizar=False)
+        vetorizada = prevalidacao.PreValidacaoLote(self.armazenamento, transacoes, self.agora, vetorizar=True)
+        self.assertTrue(vetorizada.vetorizada)
+        self.assertEqual(vetorizada.rejeitadas, python.rejeitadas)
+        self.assertEqual(vetorizada.janelas, python.janelas)
+        self.assertEqual({motivo for _, motivo in python.rejeitadas}, set(prevalidacao.MOTIVOS[1:]))
+        self.assertTrue(python.sobreviventes)
+
+    @unittest.skipUnless(prevalidacao.numpy is not None, 'requer numpy (dependência opcional da pré-validação vetorizada)')
+    def teste_maximo_acumulado_por_grupo(self):
+        numpy = prevalidacao.numpy
+        valores = numpy.array([5, 3, 9, 1, -4, 7, 2, 2 ** 61, 0, -(2 ** 61)], dtype=numpy.int64)
+        inicios = numpy.array([True, False, False, True, False, False, True, False, True, False])
+        grupos = numpy.cumsum(inicios) - 1
+        esperado = [5, 5, 9, 1, 1, 7, 2, 2 ** 61, 0, 0]
+
+        # Faixas que passam do int64 usam o laço; as demais usam o deslocamento, e limite=0 força o laço
+        self.assertEqual(prevalidacao.maximo_acumulado_por_grupo(valores, inicios, grupos).tolist(), esperado)
+        pequenos = valores[:7]
+        self.assertEqual(prevalidacao.maximo_acumulado_por_grupo(pequenos, inicios[:7], grupos[:7]).tolist(), esperado[:7])
+        self.assertEqual(prevalidacao.maximo_acumulado_por_grupo(pequenos, inicios[:7], grupos[:7], limite=0).tolist(), esperado[:7])
+
+    def teste_estatisticas_de_desempenho(self):
+        estatisticas = EstatisticasValidadores(tamanho_anel=50, timeout_ms=100, ponderar=True, latencia_alvo_ms=10, votos_minimos=20)
+        self.motor.estatisticas = estatisticas
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 6)]
+        for _ in range(3):
+            self.motor.gerenciar_consenso([self.criar_transacao(validadores, 1.0)], validadores, self.seletor)
+
+        # O validador com a chave errada discorda do consenso em todos os votos
+        self.assertEqual(estatisticas.resumo(validadores[0].id)['concordancia'], 1.0)
+        self.assertEqual(estatisticas.resumo(validadores[2].id)['concordancia'], 0.0)
+        self.assertEqual(estatisticas.resumo(validadores[2].id)['votos'], 3)
+        # Os votos locais não têm latência: sem uma fonte de votos a ponderação não tem o que medir
+        self.assertIsNone(estatisticas.resumo(validadores[0].id)['latencia_media_ms'])
+        self.assertEqual(estatisticas.fator(validadores[0].id), 1.0)
+
+        # Os anéis guardam só os últimos votos; latências acima do alvo e timeouts reduzem o fator de seleção
+        for _ in range(200):
+            estatisticas.registrar_voto(7, True, 0.2)
+            estatisticas.registrar_voto(8, True, 0.001)
+        lento = estatisticas.resumo(7)
+        self.assertEqual((lento['votos'], lento['janela'], lento['timeouts']), (200, 50, 50))
+        self.assertEqual(lento['fator_selecao'], 0.1)
+        self.assertEqual(estatisticas.fator(8), 1.0)
+
+        # Com a ponderação o validador lento quase não entra nos comitês
+        agenda = self.motor.selecionar_agenda(self.seletor, 200, random.Random(5))
+        lentos = sum(1 for comite in agenda if self.armazenamento.obter_validador('validador7') in comite)
+        rapidos = sum(1 for comite in agenda if self.armazenamento.obter_validador('validador8') in comite)
+        self.assertLess(lentos * 3, rapidos)
+
+    def teste_fonte_de_votos(self):
+        estatisticas = EstatisticasValidadores(tamanho_anel=10, timeout_ms=50, ponderar=True, latencia_alvo_ms=5, votos_minimos=3)
+        validadores = [self.armazenamento.obter_validador(f'validador{i}') for i in (1, 2, 3)]
+
+        def votar(validador, transacao, validar_local):
+            # O validador 1 responde devagar, o 3 nunca responde e o 2 responde na hora
+            if validador.id == 3:
+                raise TimeoutError()
+            if validador.id == 1:
+                time.sleep(0.02)
+            return validar_local()
+
+        self.motor.estatisticas = estatisticas
+        self.motor.votar = votar
+        for _ in range(3):
+            resultado = self.motor.gerenciar_consenso([self.criar_transacao(validadores, 1.0)], validadores, self.seletor)
+            self.assertEqual(resultado['resultados'][0]['status'], 'validada')
+
+        # A latência medida é a da fonte de votos e reduz o fator do validador lento
+        lento, rapido, ausente = (estatisticas.resumo(v.id) for v in validadores)
+        self.assertGreaterEqual(lento['latencia_media_ms'], 20)
+        self.assertLess(lento['fator_selecao'], 0.5)
+        self.assertEqual(rapido['fator_selecao'], 1.0)
+
+        # O voto esgotado conta como timeout e não como aprovação, sem flag de validador malicioso
+        self.assertEqual((ausente['timeouts'], ausente['concordancia'], ausente['fator_selecao']), (3, 0.0, 0.1))
+        self.assertEqual(validadores[2].flag, 0)
+
+if __name__ == '__main__':
+    unittest.main()
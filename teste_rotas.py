@@ -1,9 +1,19 @@
 import unittest
 import logging
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
 from flask import current_app
+from sqlalchemy import create_engine, inspect, text
 from app import criar_app, db
 from app.models import Usuario, Validador, Seletor, Transacao
 from app.validacao import gerar_chave
+from app.instrumentacao import orcamento_consultas
+from app.serializacao import msgpack
+from app.migracoes import atualizar_esquema
+from app.cache_validadores import cache_atual, CacheValidadores
+from app import fila
 
 # Configuração do logger para depuração
 logger = logging.getLogger(__name__)
@@ -213,5 +223,467 @@ class TesteRotas(unittest.TestCase):
         self.assertEqual(resposta.status_code, 200)
         self.assertIn(f'Usuário {dados["nome"]} foi removido', resposta.json['mensagem'])
 
+    def teste_orcamento_consultas_selecao(self):
+        seletor_id = self.obter_seletor()
+        with orcamento_consultas(maximo_consultas=10, maximo_commits=1):
+            resposta = self.client.post(f'/seletor/{seletor_id}/selecionar_validadores')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('X-DB-Consultas', resposta.headers)
+        self.assertIn('selecao=', resposta.headers['X-DB-Etapas'])
+
+    def teste_orcamento_consultas_transacao(self):
+        with self.app.app_context():
+            validadores_selecionados = self.selecionar_validadores()
+            seletor_id = validadores_selecionados[0].seletor_id
+            chaves_validacao = [gerar_chave(seletor_id, v.endereco) for v in validadores_selecionados]
+
+            transacao_dados = {
+                'id_remetente': 1,
+                'id_receptor': 2,
+                'quantia': 10.0,
+                'keys_validacao': chaves_validacao
+            }
+
+            with orcamento_consultas(maximo_consultas=50, maximo_commits=12) as contador:
+                resposta = self.client.post('/trans', json=transacao_dados)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual(int(resposta.headers['X-DB-Consultas']), contador.consultas)
+
+    def teste_orcamento_consultas_admin(self):
+        with orcamento_consultas(maximo_consultas=3, maximo_commits=1):
+            resposta = self.client.post('/usuario/registrar', json={'nome': 'usuario_orcamento', 'saldo': 10.0})
+        self.assertEqual(resposta.status_code, 200)
+
+        with orcamento_consultas(maximo_consultas=3, maximo_commits=1):
+            resposta = self.client.post('/seletor/registrar', json={'endereco': 'seletor_orcamento', 'saldo': 10.0})
+        self.assertEqual(resposta.status_code, 200)
+
+        with orcamento_consultas(maximo_consultas=4, maximo_commits=1):
+            resposta = self.client.post('/validador/registrar', json={'endereco': 'validador_orcamento', 'stake': 60.0, 'key': 'key_orcamento', 'seletor_id': 1})
+        self.assertEqual(resposta.status_code, 200)
+
+        with orcamento_consultas(maximo_consultas=1, maximo_commits=0):
+            resposta = self.client.get('/validador/listar')
+        self.assertEqual(resposta.status_code, 200)
+
+    def teste_cadastro_em_lote(self):
+        # Usuários em NDJSON: uma consulta IN para a unicidade, INSERTs em blocos e um único commit
+        linhas = [json.dumps({'nome': f'usuario_lote{i}', 'saldo': 10.0}) for i in range(1000)]
+        linhas += [json.dumps({'nome': 'usuario2'}), json.dumps({'saldo': 5.0}), json.dumps({'nome': 'usuario_lote0'})]
+        with orcamento_consultas(maximo_consultas=10, maximo_commits=1):
+            resposta = self.client.post('/usuario/registrar_lote', data="\n".join(linhas), content_type='application/x-ndjson')
+        self.assertEqual(resposta.status_code, 207)
+        self.assertEqual((resposta.json['sucesso'], resposta.json['falhas']), (1000, 3))
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados'][-3:]], [400, 400, 400])
+
+        # Validadores mantêm as regras do registro individual: stake mínimo e seletor existente
+        validadores = [
+            {'endereco': 'validador_lote1', 'stake': 60.0, 'key': 'key_lote1', 'seletor_id': 1},
+            {'endereco': 'validador_lote2', 'stake': 10.0, 'key': 'key_lote2', 'seletor_id': 1},
+            {'endereco': 'validador_lote3', 'stake': 60.0, 'key': 'key_lote3', 'seletor_id': 999},
+            {'endereco': 'validador_lote1', 'stake': 60.0, 'key': 'key_lote1', 'seletor_id': 1},
+        ]
+        resposta = self.client.post('/validador/registrar_lote', json=validadores)
+        self.assertEqual(resposta.status_code, 207)
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [200, 400, 404, 400])
+        self.assertEqual(resposta.json['resultados'][0]['chave_seletor'], '1-validador_lote1')
+
+        # Seletores registrados, editados e removidos em lote
+        resposta = self.client.post('/seletor/registrar_lote', json={'itens': [{'endereco': 'seletor_lote1', 'saldo': 1.0}, {'endereco': 'seletor_lote2'}]})
+        self.assertEqual(resposta.status_code, 200)
+        ids = [r['id'] for r in resposta.json['resultados']]
+        resposta = self.client.post('/seletor/editar_lote', json=[{'id': ids[0], 'endereco': 'seletor_lote2', 'saldo': 2.0}, {'id': ids[1], 'endereco': 'seletor_lote3', 'saldo': 3.0}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [400, 200])
+        resposta = self.client.post('/seletor/remover_lote', json=[{'endereco': 'seletor_lote1'}, {'endereco': 'seletor_lote3'}, {'endereco': 'seletor_lote1'}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [200, 200, 404])
+
+        resposta = self.client.post('/usuario/remover_lote', data='nao e json', content_type='application/x-ndjson')
+        self.assertEqual(resposta.status_code, 400)
+
+    def teste_cadastro_em_lote_itens_invalidos(self):
+        # Itens com tipos errados recebem 400 no próprio resultado, antes das consultas e gravações, e os válidos são aplicados
+        validadores = [
+            {'endereco': 'validador_tipo1', 'stake': '60', 'key': 'key_tipo1', 'seletor_id': 1},
+            {'endereco': ['x'], 'stake': 60.0, 'key': 'key_tipo2', 'seletor_id': 1},
+            {'endereco': 'validador_tipo3', 'stake': 60.0, 'key': 'key_tipo3', 'seletor_id': True},
+            {'endereco': 'validador_tipo4', 'stake': 60.0, 'key': 'key_tipo4', 'seletor_id': 1},
+            'nao e objeto',
+        ]
+        resposta = self.client.post('/validador/registrar_lote', json=validadores)
+        self.assertEqual(resposta.status_code, 207)
+        resultados = resposta.json['resultados']
+        self.assertEqual([r['indice'] for r in resultados], [0, 1, 2, 3, 4])
+        self.assertEqual([r['status_code'] for r in resultados], [400, 400, 400, 200, 400])
+        self.assertIn('stake', resultados[0]['mensagem'])
+        self.assertIn('endereco', resultados[1]['mensagem'])
+
+        resposta = self.client.post('/usuario/registrar_lote', json=[{'nome': 'usuario_tipo1', 'saldo': 'muito'}, {'nome': 'usuario_tipo2', 'saldo': 5}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [400, 200])
+        resposta = self.client.post('/usuario/editar_lote', json=[{'id': {'a': 1}}, {'id': 1, 'saldo': [1]}, {'id': 2, 'nome': 7}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [400, 400, 400])
+        resposta = self.client.post('/validador/editar_lote', json=[{'id': 1, 'stake': None}, {'id': '1', 'stake': 60.0}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [400, 400])
+        resposta = self.client.post('/seletor/remover_lote', json=[{'endereco': {'a': 1}}, {}])
+        self.assertEqual([r['status_code'] for r in resposta.json['resultados']], [400, 404])
+
+    def teste_cache_validadores(self):
+        resposta = self.client.post('/validador/registrar', json={'endereco': 'validador_cache', 'stake': 60.0, 'key': 'key_cache', 'seletor_id': 1})
+        self.assertEqual(resposta.status_code, 200)
+        antes = self.client.get('/admin/cache_validadores').json
+
+        # O commit do registro coloca os valores confirmados no cache: a busca seguinte é um acerto sem SELECT,
+        # só com o UPDATE, enquanto uma falha precisaria da consulta pelo endereço
+        with orcamento_consultas(maximo_consultas=1, maximo_commits=1) as contador:
+            resposta = self.client.post('/validador/hold', json={'endereco': 'validador_cache'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(contador.consultas, 1)
+        depois = self.client.get('/admin/cache_validadores').json
+        self.assertEqual(depois['acertos'], antes['acertos'] + 1)
+
+        # Uma alteração por fora das rotas do validador também chega ao cache no commit
+        with self.app.app_context():
+            Validador.query.filter_by(endereco='validador_cache').one().flag = 1
+            db.session.commit()
+            self.assertEqual(cache_atual().obter('validador_cache').flag, 1)
+            # Um rollback descarta a alteração gravada e o cache não fica com o valor descartado
+            cache_atual().obter('validador_cache').stake = 1.0
+            db.session.flush()
+            db.session.rollback()
+            self.assertEqual(cache_atual().obter('validador_cache').stake, 60.0)
+
+        # A flag acima do limite expulsa o validador, e o cache já devolve o validador expulso
+        resposta = self.client.post('/validador/flag', json={'endereco': 'validador_cache', 'acao': 'add'})
+        self.assertEqual(resposta.status_code, 200)
+        resposta = self.client.post('/validador/flag', json={'endereco': 'validador_cache', 'acao': 'add'})
+        self.assertIn('expulso', resposta.json['mensagem'])
+        with self.app.app_context():
+            validador = cache_atual().obter('validador_cache')
+            self.assertEqual((validador.flag, validador.status, validador.stake), (3, 'expulso', 0))
+        depois = self.client.get('/admin/cache_validadores').json
+
+        # A remoção invalida o endereço e o validador não é mais encontrado
+        resposta = self.client.post('/validador/remover', json={'endereco': 'validador_cache'})
+        self.assertEqual(resposta.status_code, 200)
+        resposta = self.client.post('/validador/hold', json={'endereco': 'validador_cache'})
+        self.assertEqual(resposta.status_code, 404)
+        self.assertEqual(self.client.get('/admin/cache_validadores').json['invalidacoes'], depois['invalidacoes'] + 1)
+
+    def teste_estatisticas_validadores(self):
+        with self.app.app_context():
+            validadores_selecionados = self.selecionar_validadores()
+            chaves_validacao = [gerar_chave(v.seletor_id, v.endereco) for v in validadores_selecionados]
+            resposta = self.client.post('/trans', json={'id_remetente': 1, 'id_receptor': 2, 'quantia': 1.0, 'keys_validacao': chaves_validacao})
+            self.assertEqual(resposta.status_code, 200)
+
+            resposta = self.client.get('/admin/estatisticas_validadores')
+            self.assertEqual(resposta.status_code, 200)
+            self.assertFalse(resposta.json['ponderar'])
+            por_endereco = {item['endereco']: item for item in resposta.json['validadores']}
+            for validador in validadores_selecionados:
+                self.assertGreaterEqual(por_endereco[validador.endereco]['votos'], 1)
+                self.assertEqual(por_endereco[validador.endereco]['fator_selecao'], 1.0)
+
+            # Com uma fonte de votos configurada a latência de cada voto é medida
+            self.app.config.update(VOTAR_VALIDADOR=lambda validador, transacao, validar_local: validar_local())
+            try:
+                resposta = self.client.post('/trans', json={'id_remetente': 1, 'id_receptor': 2, 'quantia': 1.0, 'keys_validacao': chaves_validacao})
+                self.assertEqual(resposta.status_code, 200)
+            finally:
+                self.app.config.update(VOTAR_VALIDADOR=None)
+            por_endereco = {item['endereco']: item for item in self.client.get('/admin/estatisticas_validadores').json['validadores']}
+            for validador in validadores_selecionados:
+                self.assertIsNotNone(por_endereco[validador.endereco]['latencia_p95_ms'])
+
+    def teste_serializacao_negociada(self):
+        transacoes_dados = [{'id_remetente': 1}, {'id_receptor': 2}]
+        # Padrão: lista JSON, como antes
+        resposta = self.client.post('/trans', json=transacoes_dados)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json), 2)
+
+        # NDJSON: um resultado por linha
+        resposta = self.client.post('/trans', json=transacoes_dados, headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(resposta.mimetype, 'application/x-ndjson')
+        linhas = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+        self.assertEqual([linha['mensagem'] for linha in linhas], ['Dados da transação incompletos'] * 2)
+
+    @unittest.skipIf(msgpack is None, 'msgpack não instalado')
+    def teste_serializacao_msgpack(self):
+        corpo = msgpack.packb([{'id_remetente': 1}])
+        resposta = self.client.post('/trans', data=corpo, content_type='application/msgpack', headers={'Accept': 'application/msgpack'})
+        self.assertEqual(resposta.mimetype, 'application/msgpack')
+        desempacotador = msgpack.Unpacker(raw=False)
+        desempacotador.feed(resposta.get_data())
+        self.assertEqual([resultado['mensagem'] for resultado in desempacotador], ['Dados da transação incompletos'])
+
+    def teste_perfil_requisicao(self):
+        # Requisições sem o cabeçalho não são perfiladas
+        resposta = self.client.get('/hora')
+        self.assertNotIn('X-Perfil-Arquivo', resposta.headers)
+
+        for _ in range(4):
+            resposta = self.client.get('/hora', headers={'X-Perfil': '1'})
+            self.assertIn('X-Perfil-Arquivo', resposta.headers)
+
+        # Apenas os perfis mais recentes são mantidos no anel
+        resposta = self.client.get('/admin/perfis')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json['perfis']), self.app.config['PERFIL_MAX_ARQUIVOS'])
+        perfil = resposta.json['perfis'][0]
+        self.assertEqual(perfil['caminho'], '/hora')
+
+        resposta = self.client.get(f"/admin/perfis/{perfil['arquivo']}")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(len(resposta.data) > 0)
+
+    def teste_lote_mesmo_remetente(self):
+        with self.app.app_context():
+            resposta = self.client.post('/usuario/registrar', json={'nome': 'usuario_lote', 'saldo': 100.0})
+            self.assertEqual(resposta.status_code, 200)
+            id_remetente = Usuario.query.filter_by(nome='usuario_lote').first().id
+
+            validadores_selecionados = self.selecionar_validadores()
+            chaves_validacao = [gerar_chave(v.seletor_id, v.endereco) for v in validadores_selecionados]
+
+            # As duas primeiras cabem no saldo corrente; a terceira não, pois o saldo reservado já foi consumido
+            transacoes_dados = [{'id_remetente': id_remetente, 'id_receptor': 1, 'quantia': 40.0, 'keys_validacao': chaves_validacao} for _ in range(3)]
+            with orcamento_consultas() as contador:
+                resposta = self.client.post('/trans', json=transacoes_dados)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual([r['status'] for r in resposta.json], ['sucesso', 'sucesso', 'rejeitada'])
+            self.assertEqual(contador.etapas['liquidacao'][1], 1)
+
+            db.session.expire_all()
+            self.assertAlmostEqual(db.session.get(Usuario, id_remetente).saldo, 20.0)
+
+    def teste_prevalidacao_do_lote(self):
+        with self.app.app_context():
+            resposta = self.client.post('/usuario/registrar', json={'nome': 'usuario_bloqueado', 'saldo': 100.0})
+            self.assertEqual(resposta.status_code, 200)
+            bloqueado = Usuario.query.filter_by(nome='usuario_bloqueado').first()
+            bloqueado.tempo_bloqueio = datetime.utcnow() + timedelta(minutes=1)
+            db.session.commit()
+
+            validadores_selecionados = self.selecionar_validadores()
+            chaves_validacao = [gerar_chave(v.seletor_id, v.endereco) for v in validadores_selecionados]
+            transacoes_dados = [
+                {'id_remetente': bloqueado.id, 'id_receptor': 1, 'quantia': 5.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 1, 'id_receptor': 2, 'quantia': 5.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 3, 'id_receptor': 1, 'quantia': 100000.0, 'keys_validacao': chaves_validacao},
+            ]
+            with orcamento_consultas() as contador:
+                resposta = self.client.post('/trans', json=transacoes_dados)
+            self.assertEqual(resposta.status_code, 200)
+            # As rejeições certas saem da pré-validação, na ordem do lote, e só a válida passa pelo consenso
+            self.assertEqual([r['status'] for r in resposta.json], ['rejeitada', 'sucesso', 'rejeitada'])
+            self.assertEqual([r.get('motivo') for r in resposta.json], ['Remetente bloqueado', None, 'Saldo insuficiente'])
+            self.assertIn('prevalidacao', contador.etapas)
+
+            db.session.expire_all()
+            ids = [r['id_transacao'] for r in resposta.json]
+            self.assertEqual([db.session.get(Transacao, id_transacao).status for id_transacao in ids], [2, 1, 2])
+
+    def teste_lote_atomico(self):
+        with self.app.app_context():
+            validadores_selecionados = self.selecionar_validadores()
+            chaves_validacao = [gerar_chave(v.seletor_id, v.endereco) for v in validadores_selecionados]
+            transacoes_dados = [
+                {'id_remetente': 1, 'id_receptor': 9999, 'quantia': 1.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 2, 'id_receptor': 3, 'quantia': 1.0, 'keys_validacao': chaves_validacao},
+            ]
+
+            # O receptor inexistente é rejeitado na pré-validação e o lote é gravado com um único commit
+            with orcamento_consultas() as contador:
+                resposta = self.client.post('/trans', json=transacoes_dados)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual([r['status'] for r in resposta.json], ['rejeitada', 'sucesso'])
+            self.assertEqual(resposta.json[0]['motivo'], 'Remetente ou receptor inexistente')
+            self.assertEqual(contador.etapas['consenso'][1], 0)
+            self.assertEqual(contador.etapas['liquidacao'][1], 1)
+
+            # Sem a pré-validação a liquidação falha e nada do lote é gravado; depois, em uma transação separada,
+            # a transação com o receptor inexistente é rejeitada e a outra volta para a fila com espera
+            saldos = [db.session.get(Usuario, id_usuario).saldo for id_usuario in (1, 2, 3)]
+            self.app.config.update(PREVALIDACAO_LOTE=False)
+            try:
+                resposta = self.client.post('/trans', json=transacoes_dados)
+                self.assertEqual(resposta.status_code, 500)
+                self.assertEqual([r.get('status') for r in resposta.json], ['rejeitada', 'em_espera', None])
+                ids = [r['id_transacao'] for r in resposta.json[:2]]
+
+                # Um erro no consenso (remetente inexistente) também adia a transação em vez de deixá-la pronta
+                resposta = self.client.post('/trans', json=[{'id_remetente': 9999, 'id_receptor': 3, 'quantia': 1.0, 'keys_validacao': chaves_validacao}])
+                self.assertEqual(resposta.status_code, 500)
+                self.assertEqual(resposta.json[0]['status'], 'em_espera')
+                ids.append(resposta.json[0]['id_transacao'])
+
+                db.session.expire_all()
+                self.assertEqual([db.session.get(Usuario, id_usuario).saldo for id_usuario in (1, 2, 3)], saldos)
+
+                # As transações com falha não são drenadas de novo e não bloqueiam os próximos lotes
+                resposta = self.client.post('/trans', json=transacoes_dados[1:])
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual([r['status'] for r in resposta.json], ['sucesso'])
+            finally:
+                self.app.config.update(PREVALIDACAO_LOTE=True)
+
+            db.session.expire_all()
+            self.assertEqual(
+                [(db.session.get(Transacao, id_transacao).status, db.session.get(Transacao, id_transacao).tentativas) for id_transacao in ids],
+                [(2, 0), (0, 1), (0, 1)]
+            )
+            # Remove as pendentes para que não sejam drenadas pelos outros testes
+            Transacao.query.filter(Transacao.id.in_(ids[1:])).delete()
+            db.session.commit()
+
+    def teste_consenso_paralelo(self):
+        with self.app.app_context():
+            validadores_selecionados = self.selecionar_validadores()
+            chaves_validacao = [gerar_chave(v.seletor_id, v.endereco) for v in validadores_selecionados]
+            transacoes_dados = [
+                {'id_remetente': 1, 'id_receptor': 2, 'quantia': 5.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 2, 'id_receptor': 1, 'quantia': 5.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 3, 'id_receptor': 1, 'quantia': 1.0, 'keys_validacao': chaves_validacao},
+                {'id_remetente': 1, 'id_receptor': 2, 'quantia': 100000.0, 'keys_validacao': chaves_validacao},
+            ]
+
+            self.app.config.update(CONSENSO_PARALELO=True, CONSENSO_PARALELO_MIN_LOTE=1, CONSENSO_PARALELO_EXECUTOR='thread')
+            try:
+                with orcamento_consultas() as contador:
+                    resposta = self.client.post('/trans', json=transacoes_dados)
+            finally:
+                self.app.config.update(CONSENSO_PARALELO=False)
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual([r['status'] for r in resposta.json], ['sucesso', 'sucesso', 'sucesso', 'rejeitada'])
+
+            # O estado dos remetentes vem da pré-validação do lote: o consenso não consulta cada remetente
+            self.assertLessEqual(contador.etapas['consenso'][0], 6)
+            self.assertFalse([sentenca for sentenca in contador.sentencas if 'count(*)' in sentenca])
+
+    def teste_fila_sem_validadores(self):
+        with self.app.app_context():
+            self.app.config.update(validadores_selecionados=None, agenda_validadores=None, FILA_MAX_TENTATIVAS=2)
+            try:
+                # Sem comitê a transação entra na fila em vez de interromper o lote
+                transacao_dados = {'id_remetente': 2, 'id_receptor': 1, 'quantia': 1.0, 'keys_validacao': ['1-validador1']}
+                resposta = self.client.post('/trans', json=[transacao_dados, transacao_dados])
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual([r['status'] for r in resposta.json], ['em_espera', 'em_espera'])
+                self.assertGreaterEqual(self.client.get('/fila').json['aguardando'], 2)
+
+                # Enquanto aguardam a espera, as transações não são drenadas
+                resposta = self.client.post('/trans', json=[])
+                self.assertEqual(resposta.json, [])
+
+                # Quando a espera termina a transação é drenada e, esgotadas as tentativas, descartada
+                Transacao.query.filter_by(status=0).update({'proxima_tentativa': datetime.utcnow()}, synchronize_session=False)
+                db.session.commit()
+                resposta = self.client.post('/trans', json=[])
+                self.assertEqual({r['status'] for r in resposta.json}, {'descartada'})
+                self.assertGreaterEqual(self.client.get('/fila').json['descartadas'], 2)
+            finally:
+                self.app.config.update(FILA_MAX_TENTATIVAS=8)
+
+    def teste_migracao_banco_antigo(self):
+        # Banco criado antes das colunas da fila: a migração adiciona colunas e índice uma única vez
+        with tempfile.TemporaryDirectory() as diretorio:
+            engine = create_engine(f"sqlite:///{os.path.join(diretorio, 'antigo.db')}")
+            with engine.begin() as conexao:
+                conexao.execute(text(
+                    'CREATE TABLE transacao (id INTEGER PRIMARY KEY, id_remetente INTEGER NOT NULL, id_receptor INTEGER NOT NULL, '
+                    'quantia FLOAT NOT NULL, status INTEGER NOT NULL, horario DATETIME NOT NULL, keys_validacao VARCHAR(100) NOT NULL)'
+                ))
+                conexao.execute(text("INSERT INTO transacao VALUES (1, 1, 2, 5.0, 0, '2024-01-01 00:00:00', '')"))
+
+            self.assertEqual(atualizar_esquema(engine), ['transacao.tentativas', 'transacao.proxima_tentativa', 'ix_transacao_fila'])
+            self.assertEqual(atualizar_esquema(engine), [])
+            self.assertIn('ix_transacao_fila', {indice['name'] for indice in inspect(engine).get_indexes('transacao')})
+
+            # A pendente antiga fica pronta para a drenagem
+            with engine.connect() as conexao:
+                linha = conexao.execute(text(
+                    "SELECT id FROM transacao WHERE status = 0 AND tentativas = 0 AND proxima_tentativa <= :agora"
+                ), {'agora': datetime.utcnow()}).all()
+            self.assertEqual(linha, [(1,)])
+            engine.dispose()
+
+    def teste_cache_validadores_alteracao_externa(self):
+        with self.app.app_context():
+            # Um UPDATE em SQL puro não passa pelos eventos do ORM: com a entrada expirada o cache volta ao banco
+            cache = CacheValidadores(validade_s=0)
+            stake = cache.obter('validador5').stake
+            db.session.execute(text("UPDATE validador SET stake = stake + 10 WHERE endereco = 'validador5'"))
+            db.session.commit()
+            self.assertEqual(cache.obter('validador5').stake, stake + 10)
+            self.assertEqual(cache.estatisticas()['expiracoes'], 1)
+
+            # Com tamanho 0 o cache fica desativado e toda busca vai ao banco
+            desativado = CacheValidadores(tamanho_maximo=0)
+            desativado.obter('validador5')
+            desativado.obter('validador5')
+            self.assertEqual((desativado.estatisticas()['tamanho'], desativado.estatisticas()['acertos']), (0, 0))
+            db.session.execute(text("UPDATE validador SET stake = stake - 10 WHERE endereco = 'validador5'"))
+            db.session.commit()
+
+    def teste_fila_reivindicacao(self):
+        with self.app.app_context():
+            # Uma transação pronta é reivindicada por uma única drenagem; a concorrente não a recebe
+            transacao = Transacao(id_remetente=1, id_receptor=2, quantia=1.0, status=0, keys_validacao='', proxima_tentativa=datetime.utcnow() - timedelta(seconds=1))
+            db.session.add(transacao)
+            db.session.commit()
+            primeira = fila.drenar()
+            self.assertEqual([t.id for t in primeira], [transacao.id])
+            self.assertEqual(fila.drenar(), [])
+            self.assertGreater(db.session.get(Transacao, transacao.id).proxima_tentativa, datetime.utcnow())
+
+            # Terminado o arrendamento, uma transação não processada volta a ser drenada
+            self.assertEqual([t.id for t in fila.drenar(agora=datetime.utcnow() + timedelta(seconds=120))], [transacao.id])
+            Transacao.query.filter_by(id=transacao.id).delete()
+            db.session.commit()
+
+    def teste_fila_rechaveia_drenadas(self):
+        with self.app.app_context():
+            # Adiada sem comitê, com chaves que não são do comitê que a julgará
+            self.app.config.update(validadores_selecionados=None, agenda_validadores=None)
+            resposta = self.client.post('/trans', json={'id_remetente': 3, 'id_receptor': 1, 'quantia': 1.0, 'keys_validacao': ['outra-chave']})
+            self.assertEqual(resposta.json[0]['status'], 'em_espera')
+            id_transacao = resposta.json[0]['id_transacao']
+
+            # Drenada com o comitê atual, ela recebe as chaves desse comitê e os validadores honestos não são marcados
+            validadores = self.selecionar_validadores()
+            honestos = {v.id: v.flag for v in validadores if v.chave_seletor == gerar_chave(v.seletor_id, v.endereco)}
+            Transacao.query.filter_by(id=id_transacao).update({'proxima_tentativa': datetime.utcnow()})
+            db.session.commit()
+            resposta = self.client.post('/trans', json=[])
+            self.assertEqual([(r['id_transacao'], r['status']) for r in resposta.json], [(id_transacao, 'sucesso')])
+            db.session.expire_all()
+            for id_validador, flag in honestos.items():
+                self.assertLessEqual(db.session.get(Validador, id_validador).flag, flag)
+
+    def teste_agenda_validadores(self):
+        seletor_id = self.obter_seletor()
+        resposta = self.client.post(f'/seletor/{seletor_id}/agendar_validadores', json={'slots': 3, 'semente': 1})
+        self.assertEqual(resposta.status_code, 200)
+        agenda = resposta.json['agenda']
+        self.assertEqual(len(agenda), 3)
+
+        # Cada transação do lote usa o comitê do seu slot, sem novas seleções
+        transacoes_dados = [
+            {
+                'id_remetente': slot['slot'] + 1,
+                'id_receptor': (slot['slot'] + 1) % 3 + 1,
+                'quantia': 5.0,
+                'keys_validacao': [gerar_chave(seletor_id, endereco) for endereco in slot['enderecos']]
+            }
+            for slot in agenda
+        ]
+        with orcamento_consultas() as contador:
+            resposta = self.client.post('/trans', json=transacoes_dados)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json), 3)
+        for resultado in resposta.json:
+            self.assertIn('Transação feita com sucesso', resultado['mensagem'])
+        self.assertEqual(contador.etapas['agenda'][0], 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
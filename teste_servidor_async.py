@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from app.servidor_async import criar_app_async, TAMANHO_BLOCO_RESPOSTA
+from app.serializacao import responder_stream
+
+class TesteServidorAsync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = criar_app_async('app.config.TestesConfig')
+        # Rota de teste com uma resposta em stream de vários blocos, lida em várias idas ao executor
+        cls.app.app.add_url_rule('/teste/stream', 'teste_stream', lambda: responder_stream([{'indice': i, 'dados': 'x' * 1024} for i in range(200)]))
+        # Rota lenta que informa quantas execuções da aplicação estavam em andamento ao mesmo tempo
+        em_andamento = []
+        trava = threading.Lock()
+
+        def lenta():
+            with trava:
+                em_andamento.append(1)
+                simultaneas = len(em_andamento)
+            time.sleep(0.1)
+            with trava:
+                em_andamento.pop()
+            return {'simultaneas': simultaneas}
+        cls.app.app.add_url_rule('/teste/lenta', 'teste_lenta', lenta)
+
+    def requisicao(self, metodo, caminho, corpo=b'', partes=1):
+        return asyncio.run(self.requisicao_async(metodo, caminho, corpo, partes))
+
+    async def requisicao_async(self, metodo, caminho, corpo=b'', partes=1, receive=None):
+        # Executa uma requisição ASGI com o corpo dividido em partes, como um cliente lento
+        async def executar():
+            tamanho = max(1, len(corpo) // partes)
+            mensagens = [
+                {'type': 'http.request', 'body': corpo[i:i + tamanho], 'more_body': i + tamanho < len(corpo)}
+                for i in range(0, len(corpo), tamanho)
+            ] or [{'type': 'http.request', 'body': b''}]
+            enviadas = []
+
+            async def receber():
+                await asyncio.sleep(0)
+                return mensagens.pop(0)
+
+            async def send(mensagem):
+                enviadas.append(mensagem)
+
+            scope = {
+                'type': 'http', 'http_version': '1.1', 'scheme': 'http', 'method': metodo, 'path': caminho, 'root_path': '', 'query_string': b'',
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(corpo)).encode())],
+                'server': ('testserver', 80), 'client': ('127.0.0.1', 50000)
+            }
+            await self.app(scope, receive or receber, send)
+            return enviadas
+        enviadas = await executar()
+        status = enviadas[0]['status']
+        corpo_resposta = b''.join(mensagem.get('body', b'') for mensagem in enviadas[1:])
+        return status, corpo_resposta
+
+    def teste_requisicao_pela_aplicacao_flask(self):
+        status, corpo = self.requisicao('GET', '/hora')
+        self.assertEqual(status, 200)
+        self.assertIn('tempo_atual', json.loads(corpo))
+
+        # Corpo recebido em várias partes e resposta da rota em stream
+        status, corpo = self.requisicao('POST', '/trans', json.dumps([{'id_remetente': 1}]).encode(), partes=4)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(corpo)[0]['mensagem'], 'Dados da transação incompletos')
+
+    def teste_contrapressao(self):
+        max_pendentes = self.app.max_pendentes
+        self.app.max_pendentes = 0
+        try:
+            status, _ = self.requisicao('GET', '/hora')
+        finally:
+            self.app.max_pendentes = max_pendentes
+        self.assertEqual(status, 503)
+
+    def teste_streams_concorrentes(self):
+        # Várias respostas em stream acima de um bloco ao mesmo tempo: cada uma é lida nas threads do
+        # executor que estiverem livres, sempre no contexto da sua requisição
+        async def executar():
+            return await asyncio.gather(*(self.requisicao_async('GET', '/teste/stream') for _ in range(6)))
+        for status, corpo in asyncio.run(executar()):
+            self.assertEqual(status, 200)
+            self.assertGreater(len(corpo), 2 * TAMANHO_BLOCO_RESPOSTA)
+            self.assertEqual([item['indice'] for item in json.loads(corpo)], list(range(200)))
+        self.assertEqual(self.app.pendentes, 0)
+
+    def teste_admissao_separada_das_conexoes(self):
+        # O limite de conexões comporta milhares de clientes; só max_concorrentes executam a aplicação
+        self.assertGreaterEqual(self.app.max_pendentes, 1000)
+        self.assertLess(self.app.max_concorrentes, self.app.max_pendentes)
+
+        max_concorrentes = self.app.max_concorrentes
+        self.app.max_concorrentes = 2
+        try:
+            async def executar():
+                tarefas = [asyncio.create_task(self.requisicao_async('GET', '/teste/lenta')) for _ in range(8)]
+                await asyncio.sleep(0.05)
+                # As conexões além do limite aguardam a vez no laço, sem 503
+                estatisticas = self.app.estatisticas()
+                return await asyncio.gather(*tarefas), estatisticas
+            respostas, estatisticas = asyncio.run(executar())
+        finally:
+            self.app.max_concorrentes = max_concorrentes
+        self.assertEqual([status for status, _ in respostas], [200] * 8)
+        self.assertEqual((estatisticas['pendentes'], estatisticas['executando']), (8, 2))
+        self.assertLessEqual(max(json.loads(corpo)['simultaneas'] for _, corpo in respostas), 2)
+
+    def teste_contrapressao_antes_do_corpo(self):
+        # Com o servidor cheio a recusa vem antes de qualquer leitura do corpo
+        lidas = []
+
+        async def receive():
+            lidas.append(1)
+            return {'type': 'http.request', 'body': b'[]'}
+
+        max_pendentes = self.app.max_pendentes
+        self.app.max_pendentes = 0
+        try:
+            status, _ = asyncio.run(self.requisicao_async('POST', '/trans', receive=receive))
+        finally:
+            self.app.max_pendentes = max_pendentes
+        self.assertEqual(status, 503)
+        self.assertEqual(lidas, [])
+        self.assertEqual(self.app.pendentes, 0)
+
+    def teste_corpo_acima_do_limite(self):
+        max_corpo = self.app.max_corpo
+        self.app.max_corpo = 10
+        try:
+            status, _ = self.requisicao('POST', '/trans', b'[' + b' ' * 20 + b']', partes=3)
+        finally:
+            self.app.max_corpo = max_corpo
+        self.assertEqual(status, 413)
+
+if __name__ == '__main__':
+    unittest.main()